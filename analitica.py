@@ -0,0 +1,344 @@
+# analitica.py
+# Informes de ventas (monto por mes, tasa de aprobación, mejores clientes, con y sin
+# IGV) sobre un resumen diario de las proformas, para cualquier rango de fechas.
+#
+#   analitica_diaria  cantidad y monto por usuario, día, cliente, estado e IGV
+#   analitica_dias    días de cada usuario: si están pendientes de recalcular y
+#                     cuándo se recalcularon por última vez
+#
+# Cada operación que cambia una proforma marca como pendientes sus días (el de antes
+# y el de después) en la misma transacción; antes de un informe se recalculan sólo
+# esos días desde `proformas`. Los informes no recorren `proformas`: el resumen del
+# usuario se guarda en memoria como un DataFrame ordenado por fecha, que se pone al
+# día leyendo únicamente los días recalculados desde la última vez (por cualquier
+# proceso), y se agrega con NumPy (bincount sobre códigos de mes, estado y cliente).
+#
+# pandas y numpy se importan al pedir el primer informe, no al arrancar.
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from indice_clientes import normalizar
+
+ESTADOS = ['Enviada', 'Aprobada', 'Rechazada']
+# Usuarios cuyo resumen se conserva en memoria, y clientes en el ranking por defecto
+MAX_USUARIOS = 32
+TOP_CLIENTES = 10
+# Los días recalculados por otra transacción que aún no confirmó pueden llevar una
+# marca algo anterior a la de nuestra última lectura: se vuelven a leer por si acaso.
+MARGEN = timedelta(seconds=5)
+
+CREATE_ANALITICA_DIARIA = """
+    CREATE TABLE IF NOT EXISTS analitica_diaria (
+        user_id INT NOT NULL,
+        fecha DATE NOT NULL,
+        cliente VARCHAR(255) NOT NULL,
+        status ENUM('Enviada', 'Aprobada', 'Rechazada') NOT NULL,
+        incluye_igv BOOLEAN NOT NULL,
+        cantidad INT NOT NULL,
+        monto DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (user_id, fecha, cliente, status, incluye_igv)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+CREATE_ANALITICA_DIAS = """
+    CREATE TABLE IF NOT EXISTS analitica_dias (
+        user_id INT NOT NULL,
+        fecha DATE NOT NULL,
+        pendiente BOOLEAN NOT NULL DEFAULT TRUE,
+        reconstruido DATETIME(6) NULL,
+        PRIMARY KEY (user_id, fecha),
+        INDEX idx_analitica_pendientes (user_id, pendiente),
+        INDEX idx_analitica_reconstruido (user_id, reconstruido)
+    ) ENGINE=InnoDB
+"""
+
+AGREGADO_DIARIO = """
+    SELECT {columnas}fecha, cliente, status, incluye_igv, COUNT(*) AS cantidad, SUM(monto_total) AS monto
+    FROM proformas
+    WHERE {filtro}
+    GROUP BY {columnas}fecha, cliente, status, incluye_igv
+"""
+
+CONSULTA_RESUMEN = """
+    SELECT fecha, cliente, status, incluye_igv, cantidad, monto
+    FROM analitica_diaria
+    WHERE user_id = %s
+"""
+
+
+def crear_tablas_analitica(cur):
+    """Crea las tablas y calcula el resumen de todas las proformas existentes."""
+    cur.execute(CREATE_ANALITICA_DIARIA)
+    cur.execute(CREATE_ANALITICA_DIAS)
+    cur.execute("DELETE FROM analitica_diaria")
+    cur.execute("DELETE FROM analitica_dias")
+    cur.execute(
+        "INSERT INTO analitica_diaria (user_id, fecha, cliente, status, incluye_igv, cantidad, monto) "
+        + AGREGADO_DIARIO.format(columnas='user_id, ', filtro='TRUE')
+    )
+    cur.execute("""
+        INSERT INTO analitica_dias (user_id, fecha, pendiente, reconstruido)
+        SELECT DISTINCT user_id, fecha, FALSE, NOW(6) FROM proformas
+    """)
+
+
+def _dia(fecha):
+    # date/datetime desde MySQL o Python, 'AAAA-MM-DD' desde el formulario
+    if isinstance(fecha, datetime):
+        return fecha.date()
+    if isinstance(fecha, date):
+        return fecha
+    return date.fromisoformat(str(fecha)[:10])
+
+
+def marcar_dias(cur, user_id, fechas):
+    """Marca como pendientes de recalcular los días en que cambió alguna proforma."""
+    dias = sorted({_dia(fecha) for fecha in fechas if fecha})
+    if not dias:
+        return
+    cur.executemany("""
+        INSERT INTO analitica_dias (user_id, fecha, pendiente) VALUES (%s, %s, TRUE)
+        ON DUPLICATE KEY UPDATE pendiente = TRUE
+    """, [(user_id, dia) for dia in dias])
+
+
+def reconstruir_pendientes(cur, user_id):
+    """Recalcula desde `proformas` los días pendientes del usuario y los devuelve.
+
+    Llamar al comienzo de una transacción y confirmarla después. Los días pendientes
+    quedan bloqueados hasta entonces: un guardado simultáneo en el mismo día espera y
+    vuelve a marcarlo. Las proformas se leen sin bloquearlas (la lectura ya ve los
+    guardados que marcaron esos días, confirmados antes de obtener el bloqueo), para
+    no bloquear en el orden inverso al de un guardado: proforma primero, día después.
+    """
+    cur.execute("SELECT fecha FROM analitica_dias WHERE user_id = %s AND pendiente = TRUE FOR UPDATE", [user_id])
+    dias = [fila['fecha'] for fila in cur.fetchall()]
+    if not dias:
+        return []
+    marcadores = ", ".join(["%s"] * len(dias))
+    cur.execute(AGREGADO_DIARIO.format(columnas='', filtro=f"user_id = %s AND fecha IN ({marcadores})"),
+                [user_id] + dias)
+    filas = cur.fetchall()
+    cur.execute(f"DELETE FROM analitica_diaria WHERE user_id = %s AND fecha IN ({marcadores})", [user_id] + dias)
+    if filas:
+        cur.executemany(
+            "INSERT INTO analitica_diaria (user_id, fecha, cliente, status, incluye_igv, cantidad, monto) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [(user_id, f['fecha'], f['cliente'], f['status'], f['incluye_igv'], f['cantidad'], f['monto'])
+             for f in filas]
+        )
+    cur.execute(
+        f"UPDATE analitica_dias SET pendiente = FALSE, reconstruido = NOW(6) WHERE user_id = %s AND fecha IN ({marcadores})",
+        [user_id] + dias
+    )
+    return dias
+
+
+# --- RESUMEN EN MEMORIA ---
+
+def _columnas(filas):
+    """Columnas NumPy de filas de analitica_diaria, ordenadas por fecha."""
+    import numpy as np
+
+    # En la unidad que usa pandas, para que armar el DataFrame no convierta las fechas
+    fecha = np.array([fila['fecha'] for fila in filas], dtype='datetime64[D]').astype('datetime64[s]')
+    orden = np.argsort(fecha, kind='stable')
+    columnas = {
+        'fecha': fecha,
+        'cliente': np.array([fila['cliente'] for fila in filas], dtype=object),
+        'status': np.array([ESTADOS.index(fila['status']) for fila in filas], dtype=np.int8),
+        'incluye_igv': np.array([bool(fila['incluye_igv']) for fila in filas], dtype=bool),
+        'cantidad': np.array([fila['cantidad'] for fila in filas], dtype=np.int64),
+        'monto': np.array([float(fila['monto']) for fila in filas], dtype=np.float64),
+    }
+    return {nombre: valores[orden] for nombre, valores in columnas.items()}
+
+
+class Resumen:
+    """Resumen diario de un usuario: un DataFrame ordenado por fecha, con el cliente
+    como categoría (agrupando mayúsculas y tildes), y el nombre de cada categoría tal
+    como se escribió la última vez. No se modifica: reemplazar_dias devuelve otro.
+    """
+
+    def __init__(self, marco, nombres):
+        self.marco = marco
+        self.nombres = nombres
+
+    @classmethod
+    def desde_filas(cls, filas):
+        import numpy as np
+        import pandas as pd
+
+        columnas = _columnas(filas)
+        clientes = columnas.pop('cliente')
+        normalizados = {cliente: normalizar(cliente) for cliente in set(clientes)}
+        codigos, categorias = pd.factorize(np.array([normalizados[c] for c in clientes], dtype=object))
+        nombres = np.empty(len(categorias), dtype=object)
+        # Con índices repetidos gana la última asignación: la fila más reciente
+        nombres[codigos] = clientes
+        return cls(cls._marco(columnas, codigos, categorias), nombres)
+
+    @staticmethod
+    def _marco(columnas, codigos, categorias):
+        import pandas as pd
+        return pd.DataFrame(dict(
+            columnas,
+            clave=pd.Categorical.from_codes(codigos, categories=categorias),
+            status=pd.Categorical.from_codes(columnas['status'], categories=ESTADOS),
+        ))
+
+    def reemplazar_dias(self, dias, filas):
+        """Otro resumen, con las filas de `dias` sustituidas por `filas` (de esos días).
+
+        Las filas conservadas ya están en orden: las nuevas se insertan en su lugar
+        (np.insert) en lugar de reordenar todo.
+        """
+        import numpy as np
+        import pandas as pd
+
+        marco = self.marco
+        fechas = marco['fecha'].to_numpy()
+        conservar = ~np.isin(fechas, np.array(dias, dtype='datetime64[D]').astype(fechas.dtype))
+        nuevas = _columnas(filas)
+        clientes = nuevas.pop('cliente')
+
+        categorias = marco['clave'].cat.categories
+        normalizados = np.array([normalizar(cliente) for cliente in clientes], dtype=object)
+        faltan = pd.Index(pd.unique(normalizados)).difference(categorias)
+        categorias = categorias.append(faltan)
+        nombres = np.concatenate([self.nombres, np.empty(len(faltan), dtype=object)])
+        codigos_nuevos = categorias.get_indexer(normalizados)
+        nombres[codigos_nuevos] = clientes
+
+        posiciones = np.searchsorted(fechas[conservar], nuevas['fecha'], side='left')
+        viejas = {
+            'fecha': fechas[conservar],
+            'status': marco['status'].cat.codes.to_numpy()[conservar],
+            'incluye_igv': marco['incluye_igv'].to_numpy()[conservar],
+            'cantidad': marco['cantidad'].to_numpy()[conservar],
+            'monto': marco['monto'].to_numpy()[conservar],
+        }
+        columnas = {nombre: np.insert(valores, posiciones, nuevas[nombre]) for nombre, valores in viejas.items()}
+        codigos = np.insert(marco['clave'].cat.codes.to_numpy()[conservar], posiciones, codigos_nuevos)
+        return Resumen(self._marco(columnas, codigos, categorias), nombres)
+
+    def __len__(self):
+        return len(self.marco)
+
+
+def _totales(cantidad, monto):
+    return {'cantidad': int(cantidad), 'monto': round(float(monto), 2)}
+
+
+def informe(resumen, desde, hasta, top=TOP_CLIENTES):
+    """Monto por mes, estados, mejores clientes e IGV entre dos fechas (inclusive)."""
+    import numpy as np
+
+    marco = resumen.marco
+    fechas = marco['fecha'].to_numpy()
+    inicio = int(np.searchsorted(fechas, np.datetime64(desde, 'D'), side='left'))
+    fin = int(np.searchsorted(fechas, np.datetime64(hasta, 'D'), side='right'))
+    seleccion = marco.iloc[inicio:fin]
+    cantidad = seleccion['cantidad'].to_numpy()
+    monto = seleccion['monto'].to_numpy()
+    estado = seleccion['status'].cat.codes.to_numpy().astype(np.int64)
+    n_estados = len(ESTADOS)
+
+    # Mes x estado, sólo entre el primer y el último mes con datos del rango
+    meses = fechas[inicio:fin].astype('datetime64[M]')
+    por_mes = []
+    if len(meses):
+        primero = meses[0]
+        posicion = (meses - primero).astype(np.int64)
+        n_meses = int(posicion[-1]) + 1
+        celda = posicion * n_estados + estado
+        cantidades = np.bincount(celda, weights=cantidad, minlength=n_meses * n_estados).reshape(n_meses, n_estados)
+        montos = np.bincount(celda, weights=monto, minlength=n_meses * n_estados).reshape(n_meses, n_estados)
+        aprobada = ESTADOS.index('Aprobada')
+        for k in range(n_meses):
+            por_mes.append(dict(
+                _totales(cantidades[k].sum(), montos[k].sum()),
+                mes=str(primero + k),
+                monto_aprobado=round(float(montos[k, aprobada]), 2),
+                por_estado={nombre: int(cantidades[k, e]) for e, nombre in enumerate(ESTADOS)},
+            ))
+
+    cantidad_estado = np.bincount(estado, weights=cantidad, minlength=n_estados)
+    monto_estado = np.bincount(estado, weights=monto, minlength=n_estados)
+    estados = {nombre: _totales(cantidad_estado[e], monto_estado[e]) for e, nombre in enumerate(ESTADOS)}
+    aprobadas, rechazadas = estados['Aprobada']['cantidad'], estados['Rechazada']['cantidad']
+    total = int(cantidad.sum())
+
+    # Mejores clientes por monto
+    codigos = seleccion['clave'].cat.codes.to_numpy()
+    monto_cliente = np.bincount(codigos, weights=monto, minlength=len(resumen.nombres))
+    cantidad_cliente = np.bincount(codigos, weights=cantidad, minlength=len(resumen.nombres))
+    mejores = np.argsort(-monto_cliente, kind='stable')[:top]
+    top_clientes = [dict(_totales(cantidad_cliente[c], monto_cliente[c]), cliente=resumen.nombres[c])
+                    for c in mejores if cantidad_cliente[c] > 0]
+
+    igv = seleccion['incluye_igv'].to_numpy().astype(np.int64)
+    cantidad_igv = np.bincount(igv, weights=cantidad, minlength=2)
+    monto_igv = np.bincount(igv, weights=monto, minlength=2)
+
+    return {
+        'desde': str(desde),
+        'hasta': str(hasta),
+        'total': _totales(total, monto.sum()),
+        'por_mes': por_mes,
+        'estados': estados,
+        # Sobre todas las proformas del rango y sólo sobre las ya respondidas
+        'tasa_aprobacion': round(aprobadas / total, 4) if total else None,
+        'tasa_aprobacion_respondidas': round(aprobadas / (aprobadas + rechazadas), 4) if aprobadas + rechazadas else None,
+        'top_clientes': top_clientes,
+        'igv': {'con_igv': _totales(cantidad_igv[1], monto_igv[1]),
+                'sin_igv': _totales(cantidad_igv[0], monto_igv[0])},
+    }
+
+
+class CacheAnalitica:
+    """Resúmenes diarios por usuario en memoria (LRU), seguros para los hilos de waitress.
+
+    Los resúmenes no se modifican nunca: al ponerse al día se reemplazan, así que
+    un informe en curso puede seguir usando el anterior sin bloqueos.
+    """
+
+    def __init__(self, max_usuarios=MAX_USUARIOS):
+        self.max_usuarios = max_usuarios
+        self._usuarios = OrderedDict()  # user_id -> (Resumen, marca de la última lectura)
+        self._lock = threading.Lock()
+
+    def resumen(self, cur, user_id):
+        """El resumen del usuario, al día con analitica_diaria (llamar tras reconstruir_pendientes)."""
+        with self._lock:
+            entrada = self._usuarios.get(user_id)
+            if entrada is not None:
+                self._usuarios.move_to_end(user_id)
+        cur.execute("SELECT NOW(6) AS ahora")
+        ahora = cur.fetchone()['ahora']
+        if entrada is None:
+            cur.execute(CONSULTA_RESUMEN, [user_id])
+            resumen = Resumen.desde_filas(cur.fetchall())
+        else:
+            resumen, marca = entrada
+            cur.execute("SELECT fecha FROM analitica_dias WHERE user_id = %s AND reconstruido >= %s",
+                        (user_id, marca - MARGEN))
+            dias = [fila['fecha'] for fila in cur.fetchall()]
+            if dias:
+                marcadores = ", ".join(["%s"] * len(dias))
+                cur.execute(CONSULTA_RESUMEN + f" AND fecha IN ({marcadores})", [user_id] + dias)
+                resumen = resumen.reemplazar_dias(dias, cur.fetchall())
+        with self._lock:
+            self._usuarios[user_id] = (resumen, ahora)
+            self._usuarios.move_to_end(user_id)
+            while len(self._usuarios) > self.max_usuarios:
+                self._usuarios.popitem(last=False)
+        return resumen
+
+    def informe(self, cur, user_id, desde, hasta, top=TOP_CLIENTES):
+        return informe(self.resumen(cur, user_id), desde, hasta, top)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._usuarios.pop(user_id, None)
@@ -1,13 +1,30 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
-from flask_mysqldb import MySQL
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, send_file
+import MySQLdb.cursors
+from db_pool import MySQLPool
 from werkzeug.security import generate_password_hash, check_password_hash
-from fpdf import FPDF
-from datetime import datetime
+from datetime import datetime, timedelta
+import hashlib
+import json
+import os
 import re
 import sys
-import pandas as pd
-import io
+import threading
+import time
+import analitica
+import busqueda
+import esquema
+import estadisticas
+import secuencias
+from indice_clientes import IndiceClientes
+from catalogo_items import CatalogoItems, CONSULTA_CARGA
+from cache_compartido import CacheCompartido
+from cache_pdf import CachePDF, clave_pdf, PLANTILLA_PDF_VERSION
+from compresion import Compresion
+from trabajos import ColaTrabajos, ColaLlena, TrabajoFallido
+from metricas import Metricas, gauges
+# fpdf, openpyxl y el pool de procesos de PDF se importan al usarse por primera vez
+# (pdf_render, pdf_lotes, exportacion) para que cada worker arranque rápido
 
 # --- INICIALIZACIÓN Y CONFIGURACIÓN ---
 app = Flask(__name__)
@@ -20,81 +37,216 @@ app.config['MYSQL_PASSWORD'] = 'MakroSurco2024-'
 app.config['MYSQL_DB'] = 'ledesma_led_db'
 app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
 
-mysql = MySQL(app)
-
-# --- TEST DE CONEXIÓN ---
-with app.app_context():
-    try:
+# Pool de conexiones: tamaño, espera máxima para obtener una conexión, segundos de
+# inactividad tras los que se comprueba con ping() y vida máxima de cada conexión
+app.config['MYSQL_POOL_SIZE'] = 10
+app.config['MYSQL_POOL_TIMEOUT'] = 10
+app.config['MYSQL_POOL_MAX_IDLE'] = 60
+app.config['MYSQL_POOL_MAX_LIFETIME'] = 3600
+
+# Caché de PDFs generados (en memoria y, si se configura un directorio, también en disco;
+# con varios workers de gunicorn, el directorio lo comparten todos)
+app.config['PDF_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['PDF_CACHE_DIR'] = os.environ.get('PDF_CACHE_DIR')
+app.config['PDF_CACHE_DIR_MAX_BYTES'] = 512 * 1024 * 1024
+
+# Caché compartida entre workers (archivo SQLite; ver cache_compartido.py). Sin ruta,
+# con un solo proceso, vive en memoria. gunicorn.conf.py la activa.
+app.config['SHARED_CACHE_PATH'] = os.environ.get('SHARED_CACHE_PATH')
+
+# Exportación masiva de PDFs: procesos que dibujan en paralelo y tope de proformas por ZIP
+app.config['PDF_WORKERS'] = os.cpu_count() or 1
+app.config['PDF_ZIP_MAX_PROFORMAS'] = 1000
+
+# Cantidad máxima de items por cada INSERT de varias filas
+app.config['ITEMS_BATCH_SIZE'] = 100
+
+# Trabajos en segundo plano: hilos que los ejecutan, carpeta de resultados (por defecto
+# instance/trabajos), segundos que se conserva cada resultado y trabajos en curso por usuario
+app.config['JOBS_WORKERS'] = 2
+app.config['JOBS_DIR'] = None
+app.config['JOBS_TTL_SECONDS'] = 3600
+app.config['JOBS_MAX_PENDING'] = 5
+# Cada cuánto renueva su latido un trabajo en curso y cuánto se le espera al cerrar el proceso
+app.config['JOBS_HEARTBEAT_SECONDS'] = 15
+app.config['JOBS_SHUTDOWN_WAIT_SECONDS'] = 10
+
+# Acciones en lote sobre proformas: máximo de ids por petición y filas por transacción
+app.config['BULK_MAX_IDS'] = 5000
+app.config['BULK_BATCH_SIZE'] = 200
+
+# Proformas por página en la lista (/api/proformas)
+app.config['PROFORMAS_POR_PAGINA'] = 10
+
+# Lista de clientes: tamaño de página, días que se recuerdan los eliminados (un token de
+# sincronización más antiguo obliga a recargar) y máximo de cambios por sincronización
+app.config['CLIENTES_POR_PAGINA'] = 100
+app.config['CLIENTES_SYNC_DIAS'] = 30
+app.config['CLIENTES_SYNC_MAX'] = 1000
+
+# Direcciones desde las que se puede leer /metrics sin sesión de administrador (Prometheus)
+app.config['METRICS_IPS'] = ('127.0.0.1', '::1')
+# Con varios workers, carpeta donde cada uno vuelca sus métricas (cada tantos segundos)
+# para que /metrics devuelva la suma de todos; sin ella, cada proceso expone las suyas
+app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+app.config['METRICS_FLUSH_SECONDS'] = 5
+
+# Compresión gzip/brotli de las respuestas de texto a partir de este tamaño (bytes)
+app.config['COMPRESS_MIN_BYTES'] = 1024
+app.config['COMPRESS_GZIP_LEVEL'] = 6
+app.config['COMPRESS_BR_QUALITY'] = 5
+
+# Las métricas se registran primero para que su hook mida también a los demás
+# (incluida la compresión, que se ejecuta justo antes)
+metricas = Metricas(app)
+compresion = Compresion(app)
+mysql = MySQLPool(app)
+mysql.agregar_observador(metricas.observar_consulta)
+cache_compartido = CacheCompartido(app)
+
+# Perfilador de consultas para desarrollo (PROFILER_ENABLED=1): informe por petición con
+# tiempos, línea de origen, consultas repetidas (N+1) y EXPLAIN de las más lentas
+app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED') == '1'
+app.config['PROFILER_SLOW_MS'] = 50
+app.config['PROFILER_N1_THRESHOLD'] = 5
+app.config['PROFILER_LOG'] = None  # por defecto instance/perfilador.jsonl
+perfilador = None
+if app.config['PROFILER_ENABLED']:
+    from perfilador import Perfilador
+    perfilador = Perfilador(app, mysql)
+cache_pdf = CachePDF(app.config['PDF_CACHE_MAX_BYTES'], app.config['PDF_CACHE_DIR'],
+                     app.config['PDF_CACHE_DIR_MAX_BYTES'])
+cola_trabajos = ColaTrabajos(app, mysql)
+
+# --- PREPARACIÓN DE LA BASE DE DATOS ---
+# No se conecta al importar el módulo: si la base de datos no está disponible al
+# arrancar, el proceso sigue vivo y la preparación se reintenta en la siguiente
+# petición (o desde /health/ready, que reintenta con espera exponencial).
+app.config['READY_REINTENTOS'] = 5
+app.config['READY_ESPERA_INICIAL'] = 0.2
+
+_base_preparada = False
+_base_lock = threading.Lock()
+
+def preparar_base_de_datos():
+    """Aplica las migraciones pendientes del esquema una sola vez por proceso."""
+    global _base_preparada
+    if _base_preparada:
+        return
+    with _base_lock:
+        if _base_preparada:
+            return
         cur = mysql.connection.cursor()
-        cur.execute("SELECT 1")
+        # Tablas, índices y tablas auxiliares (búsqueda, estadísticas, secuencias, trabajos)
+        aplicadas = esquema.migrar(cur)
+        if aplicadas:
+            print(f">>> Migraciones aplicadas: {aplicadas}")
+        pendientes = cola_trabajos.reanudar(cur)
+        mysql.connection.commit()
         cur.close()
+        _base_preparada = True
+        # Trabajos que quedaron en cola antes de un reinicio
+        for trabajo_id in pendientes:
+            cola_trabajos.encolar(trabajo_id)
         print(">>> Conexión a la base de datos exitosa.")
+
+@app.before_request
+def asegurar_base_de_datos():
+    if _base_preparada or request.endpoint in ('static', 'health_live', 'health_ready', 'metrics'):
+        return None
+    try:
+        preparar_base_de_datos()
     except Exception as e:
-        print("!!! ERROR DE CONEXIÓN CON LA BASE DE DATOS !!!", file=sys.stderr)
-        print(f"!!! Error: {e}", file=sys.stderr)
-        sys.exit(1)
-
-# --- FUNCIÓN AUXILIAR PARA CODIFICAR TEXTO PARA PDF ---
-def encode_text(text):
-    """Codifica el texto a latin-1 reemplazando caracteres no soportados."""
-    return str(text).encode('latin-1', 'replace').decode('latin-1')
-
-# --- CLASE PDF PROFESIONAL (VERSIÓN CORREGIDA FINAL) ---
-class PDF(FPDF):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Creamos un atributo para pasarle el estado del IGV
-        self.incluye_igv = False 
-
-    def header(self):
-        # --- ORDEN DE DIBUJO CORREGIDO ---
-        # 1. PRIMERO: Dibujamos la franja de fondo en toda la página.
+        print(f"!!! ERROR DE CONEXIÓN CON LA BASE DE DATOS: {e}", file=sys.stderr)
+        return Response("Base de datos no disponible, intente nuevamente en unos segundos.", status=503, mimetype='text/plain')
+    return None
+
+@app.route('/health/live')
+def health_live():
+    return jsonify({"status": "ok"})
+
+@app.route('/health/ready')
+def health_ready():
+    espera = app.config['READY_ESPERA_INICIAL']
+    ultimo_error = None
+    for intento in range(app.config['READY_REINTENTOS']):
         try:
-            self.image('static/img/pdf_background.png', 0, 0, 40, self.h)
+            preparar_base_de_datos()
+            cur = mysql.connection.cursor()
+            cur.execute("SELECT 1")
+            cur.close()
+            return jsonify({"status": "ready", "intentos": intento + 1})
         except Exception as e:
-            print(f"ADVERTENCIA: No se pudo cargar la imagen de fondo del PDF: {e}", file=sys.stderr)
+            ultimo_error = e
+            # La conexión pudo quedar rota: se descarta en lugar de devolverla al pool
+            mysql.descartar_conexion()
+            time.sleep(espera)
+            espera = min(espera * 2, 5)
+    print(f"!!! Base de datos no disponible: {ultimo_error}", file=sys.stderr)
+    return jsonify({"status": "unavailable", "error": str(ultimo_error)}), 503
+
+# --- FUNCIÓN AUXILIAR PARA CARGAR ITEMS EN LOTE ---
+def obtener_items_por_proforma(cur, proforma_ids):
+    """Carga los items de varias proformas en una sola consulta.
+
+    Devuelve un diccionario {proforma_id: [items]} con una lista (posiblemente
+    vacía) para cada id solicitado, manteniendo el orden de inserción de los items.
+    """
+    proforma_ids = list(proforma_ids)
+    items_por_proforma = {pid: [] for pid in proforma_ids}
+    if not proforma_ids:
+        return items_por_proforma
+
+    placeholders = ", ".join(["%s"] * len(proforma_ids))
+    cur.execute(
+        f"SELECT * FROM proforma_items WHERE proforma_id IN ({placeholders}) ORDER BY proforma_id, id",
+        proforma_ids
+    )
+    for item in cur.fetchall():
+        items_por_proforma[item['proforma_id']].append(item)
+    return items_por_proforma
+
+# --- FUNCIÓN AUXILIAR PARA INSERTAR ITEMS EN LOTE ---
+def insertar_items(cur, proforma_id, items):
+    """Inserta los items de una proforma con INSERTs de varias filas.
+
+    Cada sentencia lleva como mucho ITEMS_BATCH_SIZE filas, así una proforma de
+    300 líneas son 3 viajes a la base de datos en lugar de 300.
+    """
+    filas = [(proforma_id, item['item'], item['cantidad'], item['precio_unitario']) for item in items]
+    tamano_lote = app.config['ITEMS_BATCH_SIZE']
+    for inicio in range(0, len(filas), tamano_lote):
+        lote = filas[inicio:inicio + tamano_lote]
+        valores = ", ".join(["(%s, %s, %s, %s)"] * len(lote))
+        cur.execute(
+            f"INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario) VALUES {valores}",
+            [valor for fila in lote for valor in fila]
+        )
 
-        # 2. LUEGO: Dibujamos el logo y el texto ENCIMA del fondo.
-        self.set_y(10)
-        try:
-            # El logo ahora se dibujará sobre la franja.
-            self.image('static/img/logo.png', 15, 12, 33)
-        except Exception as e:
-            print(f"ADVERTENCIA: No se pudo cargar el logo: {e}", file=sys.stderr)
-        
-        # Mover a la derecha del logo para la info de la empresa
-        self.set_y(15)
-        self.set_x(55)
-        
-        self.set_font('Helvetica', 'B', 14)
-        self.cell(0, 7, 'Ledesma LED - Cotizacion', 0, 1, 'L')
-        self.set_font('Helvetica', '', 9)
-        self.set_x(55)
-        self.cell(0, 5, 'RUC: 10105573281 (Cesar Antonio Ledesma Sanchez)', 0, 1, 'L')
-        self.set_x(55)
-        self.cell(0, 5, 'Jr. Tacna 121 - Urb. Cercado - Santiago de Surco, Lima, Peru', 0, 1, 'L')
-        self.set_x(55)
-        self.cell(0, 5, 'Celular: 941368586 | Correo: ledesmaled@hotmail.com', 0, 1, 'L')
-        
-        # Salto de línea para separar del cuerpo
-        self.ln(15)
+# --- CACHÉ DE CONTEOS PARA LA PAGINACIÓN ---
+# El COUNT(*) de la lista se repite en cada página y en cada búsqueda; lo guardamos
+# unos segundos por (usuario, término) en la caché compartida, así lo aprovechan todos
+# los workers, y lo invalidamos cuando cambian las proformas.
+CONTEO_TTL_SEGUNDOS = 60
 
-    def footer(self):
-        self.set_y(-20) # Subimos un poco el footer para que quepan las dos líneas
-        self.set_font('Helvetica', 'I', 8)
-        
-        # Texto del IGV que se obtiene del atributo que le pasamos
-        igv_text = "La proforma SI incluye IGV" if self.incluye_igv else "La proforma NO incluye IGV"
-        self.cell(0, 5, igv_text, 0, 1, 'C')
-
-        # Cuenta bancaria
-        self.set_font('Helvetica', '', 8)
-        bcp_text = "Numero de Cuenta BCP: 194-38403786-0-01 (a nombre de Cesar Antonio Ledesma Sanchez)"
-        self.cell(0, 5, bcp_text, 0, 1, 'C')
-        
-        # Número de página
-        self.set_font('Helvetica', 'I', 8)
-        self.cell(0, 5, f'Pagina {self.page_no()}', 0, 0, 'R')
+def alcance_conteo():
+    """Los administradores ven todas las proformas, así que comparten un mismo alcance."""
+    return 'admin' if session.get('role') == 'admin' else session['id']
+
+def _clave_conteo(alcance, termino):
+    # El término va en JSON para distinguir None de ''
+    return f"conteo:{alcance}:{json.dumps(termino)}"
+
+def obtener_conteo_cacheado(clave):
+    return cache_compartido.obtener(_clave_conteo(*clave))
+
+def guardar_conteo_cacheado(clave, total):
+    cache_compartido.guardar(_clave_conteo(*clave), total, CONTEO_TTL_SEGUNDOS)
+
+def invalidar_conteos(user_id):
+    """Descarta los conteos del usuario y los del alcance de administrador."""
+    for alcance in (user_id, 'admin'):
+        cache_compartido.eliminar_prefijo(f"conteo:{alcance}:")
 
 # --- RUTAS DE AUTENTICACIÓN ---
 @app.route('/login', methods=['GET', 'POST'])
@@ -149,24 +301,32 @@ def logout():
 def dashboard():
     if 'loggedin' in session:
         user_id = session['id']
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = 10 # Proformas recientes por página
         cur = mysql.connection.cursor()
         
-        cur.execute("SELECT COUNT(id) as total FROM proformas WHERE user_id = %s", [user_id])
-        total_proformas = cur.fetchone()['total']
-        
-        cur.execute("SELECT SUM(monto_total) as total_monto FROM proformas WHERE user_id = %s", [user_id])
-        total_monto_result = cur.fetchone()
-        total_monto = total_monto_result['total_monto'] if total_monto_result['total_monto'] else 0
+        # Totales desde el resumen que se mantiene al guardar, sin recorrer todas las proformas
+        resumen = estadisticas.obtener_resumen(cur, user_id)
+        total_proformas = resumen['total_proformas']
+        total_monto = resumen['monto_total'] or 0
         
-        cur.execute("SELECT id, cotizacion_nro, fecha, cliente, monto_total, incluye_igv, status FROM proformas WHERE user_id = %s ORDER BY id DESC", [session['id']])
-        ultimas_proformas = cur.fetchall()
+        cur.execute(
+            "SELECT id, cotizacion_nro, fecha, cliente, monto_total, incluye_igv, status FROM proformas WHERE user_id = %s ORDER BY id DESC LIMIT %s OFFSET %s",
+            (user_id, per_page + 1, (page - 1) * per_page)
+        )
+        ultimas_proformas = list(cur.fetchall())
+        hay_mas = len(ultimas_proformas) > per_page
+        ultimas_proformas = ultimas_proformas[:per_page]
         
         cur.close()
         
         return render_template('dashboard.html', 
                                total_proformas=total_proformas, 
                                total_monto=total_monto,
-                               ultimas_proformas=ultimas_proformas)
+                               resumen=resumen,
+                               ultimas_proformas=ultimas_proformas,
+                               page=page,
+                               hay_mas=hay_mas)
     return redirect(url_for('login'))
 
 @app.route('/crear_proforma')
@@ -195,7 +355,6 @@ def duplicar_proforma(id):
         return redirect(url_for('login'))
 
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
 
         # 1. Obtener los datos de la proforma original
@@ -205,24 +364,18 @@ def duplicar_proforma(id):
         if not proforma_original:
             return "Proforma no encontrada o sin permisos.", 404
 
-        # 2. Obtener los items de la proforma original
-        cur.execute("SELECT * FROM proforma_items WHERE proforma_id = %s", [id])
-        items_originales = cur.fetchall()
+        # 2. Reservar el siguiente número de cotización para la copia
+        next_number = secuencias.asignar_numero(cur, session['id'])
 
-        # 3. Obtener el siguiente número de cotización para la copia
-        query_next_num = "SELECT MAX(CAST(cotizacion_nro AS UNSIGNED)) as max_num FROM proformas WHERE user_id = %s"
-        cur.execute(query_next_num, [session['id']])
-        max_num_result = cur.fetchone()
-        next_number = (max_num_result['max_num'] or 0) + 1
-
-        # 4. Crear la nueva proforma (la copia)
+        # 3. Crear la nueva proforma (la copia)
+        fecha_copia = datetime.now()
         cur.execute(
             """INSERT INTO proformas (user_id, cotizacion_nro, fecha, cliente, incluye_igv, monto_total, status) 
                VALUES (%s, %s, %s, %s, %s, %s, %s)""",
             (
                 session['id'], 
                 str(next_number), # Nuevo número
-                datetime.now(), # Fecha de hoy
+                fecha_copia, # Fecha de hoy
                 proforma_original['cliente'] + " (Copia)", # Indicador de que es una copia
                 proforma_original['incluye_igv'],
                 proforma_original['monto_total'],
@@ -231,18 +384,24 @@ def duplicar_proforma(id):
         )
         nueva_proforma_id = cur.lastrowid
 
-        # 5. Copiar todos los items a la nueva proforma
-        for item in items_originales:
-            cur.execute(
-                """INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario)
-                   VALUES (%s, %s, %s, %s)""",
-                (nueva_proforma_id, item['item_descripcion'], item['cantidad'], item['precio_unitario'])
-            )
+        # 4. Copiar todos los items a la nueva proforma sin traerlos a Python
+        cur.execute(
+            """INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario)
+               SELECT %s, item_descripcion, cantidad, precio_unitario
+               FROM proforma_items WHERE proforma_id = %s ORDER BY id""",
+            (nueva_proforma_id, id)
+        )
 
-        mysql.connection.commit()
+        busqueda.indexar_proformas(cur, [nueva_proforma_id])
+        estadisticas.registrar_cambio(cur, session['id'], nueva={
+            'monto_total': proforma_original['monto_total'], 'fecha': fecha_copia, 'status': 'Enviada'
+        })
+        copiados = items_para_catalogo(cur, session['id'], [nueva_proforma_id])
+        confirmar_con_catalogo(session['id'], agregados=copiados)
+        invalidar_conteos(session['id'])
         cur.close()
 
-        # 6. Redirigir a la página de EDICIÓN de la nueva proforma
+        # 5. Redirigir a la página de EDICIÓN de la nueva proforma
         return redirect(url_for('editar_proforma_page', id=nueva_proforma_id))
 
     except Exception as e:
@@ -266,27 +425,36 @@ def api_crear_proforma():
         return jsonify({"success": False, "error": "No autorizado"}), 401
     
     try:
-        mysql.connection.ping()
         data = request.get_json()
         cur = mysql.connection.cursor()
         
         total = sum(float(item['precio_unitario']) * float(item['cantidad']) for item in data['items'])
         
+        # Sin número (o con el sugerido sin tocar) se asigna el siguiente de la secuencia del
+        # usuario de forma atómica; si se escribió uno a mano, la secuencia sigue desde él
+        cotizacion_nro = data.get('cotizacion_nro')
+        if not cotizacion_nro:
+            cotizacion_nro = str(secuencias.asignar_numero(cur, session['id']))
+        else:
+            secuencias.registrar_numero_manual(cur, session['id'], cotizacion_nro)
+
         cur.execute(
             "INSERT INTO proformas (user_id, cotizacion_nro, fecha, cliente, incluye_igv, monto_total) VALUES (%s, %s, %s, %s, %s, %s)",
-            (session['id'], data['cotizacion_nro'], data['fecha'], data['cliente'], data['incluye_igv'], total)
+            (session['id'], cotizacion_nro, data['fecha'], data['cliente'], data['incluye_igv'], total)
         )
         proforma_id = cur.lastrowid
 
-        for item in data['items']:
-            cur.execute(
-                "INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario) VALUES (%s, %s, %s, %s)",
-                (proforma_id, item['item'], item['cantidad'], item['precio_unitario'])
-            )
+        insertar_items(cur, proforma_id, data['items'])
         
-        mysql.connection.commit()
+        busqueda.indexar_proformas(cur, [proforma_id])
+        # Las proformas nuevas quedan con el estado por defecto 'Enviada'
+        estadisticas.registrar_cambio(cur, session['id'], nueva={
+            'monto_total': total, 'fecha': data['fecha'], 'status': 'Enviada'
+        })
+        confirmar_con_catalogo(session['id'], agregados=lineas_catalogo(data['items']))
+        invalidar_conteos(session['id'])
         cur.close()
-        return jsonify({"success": True, "proforma_id": proforma_id})
+        return jsonify({"success": True, "proforma_id": proforma_id, "cotizacion_nro": cotizacion_nro})
     except Exception as e:
         mysql.connection.rollback()
         return jsonify({"success": False, "error": "Error interno del servidor."}), 500
@@ -297,12 +465,11 @@ def api_obtener_proformas():
         return jsonify({"error": "No autorizado"}), 401
     
     try:
-        mysql.connection.ping()
-        
         # --- Lógica Unificada de Paginación y Búsqueda ---
         page = request.args.get('page', 1, type=int)
-        per_page = 10 # Proformas por página
+        per_page = app.config['PROFORMAS_POR_PAGINA']
         search_term = request.args.get('search', '')
+        after_id = request.args.get('after_id', type=int) # Cursor: id de la última proforma recibida
         
         offset = (page - 1) * per_page
         
@@ -321,27 +488,57 @@ def api_obtener_proformas():
             where_clauses.append("p.user_id = %s")
             params.append(session['id'])
         
+        # La búsqueda usa el índice FULLTEXT (cliente, número e items) y ordena por relevancia
+        score_sql, score_params = None, []
         if search_term:
-            where_clauses.append("(p.cliente LIKE %s OR p.cotizacion_nro LIKE %s)")
-            params.extend([f"%{search_term}%", f"%{search_term}%"])
+            join_busqueda, where_busqueda, params_busqueda, score_sql = busqueda.condicion_busqueda(search_term)
+            base_query += join_busqueda
+            where_clauses.append(where_busqueda)
+            params.extend(params_busqueda)
+            if score_sql:
+                score_params = params_busqueda
 
         if where_clauses:
             base_query += " WHERE " + " AND ".join(where_clauses)
 
-        # --- Obtener el total de resultados para la paginación ---
         cur = mysql.connection.cursor()
-        count_query = "SELECT COUNT(p.id) as total " + base_query
-        cur.execute(count_query, params)
-        total_results = cur.fetchone()['total']
-        total_pages = (total_results + per_page - 1) // per_page
+
+        # --- Obtener el total de resultados (cacheado por usuario y búsqueda) ---
+        # En modo cursor el total es opcional (?total=1) para no recontar al hacer scroll.
+        total_results = None
+        if after_id is None or request.args.get('total') == '1':
+            clave_conteo = (alcance_conteo(), search_term)
+            total_results = obtener_conteo_cacheado(clave_conteo)
+            if total_results is None:
+                count_query = "SELECT COUNT(p.id) as total " + base_query
+                cur.execute(count_query, params)
+                total_results = cur.fetchone()['total']
+                guardar_conteo_cacheado(clave_conteo, total_results)
 
         # --- Obtener los resultados de la página actual ---
-        data_query = "SELECT p.*, u.fullname as author " + base_query + " ORDER BY p.id DESC LIMIT %s OFFSET %s"
-        final_params = params + [per_page, offset]
+        por_relevancia = after_id is None and score_sql is not None
+        if after_id is not None:
+            # Modo cursor: buscamos directamente por la clave primaria en lugar de usar OFFSET
+            cursor_clause = " AND p.id < %s" if where_clauses else " WHERE p.id < %s"
+            data_query = "SELECT p.*, u.fullname as author " + base_query + cursor_clause + " ORDER BY p.id DESC LIMIT %s"
+            final_params = params + [after_id, per_page + 1]
+        elif por_relevancia:
+            # Resultados de búsqueda ordenados por relevancia y, a igualdad, por los más recientes
+            data_query = ("SELECT p.*, u.fullname as author, " + score_sql + " AS relevancia " + base_query
+                          + " ORDER BY relevancia DESC, p.id DESC LIMIT %s OFFSET %s")
+            final_params = score_params + params + [per_page + 1, offset]
+        else:
+            data_query = "SELECT p.*, u.fullname as author " + base_query + " ORDER BY p.id DESC LIMIT %s OFFSET %s"
+            final_params = params + [per_page + 1, offset]
         cur.execute(data_query, final_params)
         
-        # Convertir a lista para poder modificar
+        # Convertir a lista para poder modificar. Pedimos una fila extra para saber si hay más.
         proformas = list(cur.fetchall())
+        has_more = len(proformas) > per_page
+        proformas = proformas[:per_page]
+
+        # Cargar los items de toda la página en una sola consulta
+        items_por_proforma = obtener_items_por_proforma(cur, [p['id'] for p in proformas])
 
         # Procesar la lista obtenida
         for proforma in proformas:
@@ -352,27 +549,31 @@ def api_obtener_proformas():
             
             if not proforma.get('author'):
                 proforma['author'] = 'Usuario Eliminado'
+            proforma.pop('relevancia', None)
 
-            cur.execute("SELECT * FROM proforma_items WHERE proforma_id = %s", [proforma['id']])
-            items = cur.fetchall()
-            
             proforma['items'] = [
                 {"item_descripcion": item['item_descripcion'], "cantidad": float(item['cantidad']), "precio_unitario": float(item['precio_unitario'])}
-                for item in items
+                for item in items_por_proforma[proforma['id']]
             ]
         
         cur.close()
         
         # Devolver tanto los datos como la información de paginación
-        return jsonify({
+        pagination = {
+            'per_page': per_page,
+            'has_more': has_more,
+            # Los resultados por relevancia no siguen el orden de id: se paginan con ?page=
+            'next_after_id': proformas[-1]['id'] if has_more and not por_relevancia else None,
+            'total_results': total_results
+        }
+        if total_results is not None:
+            pagination['total_pages'] = (total_results + per_page - 1) // per_page
+        if after_id is None:
+            pagination['page'] = page
+        return respuesta_condicional(jsonify({
             'proformas': proformas,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total_pages': total_pages,
-                'total_results': total_results
-            }
-        })
+            'pagination': pagination
+        }))
 
     except Exception as e:
         print(f"Error en api_obtener_proformas: {e}", file=sys.stderr)
@@ -384,111 +585,180 @@ def api_eliminar_proforma(id):
         return jsonify({"success": False, "error": "No autorizado"}), 401
         
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
-        cur.execute("SELECT user_id FROM proformas WHERE id = %s", [id])
+        cur.execute("SELECT user_id, monto_total, fecha, status FROM proformas WHERE id = %s FOR UPDATE", [id])
         proforma = cur.fetchone()
 
         if not proforma or proforma['user_id'] != session['id']:
             return jsonify({"success": False, "error": "No tiene permiso para eliminar esta proforma."}), 403
 
+        anteriores = items_para_catalogo(cur, session['id'], [id])
         cur.execute("DELETE FROM proformas WHERE id = %s", [id])
-        mysql.connection.commit()
+        busqueda.eliminar_del_indice(cur, [id])
+        estadisticas.registrar_cambio(cur, session['id'], anterior=proforma)
+        confirmar_con_catalogo(session['id'], quitados=anteriores)
+        cache_pdf.invalidar(id)
+        invalidar_conteos(session['id'])
         cur.close()
         return jsonify({"success": True})
     except Exception as e:
         mysql.connection.rollback()
         return jsonify({"success": False, "error": "Error interno del servidor."}), 500
 
+# --- CACHÉ CONDICIONAL (ETag / If-None-Match) ---
+# Las respuestas de una proforma (JSON y PDF) dependen sólo de su fila y sus items,
+# y toda edición de items sube la versión: el ETag se arma con la versión y el estado
+# (que cambia sin subir la versión), así que se responde 304 sin leer los items.
+# "no-cache" obliga al navegador a preguntar cada vez; "private", a no compartirlo.
+def etag_proforma(proforma, tipo):
+    etag = f"{tipo}-{proforma['id']}-v{proforma['version']}-{proforma['status']}"
+    if tipo == 'pdf':
+        etag += f"-t{PLANTILLA_PDF_VERSION}"
+    return etag
+
+def no_modificado(etag):
+    return request.if_none_match.contains_weak(etag)
+
+def con_etag(response, etag):
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def respuesta_no_modificada(etag):
+    return con_etag(Response(status=304), etag)
+
+def respuesta_condicional(response):
+    """ETag por contenido, para listas sin versión propia: ahorra la descarga, no la consulta."""
+    response.add_etag()
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
 # --- RUTA DE GENERACIÓN DE PDF (VERSIÓN PROFESIONAL) ---
+def obtener_pdf(proforma, items, renderizar=None, origen='individual'):
+    """Devuelve los bytes del PDF, de la caché si ya generamos este mismo PDF (mismos datos y plantilla)."""
+    clave = clave_pdf(proforma, items)
+    contenido = cache_pdf.obtener(proforma['id'], clave)
+    metricas.registrar_cache_pdf(contenido is not None)
+    if contenido is None:
+        if renderizar is None:
+            from pdf_render import renderizar_proforma as renderizar
+        inicio = time.perf_counter()
+        contenido = renderizar(proforma, items)
+        metricas.registrar_pdf(time.perf_counter() - inicio, len(contenido), origen)
+        cache_pdf.guardar(proforma['id'], clave, contenido)
+    return contenido
+
+def nombre_pdf(proforma):
+    filename = f"proforma_{proforma['cotizacion_nro']}.pdf"
+    return re.sub(r'[^a-zA-Z0-9_.-]', '', filename)
+
+def respuesta_pdf(id, disposicion):
+    """Genera (o toma de la caché) el PDF de la proforma; 'inline' para ver, 'attachment' para descargar."""
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT * FROM proformas WHERE id = %s AND user_id = %s", (id, session['id']))
+    proforma = cur.fetchone()
+    
+    if not proforma:
+        cur.close()
+        return Response("Proforma no encontrada o no tiene permiso.", status=404, mimetype='text/plain')
+
+    # Si el navegador ya tiene esta versión del PDF, no se leen los items ni se dibuja
+    etag = etag_proforma(proforma, 'pdf')
+    if no_modificado(etag):
+        cur.close()
+        return respuesta_no_modificada(etag)
+
+    items = obtener_items_por_proforma(cur, [id])[id]
+    cur.close()
+
+    contenido = obtener_pdf(proforma, items)
+    response = Response(contenido, mimetype='application/pdf', headers={'Content-Disposition':f'{disposicion}; filename={nombre_pdf(proforma)}'})
+    return con_etag(response, etag)
+
 @app.route('/api/proforma/<int:id>/pdf')
 def generar_pdf(id):
     if 'loggedin' not in session:
         return redirect(url_for('login'))
 
     try:
-        mysql.connection.ping()
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM proformas WHERE id = %s AND user_id = %s", (id, session['id']))
-        proforma = cur.fetchone()
-        
-        if not proforma:
-            return Response("Proforma no encontrada o no tiene permiso.", status=404, mimetype='text/plain')
-
-        cur.execute("SELECT * FROM proforma_items WHERE proforma_id = %s", [id])
-        items = cur.fetchall()
-        cur.close()
-
-        pdf = PDF()
-        pdf.incluye_igv = proforma['incluye_igv']
-        
-        # add_page ahora se encarga de todo (fondo y header)
-        pdf.add_page() 
-        
-        # Establecemos los márgenes para que el texto no quede debajo de la franja
-        pdf.set_left_margin(45)
-        pdf.set_right_margin(15)
-        pdf.set_y(55) # Bajamos el cursor para empezar después del header
-
-        # Datos del cliente
-        pdf.set_font('Helvetica', '', 11)
-        fecha_formateada = proforma['fecha'].strftime('%d/%m/%Y') if proforma.get('fecha') else ''
-        pdf.cell(0, 7, f"Fecha: {fecha_formateada}", 0, 1)
-        pdf.cell(0, 7, f"Cotizacion Nro: {proforma['cotizacion_nro']}", 0, 1)
-        pdf.cell(0, 7, f"Cliente: {proforma['cliente']}", 0, 1)
-        pdf.ln(5)
-
-        # Mensaje de saludo
-        pdf.set_font('Helvetica', 'I', 11)
-        pdf.multi_cell(0, 7, "Estimado Cliente. Aqui le enviamos la proforma del trabajo a tratar.", 0, 'L')
-        pdf.ln(5)
-
-        # Tabla de items (con anchos ajustados)
-        pdf.set_font('Helvetica', 'B', 11)
-        pdf.cell(80, 10, 'Item', 1, 0, 'C')
-        pdf.cell(20, 10, 'Cant.', 1, 0, 'C')
-        pdf.cell(25, 10, 'P. Unit.', 1, 0, 'C')
-        pdf.cell(25, 10, 'Costo', 1, 1, 'C')
-
-        pdf.set_font('Helvetica', '', 10)
-        subtotal = 0.0
-        for item in items:
-            costo = float(item['cantidad']) * float(item['precio_unitario'])
-            subtotal += costo
-            pdf.cell(80, 10, str(item['item_descripcion']), 1, 0)
-            pdf.cell(20, 10, str(item['cantidad']), 1, 0, 'R')
-            pdf.cell(25, 10, f"S/ {float(item['precio_unitario']):.2f}", 1, 0, 'R')
-            pdf.cell(25, 10, f"S/ {costo:.2f}", 1, 1, 'R')
-        
-        pdf.ln(10)
-        
-        # Totales alineados a la derecha
-        pdf.set_font('Helvetica', 'B', 12)
-        pdf.set_x(100)
-        pdf.cell(40, 10, 'SUBTOTAL:', 0, 0, 'R')
-        pdf.cell(25, 10, f"S/ {subtotal:.2f}", 0, 1, 'R')
-        
-        total_final = subtotal
-        if proforma['incluye_igv']:
-            igv = subtotal * 0.18
-            pdf.set_x(100)
-            pdf.cell(40, 10, 'IGV (18%):', 0, 0, 'R')
-            pdf.cell(25, 10, f"S/ {igv:.2f}", 0, 1, 'R')
-            total_final += igv
-
-        pdf.set_font('Helvetica', 'B', 14)
-        pdf.set_x(100)
-        pdf.cell(40, 10, 'TOTAL:', 0, 0, 'R')
-        pdf.cell(25, 10, f"S/ {total_final:.2f}", 0, 1, 'R')
-        
-        filename = f"proforma_{proforma['cotizacion_nro']}.pdf"
-        sanitized_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', filename)
-        
-        return Response(bytes(pdf.output()), mimetype='application/pdf', headers={'Content-Disposition':f'attachment;filename={sanitized_filename}'})
+        return respuesta_pdf(id, 'attachment')
     except Exception as e:
         print(f"Error al generar PDF para proforma {id}: {e}", file=sys.stderr)
         return Response("Error interno al generar el archivo PDF.", status=500, mimetype='text/plain')
 
+# --- RUTA PARA DESCARGAR VARIAS PROFORMAS EN UN ZIP ---
+def seleccion_zip(ids, search_term):
+    """Normaliza qué proformas van en el ZIP: ids explícitos y/o término de búsqueda."""
+    if ids is not None:
+        try:
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            raise ValueError("Lista de ids no válida")
+        if not ids:
+            raise ValueError("No se indicó ninguna proforma")
+    return {'ids': ids, 'search': search_term or ''}
+
+def proformas_para_zip(cur, user_id, seleccion):
+    """Carga las proformas seleccionadas y sus items, respetando el tope por ZIP."""
+    params = [user_id]
+    base_query = "SELECT p.* FROM proformas p "
+    where_clauses = ["p.user_id = %s"]
+    if seleccion['ids'] is not None:
+        where_clauses.append("p.id IN (" + ", ".join(["%s"] * len(seleccion['ids'])) + ")")
+        params.extend(seleccion['ids'])
+    if seleccion['search']:
+        join_busqueda, where_busqueda, params_busqueda, _ = busqueda.condicion_busqueda(seleccion['search'])
+        base_query += join_busqueda
+        where_clauses.append(where_busqueda)
+        params.extend(params_busqueda)
+
+    max_proformas = app.config['PDF_ZIP_MAX_PROFORMAS']
+    query = base_query + " WHERE " + " AND ".join(where_clauses) + " ORDER BY p.id DESC LIMIT %s"
+    cur.execute(query, params + [max_proformas + 1])
+    proformas = list(cur.fetchall())
+    if len(proformas) > max_proformas:
+        raise ValueError(f"Demasiadas proformas; el máximo por descarga es {max_proformas}")
+    if not proformas:
+        raise LookupError("No hay proformas para exportar")
+    return proformas, obtener_items_por_proforma(cur, [p['id'] for p in proformas])
+
+@app.route('/api/proformas/pdf_zip', methods=['GET', 'POST'])
+def exportar_pdfs_zip():
+    if 'loggedin' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    try:
+        # Se aceptan ids explícitos (JSON o ?ids=1,2,3) o los mismos filtros que /api/proformas
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+        if ids is None and request.args.get('ids'):
+            ids = request.args.get('ids').split(',')
+        try:
+            seleccion = seleccion_zip(ids, data.get('search', request.args.get('search', '')))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        cur = mysql.connection.cursor()
+        try:
+            proformas, items_por_proforma = proformas_para_zip(cur, session['id'], seleccion)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        finally:
+            cur.close()
+
+        from pdf_lotes import generar_zip
+        return Response(
+            generar_zip(proformas, items_por_proforma, cache_pdf, app.config['PDF_WORKERS'],
+                        metricas.registrar_pdf),
+            mimetype='application/zip',
+            headers={'Content-Disposition': 'attachment; filename=proformas.zip'}
+        )
+    except Exception as e:
+        print(f"Error al exportar PDFs en ZIP: {e}", file=sys.stderr)
+        return jsonify({"error": "Error al generar el archivo ZIP"}), 500
+
 # --- NUEVAS RUTAS PARA GESTIÓN DE CLIENTES ---
 
 # Ruta para mostrar la página de gestión de clientes
@@ -498,18 +768,117 @@ def clientes():
         return redirect(url_for('login'))
     return render_template('clientes.html')
 
-# API para OBTENER todos los clientes del usuario logueado
+# --- LISTA Y SINCRONIZACIÓN DE CLIENTES ---
+# La lista se pide por páginas ordenadas por nombre (cursor: nombre e id del último
+# cliente recibido, que recorre el índice (user_id, nombre) sin ordenar). Cada respuesta
+# trae un token `sync`; con ?since=<token> se reciben sólo los clientes creados o
+# modificados desde entonces y los ids de los eliminados.
+COLUMNAS_CLIENTE = "id, nombre, ruc_dni, direccion, telefono, email"
+# Una escritura que empezó antes de emitir el token puede confirmarse después: se
+# repiten los cambios de estos últimos segundos (el navegador los aplica sin duplicar)
+MARGEN_SINCRONIZACION = timedelta(seconds=5)
+
+def pagina_clientes(cur, user_id, args):
+    per_page = min(max(args.get('per_page', app.config['CLIENTES_POR_PAGINA'], type=int), 1), 500)
+    after_id = args.get('after_id', type=int)
+    params = [user_id]
+    cursor_clause = ""
+    if after_id is not None:
+        after_nombre = args.get('after_nombre', '')
+        cursor_clause = " AND (nombre > %s OR (nombre = %s AND id > %s))"
+        params += [after_nombre, after_nombre, after_id]
+    cur.execute(
+        f"SELECT {COLUMNAS_CLIENTE} FROM clientes WHERE user_id = %s{cursor_clause} ORDER BY nombre, id LIMIT %s",
+        params + [per_page + 1]
+    )
+    clientes = list(cur.fetchall())
+    has_more = len(clientes) > per_page
+    clientes = clientes[:per_page]
+    return {
+        'clientes': clientes,
+        'pagination': {
+            'per_page': per_page,
+            'has_more': has_more,
+            'next_after_id': clientes[-1]['id'] if has_more else None,
+            'next_after_nombre': clientes[-1]['nombre'] if has_more else None,
+        },
+    }
+
+def etag_clientes(cur, user_id, args):
+    """ETag de una página: cambia con cualquier alta, edición o baja de clientes del usuario.
+
+    Se arma con la última modificación y el total (una baja sólo cambia el total) y con
+    el cursor y el tamaño pedidos; el token `sync` de la respuesta queda fuera, así que
+    una página que no cambió recibe 304 aunque el token sea otro. Lee sólo el índice
+    (user_id, updated_at), no las filas.
+    """
+    cur.execute("SELECT MAX(updated_at) AS actualizado, COUNT(*) AS total FROM clientes WHERE user_id = %s",
+                [user_id])
+    estado = cur.fetchone()
+    actualizado = estado['actualizado'].isoformat() if estado['actualizado'] else None
+    clave = json.dumps([user_id, actualizado, estado['total'], args.get('after_nombre'),
+                        args.get('after_id'), args.get('per_page')])
+    return 'clientes-' + hashlib.sha1(clave.encode('utf-8')).hexdigest()
+
+def cambios_clientes(cur, user_id, desde, ahora):
+    # Los eliminados se olvidan pasado un tiempo: con un token más antiguo hay que recargar
+    if desde < ahora - timedelta(days=app.config['CLIENTES_SYNC_DIAS']):
+        return {'reset': True}
+    desde -= MARGEN_SINCRONIZACION
+    limite = app.config['CLIENTES_SYNC_MAX']
+    cur.execute(
+        f"SELECT {COLUMNAS_CLIENTE} FROM clientes WHERE user_id = %s AND updated_at >= %s LIMIT %s",
+        (user_id, desde, limite + 1)
+    )
+    cambiados = list(cur.fetchall())
+    if len(cambiados) > limite:
+        return {'reset': True}
+    cur.execute("SELECT cliente_id FROM clientes_eliminados WHERE user_id = %s AND eliminado >= %s",
+                (user_id, desde))
+    return {'clientes': cambiados, 'deleted': [fila['cliente_id'] for fila in cur.fetchall()]}
+
+# API para OBTENER los clientes del usuario logueado
 @app.route('/api/clientes', methods=['GET'])
 def api_obtener_clientes():
+    """Una página de clientes ordenada por nombre, o los cambios desde un token.
+
+    Página:  ?per_page=100&after_nombre=...&after_id=...
+             -> {"clientes": [...], "pagination": {...}, "sync": token}
+    Cambios: ?since=<token>
+             -> {"clientes": [creados o modificados], "deleted": [ids], "sync": token}
+             o {"reset": true, "sync": token} si hay que volver a cargar la lista
+
+    Las páginas llevan ETag (ver etag_clientes) y responden 304 a If-None-Match; los
+    cambios no, porque cada token pide algo distinto.
+    """
     if 'loggedin' not in session:
         return jsonify({"error": "No autorizado"}), 401
+    since = request.args.get('since')
+    if since is not None:
+        try:
+            desde = datetime.fromisoformat(since)
+        except ValueError:
+            return jsonify({"error": "Token de sincronización no válido"}), 400
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM clientes WHERE user_id = %s ORDER BY nombre ASC", [session['id']])
-        clientes = cur.fetchall()
+        etag = None
+        if since is None:
+            etag = etag_clientes(cur, session['id'], request.args)
+            if no_modificado(etag):
+                cur.close()
+                return respuesta_no_modificada(etag)
+        # El token es la hora de MySQL antes de leer: lo que cambie después entra en la próxima
+        cur.execute("SELECT NOW(6) AS ahora")
+        ahora = cur.fetchone()['ahora']
+        if since is not None:
+            respuesta = cambios_clientes(cur, session['id'], desde, ahora)
+        else:
+            respuesta = pagina_clientes(cur, session['id'], request.args)
         cur.close()
-        return jsonify(clientes)
+        respuesta['sync'] = ahora.isoformat()
+        if etag:
+            return con_etag(jsonify(respuesta), etag)
+        return jsonify(respuesta)
     except Exception as e:
         print(f"Error en api_obtener_clientes: {e}", file=sys.stderr)
         return jsonify({"error": "Error al obtener los clientes"}), 500
@@ -520,7 +889,6 @@ def api_crear_cliente():
     if 'loggedin' not in session:
         return jsonify({"error": "No autorizado"}), 401
     try:
-        mysql.connection.ping()
         data = request.get_json()
         
         if not data or not data.get('nombre'):
@@ -532,6 +900,7 @@ def api_crear_cliente():
             (session['id'], data['nombre'], data.get('ruc_dni'), data.get('direccion'), data.get('telefono'), data.get('email'))
         )
         mysql.connection.commit()
+        clientes_cambiados(session['id'])
         cur.close()
         return jsonify({"success": True})
     except Exception as e:
@@ -545,7 +914,6 @@ def api_actualizar_cliente(id):
     if 'loggedin' not in session:
         return jsonify({"error": "No autorizado"}), 401
     try:
-        mysql.connection.ping()
         data = request.get_json()
         if not data or not data.get('nombre'):
             return jsonify({"success": False, "error": "El nombre es obligatorio"}), 400
@@ -561,6 +929,7 @@ def api_actualizar_cliente(id):
             (data['nombre'], data.get('ruc_dni'), data.get('direccion'), data.get('telefono'), data.get('email'), id)
         )
         mysql.connection.commit()
+        clientes_cambiados(session['id'])
         cur.close()
         return jsonify({"success": True})
     except Exception as e:
@@ -574,14 +943,22 @@ def api_eliminar_cliente(id):
     if 'loggedin' not in session:
         return jsonify({"error": "No autorizado"}), 401
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
         cur.execute("SELECT id FROM clientes WHERE id = %s AND user_id = %s", (id, session['id']))
         if not cur.fetchone():
             return jsonify({"success": False, "error": "Cliente no encontrado o sin permisos"}), 404
         
         cur.execute("DELETE FROM clientes WHERE id = %s", [id])
+        cur.execute(
+            "INSERT INTO clientes_eliminados (cliente_id, user_id, eliminado) VALUES (%s, %s, NOW(6))",
+            (id, session['id'])
+        )
+        cur.execute(
+            "DELETE FROM clientes_eliminados WHERE user_id = %s AND eliminado < NOW(6) - INTERVAL %s DAY",
+            (session['id'], app.config['CLIENTES_SYNC_DIAS'])
+        )
         mysql.connection.commit()
+        clientes_cambiados(session['id'])
         cur.close()
         return jsonify({"success": True})
     except Exception as e:
@@ -598,7 +975,6 @@ def api_obtener_proforma_por_id(id):
         return jsonify({"error": "No autorizado"}), 401
     
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
         
         cur.execute("SELECT * FROM proformas WHERE id = %s AND user_id = %s", (id, session['id']))
@@ -607,21 +983,26 @@ def api_obtener_proforma_por_id(id):
         if not proforma:
             return jsonify({"error": "Proforma no encontrada o sin permisos"}), 404
 
-        cur.execute("SELECT * FROM proforma_items WHERE proforma_id = %s", [id])
-        items = cur.fetchall()
+        etag = etag_proforma(proforma, 'json')
+        if no_modificado(etag):
+            cur.close()
+            return respuesta_no_modificada(etag)
+
+        items = obtener_items_por_proforma(cur, [id])[id]
         cur.close()
 
         proforma['fecha'] = proforma['fecha'].strftime('%Y-%m-%d')
         proforma['monto_total'] = float(proforma['monto_total'])
         proforma['items'] = [
             {
+                "id": item['id'],
                 "item": item['item_descripcion'],
                 "cantidad": float(item['cantidad']),
                 "precio_unitario": float(item['precio_unitario'])
             } for item in items
         ]
         
-        return jsonify(proforma)
+        return con_etag(jsonify(proforma), etag)
     except Exception as e:
         print(f"Error en api_obtener_proforma_por_id: {e}", file=sys.stderr)
         return jsonify({"error": "Error al obtener los datos de la proforma"}), 500
@@ -633,38 +1014,173 @@ def api_actualizar_proforma(id):
         return jsonify({"success": False, "error": "No autorizado"}), 401
     
     try:
-        mysql.connection.ping()
         data = request.get_json()
         cur = mysql.connection.cursor()
 
-        cur.execute("SELECT user_id FROM proformas WHERE id = %s", [id])
+        cur.execute("SELECT user_id, monto_total, fecha, status, version FROM proformas WHERE id = %s FOR UPDATE", [id])
         proforma_owner = cur.fetchone()
         if not proforma_owner or proforma_owner['user_id'] != session['id']:
             return jsonify({"success": False, "error": "Permiso denegado"}), 403
+        if 'version' in data and data['version'] != proforma_owner['version']:
+            return respuesta_version_desactualizada(proforma_owner['version'])
 
         nuevo_total = sum(float(item['precio_unitario']) * float(item['cantidad']) for item in data['items'])
         cur.execute(
-            """UPDATE proformas SET cotizacion_nro = %s, fecha = %s, cliente = %s, incluye_igv = %s, monto_total = %s
+            """UPDATE proformas SET cotizacion_nro = %s, fecha = %s, cliente = %s, incluye_igv = %s, monto_total = %s,
+                      version = version + 1
                WHERE id = %s""",
             (data['cotizacion_nro'], data['fecha'], data['cliente'], data['incluye_igv'], nuevo_total, id)
         )
 
+        anteriores = items_para_catalogo(cur, session['id'], [id])
         cur.execute("DELETE FROM proforma_items WHERE proforma_id = %s", [id])
-        for item in data['items']:
-            cur.execute(
-                "INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario) VALUES (%s, %s, %s, %s)",
-                (id, item['item'], item['cantidad'], item['precio_unitario'])
-            )
+        insertar_items(cur, id, data['items'])
         
-        mysql.connection.commit()
+        busqueda.indexar_proformas(cur, [id])
+        estadisticas.registrar_cambio(cur, session['id'], anterior=proforma_owner, nueva={
+            'monto_total': nuevo_total, 'fecha': data['fecha'], 'status': proforma_owner['status']
+        })
+        confirmar_con_catalogo(session['id'], agregados=lineas_catalogo(data['items']), quitados=anteriores)
+        cache_pdf.invalidar(id)
+        invalidar_conteos(session['id'])
         cur.close()
-        return jsonify({"success": True, "proforma_id": id})
+        return jsonify({"success": True, "proforma_id": id, "version": proforma_owner['version'] + 1})
     except Exception as e:
         mysql.connection.rollback()
         print(f"Error en api_actualizar_proforma: {e}", file=sys.stderr)
         return jsonify({"success": False, "error": "Error interno del servidor al actualizar."}), 500
 
+def respuesta_version_desactualizada(version_actual):
+    mysql.connection.rollback()
+    return jsonify({
+        "success": False,
+        "error": "La proforma fue modificada en otra ventana. Recargue para ver los últimos cambios.",
+        "version": version_actual
+    }), 409
+
+# API para ACTUALIZAR PARCIALMENTE (PATCH) una proforma: sólo los items que cambiaron
+@app.route('/api/proformas/<int:id>', methods=['PATCH'])
+def api_modificar_proforma(id):
+    """Aplica cambios a nivel de item sin borrar y reinsertar toda la proforma.
+
+    Cuerpo esperado:
+        {"version": 3,
+         "cotizacion_nro": ..., "fecha": ..., "cliente": ..., "incluye_igv": ...,   (opcionales)
+         "items": {"add": [{"item", "cantidad", "precio_unitario"}],
+                   "change": [{"id", "item"?, "cantidad"?, "precio_unitario"?}],
+                   "remove": [id, ...]}}
+    La versión es obligatoria: si otra ventana guardó antes, se responde 409.
+    """
+    if 'loggedin' not in session:
+        return jsonify({"success": False, "error": "No autorizado"}), 401
+
+    try:
+        data = request.get_json() or {}
+        if 'version' not in data:
+            return jsonify({"success": False, "error": "Falta la versión de la proforma"}), 400
+        cambios_items = data.get('items') or {}
+        agregar = cambios_items.get('add') or []
+        modificar = cambios_items.get('change') or []
+        quitar = [int(item_id) for item_id in cambios_items.get('remove') or []]
+        # Cada item se quita o se modifica una sola vez: un id repetido descontaría su total dos veces
+        ids_afectados = quitar + [int(item['id']) for item in modificar]
+        if len(set(ids_afectados)) != len(ids_afectados):
+            return jsonify({"success": False, "error": "Un mismo item aparece más de una vez en los cambios"}), 400
+
+        cur = mysql.connection.cursor()
+        cur.execute("SELECT * FROM proformas WHERE id = %s FOR UPDATE", [id])
+        proforma = cur.fetchone()
+        if not proforma or proforma['user_id'] != session['id']:
+            return jsonify({"success": False, "error": "Permiso denegado"}), 403
+        if data['version'] != proforma['version']:
+            return respuesta_version_desactualizada(proforma['version'])
+
+        # Leemos sólo los items que se van a tocar, para calcular la diferencia del total
+        actuales = {}
+        if ids_afectados:
+            placeholders = ", ".join(["%s"] * len(ids_afectados))
+            cur.execute(
+                f"SELECT id, item_descripcion, cantidad, precio_unitario FROM proforma_items WHERE proforma_id = %s AND id IN ({placeholders})",
+                [id] + ids_afectados
+            )
+            actuales = {item['id']: item for item in cur.fetchall()}
+            if len(actuales) != len(ids_afectados):
+                mysql.connection.rollback()
+                return jsonify({"success": False, "error": "Algún item no pertenece a esta proforma"}), 400
+
+        delta = 0.0
+        if quitar:
+            delta -= sum(float(actuales[item_id]['cantidad']) * float(actuales[item_id]['precio_unitario']) for item_id in quitar)
+            placeholders = ", ".join(["%s"] * len(quitar))
+            cur.execute(f"DELETE FROM proforma_items WHERE proforma_id = %s AND id IN ({placeholders})", [id] + quitar)
+
+        descripciones_cambiadas = bool(agregar or quitar)
+        # Líneas que el catálogo de items debe descontar y sumar
+        quitados_catalogo = [(actuales[item_id]['item_descripcion'], actuales[item_id]['precio_unitario']) for item_id in quitar]
+        agregados_catalogo = lineas_catalogo(agregar)
+        for cambio in modificar:
+            actual = actuales[int(cambio['id'])]
+            descripcion = cambio.get('item', actual['item_descripcion'])
+            cantidad = cambio.get('cantidad', actual['cantidad'])
+            precio = cambio.get('precio_unitario', actual['precio_unitario'])
+            delta += float(cantidad) * float(precio) - float(actual['cantidad']) * float(actual['precio_unitario'])
+            descripciones_cambiadas = descripciones_cambiadas or descripcion != actual['item_descripcion']
+            if descripcion != actual['item_descripcion'] or float(precio) != float(actual['precio_unitario']):
+                quitados_catalogo.append((actual['item_descripcion'], actual['precio_unitario']))
+                agregados_catalogo.append((descripcion, precio))
+            cur.execute(
+                "UPDATE proforma_items SET item_descripcion = %s, cantidad = %s, precio_unitario = %s WHERE id = %s",
+                (descripcion, cantidad, precio, actual['id'])
+            )
+
+        if agregar:
+            delta += sum(float(item['precio_unitario']) * float(item['cantidad']) for item in agregar)
+            insertar_items(cur, id, agregar)
+
+        # Cabecera: sólo se actualizan los campos enviados
+        cabecera = {campo: data[campo] for campo in ('cotizacion_nro', 'fecha', 'cliente', 'incluye_igv') if campo in data}
+        asignaciones = "".join(f"{campo} = %s, " for campo in cabecera)
+        cur.execute(
+            f"UPDATE proformas SET {asignaciones}monto_total = monto_total + %s, version = version + 1 WHERE id = %s",
+            list(cabecera.values()) + [round(delta, 2), id]
+        )
+        nuevo_total = float(proforma['monto_total']) + delta
+
+        if descripciones_cambiadas or 'cliente' in cabecera or 'cotizacion_nro' in cabecera:
+            busqueda.indexar_proformas(cur, [id])
+        estadisticas.registrar_cambio(cur, session['id'], anterior=proforma, nueva=dict(
+            proforma, monto_total=nuevo_total, fecha=cabecera.get('fecha', proforma['fecha'])
+        ))
+        confirmar_con_catalogo(session['id'], agregados=agregados_catalogo, quitados=quitados_catalogo)
+        cache_pdf.invalidar(id)
+        if 'cliente' in cabecera or 'cotizacion_nro' in cabecera or descripciones_cambiadas:
+            invalidar_conteos(session['id'])
+        cur.close()
+        return jsonify({"success": True, "proforma_id": id, "version": proforma['version'] + 1,
+                        "monto_total": round(nuevo_total, 2)})
+    except (KeyError, TypeError, ValueError):
+        mysql.connection.rollback()
+        return jsonify({"success": False, "error": "Datos de la modificación no válidos"}), 400
+    except Exception as e:
+        mysql.connection.rollback()
+        print(f"Error en api_modificar_proforma: {e}", file=sys.stderr)
+        return jsonify({"success": False, "error": "Error interno del servidor al actualizar."}), 500
+
 # --- NUEVA RUTA API PARA AUTOCOMPLETADO DE CLIENTES ---
+indice_clientes = IndiceClientes()
+
+def cargar_clientes_para_indice(user_id):
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT id, nombre, ruc_dni, direccion, telefono, email FROM clientes WHERE user_id = %s", [user_id])
+    clientes = cur.fetchall()
+    cur.close()
+    return clientes
+
+def clientes_cambiados(user_id):
+    """Tras el commit: descarta el índice de este proceso y avisa a los demás workers."""
+    indice_clientes.invalidar(user_id)
+    cache_compartido.publicar('clientes', user_id)
+
 @app.route('/api/clientes/search')
 def api_search_clientes():
     if 'loggedin' not in session:
@@ -675,20 +1191,80 @@ def api_search_clientes():
         return jsonify([])
 
     try:
-        mysql.connection.ping()
-        cur = mysql.connection.cursor()
-        # Busca clientes cuyo nombre COMIENCE CON el término de búsqueda
-        query = "SELECT id, nombre, ruc_dni, direccion, telefono, email FROM clientes WHERE user_id = %s AND nombre LIKE %s LIMIT 10"
-        # El '%%' es para que SQL busque coincidencias parciales
-        like_term = f"{search_term}%"
-        cur.execute(query, (session['id'], like_term))
-        clientes = cur.fetchall()
-        cur.close()
+        # Busca clientes cuyo nombre, alguna palabra del nombre o RUC/DNI COMIENCE CON el
+        # término, sin distinguir tildes. Sólo se consulta la base de datos al construir el índice.
+        cache_compartido.comprobar('clientes', session['id'], indice_clientes.invalidar)
+        clientes = indice_clientes.buscar(session['id'], search_term, cargar_clientes_para_indice)
         return jsonify(clientes)
     except Exception as e:
         print(f"Error en api_search_clientes: {e}", file=sys.stderr)
         return jsonify([]), 500
 
+# --- CATÁLOGO DE ITEMS (AUTOCOMPLETADO DE LÍNEAS) ---
+# Descripciones ya cotizadas por el usuario con su frecuencia y precios (ver
+# catalogo_items.py). Se carga una vez y cada guardado le pasa sus líneas.
+catalogo_items = CatalogoItems()
+
+def cargar_catalogo_items(user_id):
+    cur = mysql.connection.cursor()
+    cur.execute(CONSULTA_CARGA, [user_id])
+    filas = cur.fetchall()
+    cur.close()
+    return filas
+
+def lineas_catalogo(items):
+    """(descripción, precio) de los items tal como llegan en el JSON de la proforma."""
+    return [(item['item'], item['precio_unitario']) for item in items]
+
+def registrar_en_catalogo(user_id, agregados=(), quitados=()):
+    """Tras el commit: aplica las líneas al catálogo de este proceso y avisa a los demás workers."""
+    catalogo_items.registrar(user_id, agregados, quitados)
+    cache_compartido.publicar('items', user_id)
+
+def confirmar_con_catalogo(user_id, agregados=(), quitados=()):
+    """Commit de un guardado que cambia líneas del usuario, y después registrar_en_catalogo.
+
+    El catálogo sabe del guardado desde antes del commit, así no conserva una carga
+    que ya haya leído estas líneas y a la que registrar() se las sumaría otra vez.
+    """
+    catalogo_items.iniciar_cambio(user_id)
+    try:
+        mysql.connection.commit()
+    except Exception:
+        catalogo_items.cancelar_cambio(user_id)
+        raise
+    registrar_en_catalogo(user_id, agregados, quitados)
+
+def items_para_catalogo(cur, user_id, proforma_ids):
+    """Líneas guardadas de unas proformas, sólo si el catálogo del usuario está en memoria (si no, None)."""
+    if not catalogo_items.cargado(user_id):
+        return None
+    marcadores = ", ".join(["%s"] * len(proforma_ids))
+    cur.execute(
+        f"SELECT item_descripcion, precio_unitario FROM proforma_items WHERE proforma_id IN ({marcadores})",
+        list(proforma_ids)
+    )
+    return [(item['item_descripcion'], item['precio_unitario']) for item in cur.fetchall()]
+
+@app.route('/api/items/search')
+def api_search_items():
+    if 'loggedin' not in session:
+        return jsonify([]), 401
+
+    search_term = request.args.get('term', '')
+    if not search_term:
+        return jsonify([])
+
+    try:
+        # Items cuya descripción (o alguna de sus palabras) COMIENCE CON el término, los
+        # más usados primero. Sólo se consulta la base de datos al cargar el catálogo.
+        cache_compartido.comprobar('items', session['id'], catalogo_items.invalidar)
+        items = catalogo_items.buscar(session['id'], search_term, cargar_catalogo_items)
+        return jsonify(items)
+    except Exception as e:
+        print(f"Error en api_search_items: {e}", file=sys.stderr)
+        return jsonify([]), 500
+
 # --- NUEVA RUTA API PARA VISTA PREVIA DE PDF (VERSIÓN COMPLETA Y CORREGIDA) ---
 @app.route('/api/proforma/<int:id>/preview')
 def preview_pdf(id):
@@ -696,83 +1272,7 @@ def preview_pdf(id):
         return redirect(url_for('login'))
 
     try:
-        mysql.connection.ping()
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT * FROM proformas WHERE id = %s AND user_id = %s", (id, session['id']))
-        proforma = cur.fetchone()
-        
-        if not proforma:
-            return Response("Proforma no encontrada o no tiene permiso.", status=404, mimetype='text/plain')
-
-        cur.execute("SELECT * FROM proforma_items WHERE proforma_id = %s", [id])
-        items = cur.fetchall()
-        cur.close()
-
-        pdf = PDF()
-        pdf.incluye_igv = proforma['incluye_igv']
-        pdf.add_page()
-        
-        # Mover el contenido a la derecha de la franja
-        pdf.set_left_margin(45)
-        pdf.set_right_margin(15)
-        pdf.set_y(55) # Bajar el cursor para empezar después del header
-
-        # Datos del cliente
-        pdf.set_font('Helvetica', '', 11)
-        fecha_formateada = proforma['fecha'].strftime('%d/%m/%Y') if proforma.get('fecha') else ''
-        pdf.cell(0, 7, f"Fecha: {fecha_formateada}", 0, 1)
-        pdf.cell(0, 7, f"Cotizacion Nro: {proforma['cotizacion_nro']}", 0, 1)
-        pdf.cell(0, 7, f"Cliente: {proforma['cliente']}", 0, 1)
-        pdf.ln(5)
-
-        # Mensaje de saludo
-        pdf.set_font('Helvetica', 'I', 11)
-        pdf.multi_cell(0, 7, "Estimado Cliente. Aqui le enviamos la proforma del trabajo a tratar.", 0, 'L')
-        pdf.ln(5)
-
-        # Tabla de items
-        pdf.set_font('Helvetica', 'B', 11)
-        pdf.cell(80, 10, 'Item', 1, 0, 'C')
-        pdf.cell(20, 10, 'Cant.', 1, 0, 'C')
-        pdf.cell(25, 10, 'P. Unit.', 1, 0, 'C')
-        pdf.cell(25, 10, 'Costo', 1, 1, 'C')
-
-        pdf.set_font('Helvetica', '', 10)
-        subtotal = 0.0
-        for item in items:
-            costo = float(item['cantidad']) * float(item['precio_unitario'])
-            subtotal += costo
-            pdf.cell(80, 10, str(item['item_descripcion']), 1, 0)
-            pdf.cell(20, 10, str(item['cantidad']), 1, 0, 'R')
-            pdf.cell(25, 10, f"S/ {float(item['precio_unitario']):.2f}", 1, 0, 'R')
-            pdf.cell(25, 10, f"S/ {costo:.2f}", 1, 1, 'R')
-        
-        pdf.ln(10)
-        
-        # Totales
-        pdf.set_font('Helvetica', 'B', 12)
-        pdf.set_x(100)
-        pdf.cell(40, 10, 'SUBTOTAL:', 0, 0, 'R')
-        pdf.cell(25, 10, f"S/ {subtotal:.2f}", 0, 1, 'R')
-        
-        total_final = subtotal
-        if proforma['incluye_igv']:
-            igv = subtotal * 0.18
-            pdf.set_x(100)
-            pdf.cell(40, 10, 'IGV (18%):', 0, 0, 'R')
-            pdf.cell(25, 10, f"S/ {igv:.2f}", 0, 1, 'R')
-            total_final += igv
-
-        pdf.set_font('Helvetica', 'B', 14)
-        pdf.set_x(100)
-        pdf.cell(40, 10, 'TOTAL:', 0, 0, 'R')
-        pdf.cell(25, 10, f"S/ {total_final:.2f}", 0, 1, 'R')
-        
-        filename = f"proforma_{proforma['cotizacion_nro']}.pdf"
-        sanitized_filename = re.sub(r'[^a-zA-Z0-9_.-]', '', filename)
-        
-        # La única diferencia clave: 'inline' para ver, 'attachment' para descargar
-        return Response(bytes(pdf.output()), mimetype='application/pdf', headers={'Content-Disposition':f'inline; filename={sanitized_filename}'})
+        return respuesta_pdf(id, 'inline')
     except Exception as e:
         print(f"Error al generar vista previa de PDF para proforma {id}: {e}", file=sys.stderr)
         return Response("Error interno al generar el archivo PDF.", status=500, mimetype='text/plain')
@@ -788,14 +1288,18 @@ def api_actualizar_status(id):
         if nuevo_status not in ['Enviada', 'Aprobada', 'Rechazada']:
             return jsonify({"success": False, "error": "Estado no válido"}), 400
 
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
-        # Verificación de permiso
-        cur.execute("UPDATE proformas SET status = %s WHERE id = %s AND user_id = %s", (nuevo_status, id, session['id']))
+        # Verificación de permiso (y bloqueo de la fila para actualizar el resumen)
+        cur.execute("SELECT monto_total, fecha, status FROM proformas WHERE id = %s AND user_id = %s FOR UPDATE", (id, session['id']))
+        anterior = cur.fetchone()
+        if not anterior: # Si no existe o es de otro usuario, no tiene permiso
+            mysql.connection.rollback()
+            return jsonify({"success": False, "error": "Proforma no encontrada o sin permisos"}), 404
+
+        cur.execute("UPDATE proformas SET status = %s WHERE id = %s", (nuevo_status, id))
+        estadisticas.registrar_cambio(cur, session['id'], anterior=anterior, nueva=dict(anterior, status=nuevo_status))
         mysql.connection.commit()
-
-        if cur.rowcount == 0: # Si no se actualizó ninguna fila, el usuario no tiene permiso
-             return jsonify({"success": False, "error": "Proforma no encontrada o sin permisos"}), 404
+        cache_pdf.invalidar(id)
 
         cur.close()
         return jsonify({"success": True, "new_status": nuevo_status})
@@ -804,6 +1308,121 @@ def api_actualizar_status(id):
         print(f"Error al actualizar estado: {e}", file=sys.stderr)
         return jsonify({"success": False, "error": "Error interno del servidor"}), 500
 
+# --- ACCIONES EN LOTE: CAMBIO DE ESTADO Y ELIMINACIÓN ---
+# Muchas proformas en una sola petición. El permiso se comprueba con una consulta por
+# lote (id IN (...) AND user_id) y cada lote de BULK_BATCH_SIZE filas es una
+# transacción: una selección enorme no retiene los bloqueos hasta terminar.
+ACCIONES_LOTE = ('status', 'delete')
+
+def ids_de_lote(valores):
+    """Ids enteros sin repetir, en el orden recibido (ValueError si alguno no lo es)."""
+    if not isinstance(valores, list):
+        raise ValueError("Se esperaba una lista de ids")
+    ids = []
+    for valor in valores:
+        if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+            raise ValueError(f"Id no válido: {valor!r}")
+        ids.append(int(valor))
+    return list(dict.fromkeys(ids))
+
+def bloquear_propias(cur, user_id, ids):
+    """Las proformas del usuario entre `ids`, bloqueadas (en orden de id), por id."""
+    marcadores = ", ".join(["%s"] * len(ids))
+    cur.execute(
+        f"""SELECT id, monto_total, fecha, status FROM proformas
+            WHERE id IN ({marcadores}) AND user_id = %s ORDER BY id FOR UPDATE""",
+        list(ids) + [user_id]
+    )
+    return {fila['id']: fila for fila in cur.fetchall()}
+
+def cambiar_status_lote(cur, user_id, ids, nuevo_status):
+    """Devuelve (proformas propias, ids cuyo estado cambió)."""
+    propias = bloquear_propias(cur, user_id, ids)
+    cambiadas = [id for id, proforma in propias.items() if proforma['status'] != nuevo_status]
+    if cambiadas:
+        marcadores = ", ".join(["%s"] * len(cambiadas))
+        cur.execute(f"UPDATE proformas SET status = %s WHERE id IN ({marcadores})", [nuevo_status] + cambiadas)
+        estadisticas.registrar_cambios(cur, user_id, [
+            (propias[id], dict(propias[id], status=nuevo_status)) for id in cambiadas
+        ])
+    return propias, cambiadas
+
+def eliminar_lote(cur, user_id, ids):
+    """Devuelve (proformas propias eliminadas, sus líneas para el catálogo)."""
+    propias = bloquear_propias(cur, user_id, ids)
+    if not propias:
+        return propias, []
+    eliminadas = list(propias)
+    lineas = items_para_catalogo(cur, user_id, eliminadas)
+    marcadores = ", ".join(["%s"] * len(eliminadas))
+    # Los items se eliminan en cascada
+    cur.execute(f"DELETE FROM proformas WHERE id IN ({marcadores})", eliminadas)
+    busqueda.eliminar_del_indice(cur, eliminadas)
+    estadisticas.registrar_cambios(cur, user_id, [(proforma, None) for proforma in propias.values()])
+    return propias, lineas
+
+@app.route('/api/proformas/bulk', methods=['POST'])
+def api_proformas_lote():
+    """{"action": "status", "status": ..., "ids": [...]} o {"action": "delete", "ids": [...]}."""
+    if 'loggedin' not in session:
+        return jsonify({"success": False, "error": "No autorizado"}), 401
+
+    data = request.get_json(silent=True) or {}
+    accion = data.get('action')
+    if accion not in ACCIONES_LOTE:
+        return jsonify({"success": False, "error": "Acción no válida (use status o delete)."}), 400
+    nuevo_status = data.get('status')
+    if accion == 'status' and nuevo_status not in ['Enviada', 'Aprobada', 'Rechazada']:
+        return jsonify({"success": False, "error": "Estado no válido"}), 400
+    try:
+        ids = ids_de_lote(data.get('ids'))
+    except ValueError:
+        return jsonify({"success": False, "error": "Lista de ids no válida."}), 400
+    if not ids:
+        return jsonify({"success": False, "error": "No se indicó ninguna proforma."}), 400
+    if len(ids) > app.config['BULK_MAX_IDS']:
+        return jsonify({"success": False,
+                        "error": f"Como máximo {app.config['BULK_MAX_IDS']} proformas por petición."}), 400
+
+    user_id = session['id']
+    tamano = app.config['BULK_BATCH_SIZE']
+    resultados = {}
+    cur = mysql.connection.cursor()
+    for inicio in range(0, len(ids), tamano):
+        lote = ids[inicio:inicio + tamano]
+        try:
+            if accion == 'status':
+                propias, afectadas = cambiar_status_lote(cur, user_id, lote, nuevo_status)
+                mysql.connection.commit()
+            else:
+                propias, lineas = eliminar_lote(cur, user_id, lote)
+                afectadas = list(propias)
+                if afectadas:
+                    confirmar_con_catalogo(user_id, quitados=lineas)
+                else:
+                    mysql.connection.commit()
+        except Exception as e:
+            # Un lote que falla no deshace los ya confirmados; los siguientes se intentan igual
+            mysql.connection.rollback()
+            print(f"Error en api_proformas_lote: {e}", file=sys.stderr)
+            for id in lote:
+                resultados[id] = {"success": False, "error": "Error interno del servidor."}
+            continue
+
+        for id in afectadas:
+            cache_pdf.invalidar(id)
+        if accion == 'delete' and afectadas:
+            invalidar_conteos(user_id)
+        for id in lote:
+            resultados[id] = ({"success": True} if id in propias
+                              else {"success": False, "error": "Proforma no encontrada o sin permisos"})
+    cur.close()
+
+    lista = [dict(resultados[id], id=id) for id in ids]
+    correctas = sum(1 for resultado in lista if resultado['success'])
+    return jsonify({"success": correctas == len(lista), "processed": correctas,
+                    "failed": len(lista) - correctas, "results": lista})
+
 # --- NUEVA RUTA API PARA ESTADÍSTICAS DEL DASHBOARD ---
 @app.route('/api/dashboard_stats')
 def dashboard_stats():
@@ -811,18 +1430,11 @@ def dashboard_stats():
         return jsonify({"error": "No autorizado"}), 401
 
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
-        # Contar proformas por mes en el último año
-        query = """
-            SELECT DATE_FORMAT(fecha, '%%Y-%%m') AS mes, COUNT(id) AS cantidad
-            FROM proformas
-            WHERE user_id = %s AND fecha >= DATE_SUB(CURDATE(), INTERVAL 1 YEAR)
-            GROUP BY mes
-            ORDER BY mes ASC;
-        """
-        cur.execute(query, [session['id']])
-        stats = cur.fetchall()
+        # Proformas por mes en el último año, leídas del resumen mensual
+        hoy = datetime.now()
+        desde_mes = f"{hoy.year - 1:04d}-{hoy.month:02d}"
+        stats = estadisticas.obtener_meses(cur, session['id'], desde_mes)
         cur.close()
 
         labels = [row['mes'] for row in stats]
@@ -833,64 +1445,135 @@ def dashboard_stats():
         print(f"Error en dashboard_stats: {e}", file=sys.stderr)
         return jsonify({"error": "Error al obtener estadísticas"}), 500
 
-# --- NUEVA RUTA API PARA EXPORTAR A EXCEL ---
+# --- ANALÍTICA: MONTO POR MES, ESTADOS, CLIENTES E IGV ---
+# Se calcula sobre el resumen diario (ver analitica.py), no sobre las proformas
+cache_analitica = analitica.CacheAnalitica()
+
+@app.route('/api/analitica')
+def api_analitica():
+    """Informe entre ?desde= y ?hasta= (AAAA-MM-DD; por defecto, los últimos doce meses)."""
+    if 'loggedin' not in session:
+        return jsonify({"success": False, "error": "No autorizado"}), 401
+
+    try:
+        hoy = datetime.now().date()
+        hasta = datetime.strptime(request.args['hasta'], '%Y-%m-%d').date() if request.args.get('hasta') else hoy
+        if request.args.get('desde'):
+            desde = datetime.strptime(request.args['desde'], '%Y-%m-%d').date()
+        else:
+            # Desde el primer día del mes, once meses antes de `hasta`
+            mes = hasta.year * 12 + hasta.month - 12
+            desde = hasta.replace(year=mes // 12, month=mes % 12 + 1, day=1)
+    except ValueError:
+        return jsonify({"success": False, "error": "Fecha no válida (use AAAA-MM-DD)."}), 400
+    if desde > hasta:
+        return jsonify({"success": False, "error": "La fecha inicial es posterior a la final."}), 400
+    top = min(max(request.args.get('top', analitica.TOP_CLIENTES, type=int), 1), 100)
+
+    try:
+        cur = mysql.connection.cursor()
+        # Primero los días que cambiaron desde el último informe (normalmente ninguno)
+        analitica.reconstruir_pendientes(cur, session['id'])
+        mysql.connection.commit()
+        informe = cache_analitica.informe(cur, session['id'], desde, hasta, top)
+        cur.close()
+        return jsonify(informe)
+    except Exception as e:
+        mysql.connection.rollback()
+        print(f"Error en api_analitica: {e}", file=sys.stderr)
+        return jsonify({"success": False, "error": "Error al calcular la analítica"}), 500
+
+# --- NUEVA RUTA API PARA EXPORTAR A EXCEL (O CSV) ---
+MIMETYPES_EXPORTACION = {
+    'csv': "text/csv; charset=utf-8",
+    'xlsx': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+def filtros_exportacion(datos):
+    """Valida formato, estado y rango de fechas (de la URL o del cuerpo de un trabajo)."""
+    formato = datos.get('formato') or 'xlsx'
+    if formato not in MIMETYPES_EXPORTACION:
+        raise ValueError("Formato no válido (use xlsx o csv).")
+    estado = datos.get('status') or None
+    if estado and estado not in ['Enviada', 'Aprobada', 'Rechazada']:
+        raise ValueError("Estado no válido.")
+    try:
+        desde = datetime.strptime(datos['desde'], '%Y-%m-%d').date().isoformat() if datos.get('desde') else None
+        hasta = datetime.strptime(datos['hasta'], '%Y-%m-%d').date().isoformat() if datos.get('hasta') else None
+    except (TypeError, ValueError):
+        raise ValueError("Fecha no válida (use AAAA-MM-DD).")
+    return {'formato': formato, 'status': estado, 'desde': desde, 'hasta': hasta}
+
+def consultar_exportacion(user_id, filtros):
+    """Abre un cursor del lado del servidor con las filas a exportar y lee el primer bloque."""
+    import exportacion
+    # Cursor del lado del servidor: las filas se leen por bloques en lugar de con fetchall()
+    cur = mysql.connection.cursor(MySQLdb.cursors.SSDictCursor)
+
+    params = [user_id]
+    where_clauses = ["p.user_id = %s"]
+    if filtros['desde']:
+        where_clauses.append("p.fecha >= %s")
+        params.append(filtros['desde'])
+    if filtros['hasta']:
+        where_clauses.append("p.fecha <= %s")
+        params.append(filtros['hasta'])
+    if filtros['status']:
+        where_clauses.append("p.status = %s")
+        params.append(filtros['status'])
+
+    sql = """
+        SELECT 
+            p.id, p.cotizacion_nro, p.fecha, p.cliente, p.monto_total, p.incluye_igv, p.status,
+            pi.item_descripcion, pi.cantidad, pi.precio_unitario
+        FROM 
+            proformas p
+        LEFT JOIN 
+            proforma_items pi ON p.id = pi.proforma_id
+        WHERE """ + " AND ".join(where_clauses) + """
+        ORDER BY 
+            p.id DESC, pi.id ASC
+    """
+    cur.execute(sql, params)
+    return cur, cur.fetchmany(exportacion.TAMANO_BLOQUE)
+
+def generar_exportacion(cur, primer_bloque, formato):
+    import exportacion
+    bloques = metricas.contar_filas(exportacion.bloques_de_filas(cur, primer_bloque), formato)
+    if formato == 'csv':
+        return exportacion.generar_csv(bloques)
+    return exportacion.generar_xlsx(bloques)
+
 @app.route('/api/proformas/export')
 def export_proformas_excel():
     if 'loggedin' not in session:
         return redirect(url_for('login'))
     
     try:
-        mysql.connection.ping()
-        cur = mysql.connection.cursor()
-        
-        # Usamos la misma consulta optimizada que para la lista
-        sql = """
-            SELECT 
-                p.id, p.cotizacion_nro, p.fecha, p.cliente, p.monto_total, p.incluye_igv, p.status,
-                pi.item_descripcion, pi.cantidad, pi.precio_unitario
-            FROM 
-                proformas p
-            LEFT JOIN 
-                proforma_items pi ON p.id = pi.proforma_id
-            WHERE p.user_id = %s
-            ORDER BY 
-                p.id DESC, pi.id ASC
-        """
-        cur.execute(sql, [session['id']])
-        results = cur.fetchall()
-        cur.close()
+        filtros = filtros_exportacion(request.args)
+    except ValueError as e:
+        return str(e), 400
+    formato = filtros['formato']
+
+    try:
+        cur, primer_bloque = consultar_exportacion(session['id'], filtros)
 
-        # Preparamos los datos para un formato plano de Excel
-        data_for_excel = []
-        for row in results:
-            data_for_excel.append({
-                'Nro Proforma': row['cotizacion_nro'],
-                'Fecha': row['fecha'].strftime('%Y-%m-%d') if row['fecha'] else '',
-                'Cliente': row['cliente'],
-                'Estado': row['status'],
-                'Item': row['item_descripcion'],
-                'Cantidad': row['cantidad'],
-                'Precio Unitario': row['precio_unitario'],
-                'Monto Total Proforma': row['monto_total'],
-                'Incluye IGV': 'Sí' if row['incluye_igv'] else 'No'
-            })
-
-        if not data_for_excel:
+        if not primer_bloque:
+            cur.close()
             return "No hay datos para exportar.", 404
 
-        # Usamos Pandas para crear el archivo de Excel en memoria
-        df = pd.DataFrame(data_for_excel)
-        output = io.BytesIO()
-        writer = pd.ExcelWriter(output, engine='openpyxl')
-        df.to_excel(writer, index=False, sheet_name='Proformas')
-        writer.close()
-        output.seek(0)
+        def generar():
+            try:
+                yield from generar_exportacion(cur, primer_bloque, formato)
+            finally:
+                cur.close()
 
-        # Preparamos la respuesta para que el navegador la descargue
+        # La respuesta se envía a medida que se generan las filas; stream_with_context
+        # mantiene viva la conexión de la petición mientras tanto
         return Response(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": "attachment;filename=reporte_proformas.xlsx"}
+            stream_with_context(generar()),
+            mimetype=MIMETYPES_EXPORTACION[formato],
+            headers={"Content-Disposition": f"attachment;filename=reporte_proformas.{formato}"}
         )
 
     except Exception as e:
@@ -904,29 +1587,214 @@ def api_next_proforma_number():
         return jsonify({"error": "No autorizado"}), 401
     
     try:
-        mysql.connection.ping()
         cur = mysql.connection.cursor()
         
-        # Se busca el valor numérico más alto en la columna cotizacion_nro
-        query = """
-            SELECT MAX(CAST(cotizacion_nro AS UNSIGNED)) as max_num 
-            FROM proformas 
-            WHERE user_id = %s
-        """
-        cur.execute(query, [session['id']])
-        result = cur.fetchone()
+        # Se lee la secuencia del usuario (sólo una sugerencia: el número se reserva al guardar)
+        next_number = secuencias.siguiente_sugerido(cur, session['id'])
+        mysql.connection.commit()
         cur.close()
 
-        if result and result['max_num']:
-            next_number = result['max_num'] + 1
-        else:
-            next_number = 1 # Si no hay proformas, empezamos en 1
-
         return jsonify({'next_number': next_number})
     except Exception as e:
         print(f"Error en api_next_proforma_number: {e}", file=sys.stderr)
         return jsonify({"error": "Error al obtener el número de proforma"}), 500
 
+# --- RUTA API CON LAS MÉTRICAS DEL POOL DE CONEXIONES ---
+@app.route('/api/db_pool')
+def api_db_pool():
+    if 'loggedin' not in session or session.get('role') != 'admin':
+        return jsonify({"error": "No autorizado"}), 401
+    return jsonify(mysql.pool.metricas())
+
+# --- RUTA CON LAS MÉTRICAS EN FORMATO PROMETHEUS ---
+@app.route('/metrics')
+def metrics():
+    if session.get('role') != 'admin' and request.remote_addr not in app.config['METRICS_IPS']:
+        return Response("No autorizado", status=403, mimetype='text/plain')
+    # El pool es de cada proceso: sus valores llevan el pid del worker que respondió
+    extra = gauges('db_pool', mysql.pool.metricas(), 'Estado del pool de conexiones MySQL.',
+                   {'worker': os.getpid()})
+    return Response(metricas.exposicion(extra), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+# --- RUTA CON LOS ÚLTIMOS INFORMES DEL PERFILADOR (SÓLO EN DESARROLLO) ---
+@app.route('/debug/perfilador')
+def debug_perfilador():
+    if perfilador is None:
+        return Response("Perfilador desactivado (PROFILER_ENABLED=1)", status=404, mimetype='text/plain')
+    if session.get('role') != 'admin' and request.remote_addr not in app.config['METRICS_IPS']:
+        return Response("No autorizado", status=403, mimetype='text/plain')
+    informes = list(perfilador.informes)
+    if request.args.get('solo_problemas') == '1':
+        informes = [i for i in informes if i['repetidas'] or i['lentas']]
+    return jsonify(informes[::-1])
+
+# --- TRABAJOS EN SEGUNDO PLANO (PDF, ZIP Y EXPORTACIÓN) ---
+# Las mismas exportaciones que las rutas síncronas, pero ejecutadas por la cola de
+# trabajos; el resultado se escribe en `ruta` y se descarga después.
+def validar_trabajo_pdf(user_id, datos):
+    try:
+        return {'proforma_id': int(datos.get('proforma_id'))}
+    except (TypeError, ValueError):
+        raise ValueError("proforma_id no válido")
+
+def ejecutar_trabajo_pdf(user_id, parametros, ruta):
+    id = parametros['proforma_id']
+    cur = mysql.connection.cursor()
+    cur.execute("SELECT * FROM proformas WHERE id = %s AND user_id = %s", (id, user_id))
+    proforma = cur.fetchone()
+    if not proforma:
+        cur.close()
+        raise TrabajoFallido("Proforma no encontrada o no tiene permiso.")
+    items = obtener_items_por_proforma(cur, [id])[id]
+    cur.close()
+
+    # El dibujo se hace en el pool de procesos para no pelear por el GIL con las peticiones
+    from pdf_lotes import renderizar_en_pool
+    contenido = obtener_pdf(proforma, items,
+                            lambda p, i: renderizar_en_pool(p, i, app.config['PDF_WORKERS']), origen='trabajo')
+    with open(ruta, 'wb') as archivo:
+        archivo.write(contenido)
+    return nombre_pdf(proforma), 'application/pdf'
+
+def validar_trabajo_zip(user_id, datos):
+    return seleccion_zip(datos.get('ids'), datos.get('search', ''))
+
+def ejecutar_trabajo_zip(user_id, parametros, ruta):
+    cur = mysql.connection.cursor()
+    try:
+        proformas, items_por_proforma = proformas_para_zip(cur, user_id, parametros)
+    except (LookupError, ValueError) as e:
+        raise TrabajoFallido(str(e))
+    finally:
+        cur.close()
+
+    from pdf_lotes import generar_zip
+    with open(ruta, 'wb') as archivo:
+        for parte in generar_zip(proformas, items_por_proforma, cache_pdf, app.config['PDF_WORKERS'],
+                                 metricas.registrar_pdf):
+            archivo.write(parte)
+    return 'proformas.zip', 'application/zip'
+
+def validar_trabajo_exportacion(user_id, datos):
+    return filtros_exportacion(datos)
+
+def ejecutar_trabajo_exportacion(user_id, parametros, ruta):
+    formato = parametros['formato']
+    cur, primer_bloque = consultar_exportacion(user_id, parametros)
+    try:
+        if not primer_bloque:
+            raise TrabajoFallido("No hay datos para exportar.")
+        with open(ruta, 'wb') as archivo:
+            for parte in generar_exportacion(cur, primer_bloque, formato):
+                archivo.write(parte)
+    finally:
+        cur.close()
+    return f"reporte_proformas.{formato}", MIMETYPES_EXPORTACION[formato]
+
+cola_trabajos.registrar('pdf', validar_trabajo_pdf, ejecutar_trabajo_pdf)
+cola_trabajos.registrar('zip', validar_trabajo_zip, ejecutar_trabajo_zip)
+cola_trabajos.registrar('exportacion', validar_trabajo_exportacion, ejecutar_trabajo_exportacion)
+
+def datos_trabajo(trabajo):
+    def fecha(valor):
+        return valor.strftime('%Y-%m-%d %H:%M:%S') if valor else None
+    datos = {
+        'id': trabajo['id'],
+        'tipo': trabajo['tipo'],
+        'estado': trabajo['estado'],
+        'error': trabajo['error'],
+        'creado': fecha(trabajo['creado']),
+        'terminado': fecha(trabajo['terminado']),
+        'expira': fecha(trabajo['expira']),
+    }
+    if trabajo['estado'] == 'terminado':
+        datos['bytes'] = trabajo['bytes']
+        datos['nombre'] = trabajo['nombre_descarga']
+        datos['descarga'] = url_for('api_descargar_trabajo', trabajo_id=trabajo['id'])
+    return datos
+
+# API para ENCOLAR un trabajo: {"tipo": "pdf", "proforma_id": 1},
+# {"tipo": "zip", "ids": [...]} o {"tipo": "zip", "search": "..."},
+# {"tipo": "exportacion", "formato": "xlsx", "desde": ..., "hasta": ..., "status": ...}
+@app.route('/api/jobs', methods=['POST'])
+def api_crear_trabajo():
+    if 'loggedin' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        cur = mysql.connection.cursor()
+        cola_trabajos.purgar(cur)
+        trabajo_id = cola_trabajos.crear(cur, session['id'], data.get('tipo'), data)
+        mysql.connection.commit()
+        cur.close()
+    except ValueError as e:
+        mysql.connection.rollback()
+        return jsonify({"success": False, "error": str(e)}), 400
+    except ColaLlena as e:
+        mysql.connection.rollback()
+        return jsonify({"success": False, "error": str(e)}), 429
+    except Exception as e:
+        mysql.connection.rollback()
+        print(f"Error al crear el trabajo: {e}", file=sys.stderr)
+        return jsonify({"success": False, "error": "No se pudo encolar el trabajo"}), 500
+
+    cola_trabajos.encolar(trabajo_id)
+    return jsonify({
+        "success": True,
+        "id": trabajo_id,
+        "estado": "pendiente",
+        "url": url_for('api_obtener_trabajo', trabajo_id=trabajo_id),
+    }), 202
+
+# API para CONSULTAR el estado de un trabajo
+@app.route('/api/jobs/<trabajo_id>', methods=['GET'])
+def api_obtener_trabajo(trabajo_id):
+    if 'loggedin' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    try:
+        cur = mysql.connection.cursor()
+        trabajo = cola_trabajos.obtener(cur, trabajo_id, session['id'])
+        if trabajo and trabajo['abandonado']:
+            # El proceso que lo ejecutaba murió sin avisar: no se espera al TTL
+            cola_trabajos.recuperar_abandonados(cur)
+            mysql.connection.commit()
+            trabajo = cola_trabajos.obtener(cur, trabajo_id, session['id'])
+        elif trabajo and trabajo['sin_reclamar']:
+            # Quedó en la cola de un proceso que ya no está; el reclamo es condicional,
+            # así que si sigue en otra cola igual se ejecuta una sola vez
+            cola_trabajos.encolar(trabajo_id)
+        cur.close()
+        if not trabajo or trabajo['caducado']:
+            return jsonify({"error": "Trabajo no encontrado o caducado"}), 404
+        return jsonify(datos_trabajo(trabajo))
+    except Exception as e:
+        print(f"Error al consultar el trabajo {trabajo_id}: {e}", file=sys.stderr)
+        return jsonify({"error": "Error al consultar el trabajo"}), 500
+
+# Ruta para DESCARGAR el resultado de un trabajo terminado
+@app.route('/api/jobs/<trabajo_id>/download', methods=['GET'])
+def api_descargar_trabajo(trabajo_id):
+    if 'loggedin' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    try:
+        cur = mysql.connection.cursor()
+        trabajo = cola_trabajos.obtener(cur, trabajo_id, session['id'])
+        cur.close()
+    except Exception as e:
+        print(f"Error al consultar el trabajo {trabajo_id}: {e}", file=sys.stderr)
+        return jsonify({"error": "Error al consultar el trabajo"}), 500
+
+    if not trabajo or trabajo['caducado']:
+        return jsonify({"error": "Trabajo no encontrado o caducado"}), 404
+    if trabajo['estado'] != 'terminado':
+        return jsonify({"error": f"El trabajo no tiene resultado (estado: {trabajo['estado']})"}), 409
+    ruta = cola_trabajos.ruta_archivo(trabajo['id'])
+    if not os.path.exists(ruta):
+        return jsonify({"error": "El archivo del trabajo ya no está disponible"}), 404
+    return send_file(ruta, mimetype=trabajo['mimetype'], as_attachment=True,
+                     download_name=trabajo['nombre_descarga'])
+
 if __name__ == '__main__':
     app.run(debug=True)
 
@@ -0,0 +1,87 @@
+# benchmarks/analitica.py
+# Rendimiento de los informes de analítica sobre el resumen diario, sin base de datos:
+#   - tiempo de armar el resumen en memoria de un usuario con N filas diarias
+#   - latencia de un informe según el largo del rango (un mes, un año, todo)
+#   - costo de ponerlo al día cuando cambian unos pocos días
+#
+# Uso:
+#   python benchmarks/analitica.py --filas 100000 --dias 1500 --json analitica.json
+"""Mide la carga del resumen diario, los informes por rango y su puesta al día."""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+import comun
+
+FILAS = 100_000
+DIAS = 1500
+CLIENTES = 5000
+INFORMES = 200
+
+
+def filas_diarias(n, dias, clientes, semilla, desde=date(2022, 1, 1), solo=None):
+    """Filas como las de analitica_diaria (una por día, cliente, estado e IGV)."""
+    rnd = random.Random(semilla)
+    filas = []
+    while len(filas) < n:
+        fecha = solo or desde + timedelta(days=rnd.randrange(dias))
+        filas.append({
+            'fecha': fecha,
+            'cliente': f"Cliente {int(rnd.paretovariate(1.1)) % clientes}",
+            'status': rnd.choice(['Enviada', 'Enviada', 'Aprobada', 'Rechazada']),
+            'incluye_igv': rnd.random() < 0.8,
+            'cantidad': 1 + int(rnd.expovariate(1.5)),
+            'monto': round(rnd.uniform(50, 20000), 2),
+        })
+    return filas
+
+
+def main():
+    import analitica
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--filas', type=int, default=FILAS, help='filas del resumen diario del usuario')
+    parser.add_argument('--dias', type=int, default=DIAS, help='días con proformas')
+    parser.add_argument('--clientes', type=int, default=CLIENTES)
+    parser.add_argument('--informes', type=int, default=INFORMES)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    inicio_datos = date(2022, 1, 1)
+    fin_datos = inicio_datos + timedelta(days=args.dias - 1)
+    filas = filas_diarias(args.filas, args.dias, args.clientes, args.semilla, inicio_datos)
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args)}
+
+    # La primera vez incluye importar pandas y numpy
+    inicio = time.perf_counter()
+    resumen = analitica.Resumen.desde_filas(filas)
+    resultado['carga_s'] = round(time.perf_counter() - inicio, 3)
+
+    rnd = random.Random(args.semilla)
+    for nombre, largo in (('mes', 30), ('anio', 365), ('todo', args.dias)):
+        latencias = []
+        for _ in range(args.informes):
+            desde = inicio_datos + timedelta(days=rnd.randrange(max(1, args.dias - largo + 1)))
+            hasta = min(desde + timedelta(days=largo - 1), fin_datos)
+            t = time.perf_counter()
+            analitica.informe(resumen, desde, hasta)
+            latencias.append((time.perf_counter() - t) * 1000)
+        resultado[f"informe_{nombre}"] = comun.resumen_latencias(latencias)
+
+    # Un guardado cambia uno o dos días: se reemplazan sus filas en el resumen
+    latencias = []
+    for n in range(args.informes):
+        dia = inicio_datos + timedelta(days=rnd.randrange(args.dias))
+        nuevas = filas_diarias(rnd.randint(1, 60), 1, args.clientes, n, solo=dia)
+        t = time.perf_counter()
+        resumen = resumen.reemplazar_dias([dia], nuevas)
+        latencias.append((time.perf_counter() - t) * 1000)
+    resultado['puesta_al_dia'] = comun.resumen_latencias(latencias)
+
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/busqueda_sql.py
+# Búsqueda de proformas en SQL directo: LIKE '%término%' sobre cliente y número
+# (como antes del índice) frente al índice FULLTEXT ngram de proformas_busqueda,
+# contra una base de datos MySQL/MariaDB desechable.
+#
+# Cada búsqueda son las dos consultas de la lista: el COUNT y la primera página.
+#
+# Uso:
+#   python benchmarks/busqueda_sql.py --db ledesma_bench --proformas 100000 --json busqueda.json
+#   python benchmarks/busqueda_sql.py --db ledesma_bench --sin-sembrar --repeticiones 200
+#
+# Sin --sin-sembrar la base de datos se borra y se vuelve a llenar (ver semilla.py).
+"""Compara la búsqueda con LIKE y con el índice FULLTEXT sobre datos sembrados."""
+import argparse
+import random
+import time
+
+import comun
+import semilla
+
+import MySQLdb
+import MySQLdb.cursors
+
+PROFORMAS = 100_000
+REPETICIONES_SQL = 50
+
+
+def conectar(args):
+    return MySQLdb.connect(host=args.host, user=args.user, passwd=args.password, db=args.db,
+                           charset='utf8mb4', cursorclass=MySQLdb.cursors.DictCursor)
+
+
+def terminos_de_busqueda(semilla_rnd):
+    """Una palabra del nombre del cliente, lo más habitual en la lista."""
+    rnd = random.Random(semilla_rnd)
+    return sorted({rnd.choice(semilla.NOMBRES).split()[-1] for _ in range(20)})
+
+
+def comparar_busqueda_sql(args, user_id, terminos, repeticiones=REPETICIONES_SQL):
+    """Búsqueda con LIKE (como antes del índice FULLTEXT) frente a la actual, en SQL directo."""
+    import busqueda
+    conn = conectar(args)
+    cur = conn.cursor()
+
+    def con_like(termino):
+        patron = f"%{termino}%"
+        filtro = "FROM proformas p WHERE p.user_id = %s AND (p.cliente LIKE %s OR p.cotizacion_nro LIKE %s)"
+        cur.execute("SELECT COUNT(p.id) AS total " + filtro, (user_id, patron, patron))
+        cur.fetchall()
+        cur.execute("SELECT p.id " + filtro + " ORDER BY p.id DESC LIMIT 11", (user_id, patron, patron))
+        cur.fetchall()
+
+    def con_fulltext(termino):
+        join, where, params, score = busqueda.condicion_busqueda(termino)
+        base = "FROM proformas p " + join + " WHERE p.user_id = %s AND " + where
+        cur.execute("SELECT COUNT(p.id) AS total " + base, [user_id] + params)
+        cur.fetchall()
+        orden = (score + " DESC, p.id DESC") if score else "p.id DESC"
+        cur.execute("SELECT p.id " + base + " ORDER BY " + orden + " LIMIT 11",
+                    [user_id] + params + (params if score else []))
+        cur.fetchall()
+
+    resultado = {}
+    for nombre, funcion in (('like', con_like), ('fulltext', con_fulltext)):
+        latencias = []
+        for i in range(repeticiones):
+            inicio = time.perf_counter()
+            funcion(terminos[i % len(terminos)])
+            latencias.append((time.perf_counter() - inicio) * 1000)
+        resultado[nombre] = comun.resumen_latencias(latencias)
+    conn.close()
+    return resultado
+
+
+def main():
+    import esquema
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    semilla.agregar_argumentos(parser)
+    parser.set_defaults(proformas=PROFORMAS)
+    parser.add_argument('--sin-sembrar', action='store_true', help='usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default='bench1', help='usuario cuyas proformas se buscan')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES_SQL, help='búsquedas por método')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args).copy()}
+    resultado['parametros'].pop('password', None)
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.db}...", flush=True)
+        conn = semilla.recrear_base(args.host, args.user, args.password, args.db)
+        resultado['semilla'] = semilla.sembrar(conn, args.usuarios, args.proformas, args.items,
+                                               args.clientes, args.semilla)
+        conn.close()
+
+    # El resto de las migraciones crea y llena proformas_busqueda con su índice FULLTEXT
+    conn = conectar(args)
+    cur = conn.cursor()
+    inicio = time.perf_counter()
+    esquema.migrar(cur)
+    resultado['indexacion_s'] = round(time.perf_counter() - inicio, 2)
+    cur.execute("SELECT id FROM users WHERE username = %s", [args.usuario])
+    fila = cur.fetchone()
+    cur.execute("SELECT COUNT(*) AS total FROM proformas")
+    resultado['proformas_en_base'] = cur.fetchone()['total']
+    conn.close()
+    if not fila:
+        raise SystemExit(f"No existe el usuario {args.usuario} en {args.db}.")
+
+    resultado['busqueda_sql'] = comparar_busqueda_sql(args, fila['id'], terminos_de_busqueda(args.semilla),
+                                                      args.repeticiones)
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/catalogo.py
+# Rendimiento del catálogo de items (autocompletado de líneas), sin base de datos:
+#   - tiempo de carga de un historial sintético de N líneas
+#   - latencia de búsqueda por prefijo (p50/p95/p99), letra a letra como en el navegador
+#   - costo de registrar los items de un guardado
+#
+# Uso:
+#   python benchmarks/catalogo.py --lineas 1000000 --distintas 50000 --json catalogo.json
+"""Mide la carga, las búsquedas y las altas del catálogo de items con datos sintéticos."""
+import argparse
+import random
+import time
+from collections import Counter
+
+import comun
+
+LINEAS = 1_000_000
+DISTINTAS = 50_000
+BUSQUEDAS = 20_000
+
+TIPOS = ['Panel LED', 'Reflector LED', 'Tira LED', 'Foco LED', 'Driver', 'Luminaria hermética',
+         'Campana industrial', 'Downlight', 'Poste solar', 'Dicroico LED', 'Plafón', 'Tubo LED']
+POTENCIAS = ['6W', '9W', '12W', '18W', '24W', '36W', '50W', '100W', '150W', '200W']
+TONOS = ['luz fría', 'luz cálida', 'neutro', 'RGB']
+
+
+def historial_sintetico(lineas, distintas, semilla):
+    """Filas como las de CONSULTA_CARGA: una por descripción, con usos de cola larga."""
+    rnd = random.Random(semilla)
+    descripciones = [f"{rnd.choice(TIPOS)} {rnd.choice(POTENCIAS)} {rnd.choice(TONOS)} modelo {n}"
+                     for n in range(distintas)]
+    # Unos pocos productos se cotizan muchísimo y la mayoría, pocas veces
+    usos = Counter(min(int(rnd.paretovariate(1.2)) - 1, distintas - 1) for _ in range(lineas))
+    filas = []
+    for posicion, descripcion in enumerate(descripciones):
+        veces = usos.get(posicion, 0) + 1
+        filas.append({'descripcion': descripcion, 'usos': veces, 'total': veces * 50.0,
+                      'ultimo_id': posicion + 1, 'ultimo_precio': round(rnd.uniform(5, 900), 2)})
+    return filas, descripciones
+
+
+def terminos_tecleados(descripciones, n, semilla):
+    """Lo que se manda al escribir: cada prefijo de 2 o más letras de una palabra."""
+    rnd = random.Random(semilla)
+    terminos = []
+    while len(terminos) < n:
+        palabra = rnd.choice(rnd.choice(descripciones).split())
+        terminos.extend(palabra[:largo] for largo in range(2, len(palabra) + 1))
+    return terminos[:n]
+
+
+def main():
+    from catalogo_items import CatalogoItems
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--lineas', type=int, default=LINEAS, help='líneas de proformas en el historial')
+    parser.add_argument('--distintas', type=int, default=DISTINTAS, help='descripciones distintas')
+    parser.add_argument('--busquedas', type=int, default=BUSQUEDAS)
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    filas, descripciones = historial_sintetico(args.lineas, args.distintas, args.semilla)
+    catalogo = CatalogoItems()
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args)}
+
+    inicio = time.perf_counter()
+    catalogo.buscar(1, 'pa', lambda user_id: filas)
+    resultado['carga_s'] = round(time.perf_counter() - inicio, 3)
+
+    # Primera pasada: prefijos aún no memorizados; segunda: los mismos, ya memorizados
+    terminos = terminos_tecleados(descripciones, args.busquedas, args.semilla)
+    for pasada in ('primera', 'segunda'):
+        latencias = []
+        for termino in terminos:
+            t = time.perf_counter()
+            catalogo.buscar(1, termino, None)
+            latencias.append((time.perf_counter() - t) * 1000)
+        resultado[f"busqueda_{pasada}"] = comun.resumen_latencias(latencias)
+
+    # Un guardado típico: diez líneas, algunas de productos nuevos
+    rnd = random.Random(args.semilla)
+    latencias = []
+    for n in range(500):
+        lineas = [(rnd.choice(descripciones) if rnd.random() < 0.9 else f"Producto nuevo {n}-{k}", 25.0)
+                  for k in range(10)]
+        t = time.perf_counter()
+        catalogo.registrar(1, agregados=lineas)
+        latencias.append((time.perf_counter() - t) * 1000)
+    resultado['registro_guardado'] = comun.resumen_latencias(latencias)
+
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
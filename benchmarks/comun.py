@@ -0,0 +1,107 @@
+# benchmarks/comun.py
+# Utilidades compartidas por los benchmarks: medición concurrente, percentiles y
+# salida en JSON con los datos necesarios para comparar entre commits.
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+def percentil(ordenadas, p):
+    """Percentil por el método del rango más cercano sobre una lista ya ordenada."""
+    if not ordenadas:
+        return 0.0
+    indice = max(0, min(len(ordenadas) - 1, math.ceil(p / 100 * len(ordenadas)) - 1))
+    return ordenadas[indice]
+
+
+def resumen_latencias(latencias_ms):
+    ordenadas = sorted(latencias_ms)
+    return {
+        'n': len(ordenadas),
+        'min_ms': round(ordenadas[0], 3) if ordenadas else 0.0,
+        'media_ms': round(sum(ordenadas) / len(ordenadas), 3) if ordenadas else 0.0,
+        'p50_ms': round(percentil(ordenadas, 50), 3),
+        'p95_ms': round(percentil(ordenadas, 95), 3),
+        'p99_ms': round(percentil(ordenadas, 99), 3),
+        'max_ms': round(ordenadas[-1], 3) if ordenadas else 0.0,
+    }
+
+
+def medir(funcion, peticiones, concurrencia, preparar_hilo=None):
+    """Ejecuta `funcion(estado, i)` `peticiones` veces repartidas en `concurrencia` hilos.
+
+    `preparar_hilo()` (opcional) crea el estado propio de cada hilo, por ejemplo un
+    cliente con la sesión iniciada. `funcion` devuelve True si la respuesta fue
+    correcta. Devuelve latencias, errores y throughput.
+    """
+    local = threading.local()
+    latencias = []
+    errores = []
+    lock = threading.Lock()
+
+    def una(i):
+        if not hasattr(local, 'estado'):
+            local.estado = preparar_hilo() if preparar_hilo else None
+        inicio = time.perf_counter()
+        try:
+            correcto = funcion(local.estado, i)
+            error = None if correcto else 'respuesta no válida'
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        duracion = (time.perf_counter() - inicio) * 1000
+        with lock:
+            if error:
+                errores.append(error)
+            else:
+                latencias.append(duracion)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        list(pool.map(una, range(peticiones)))
+    total = time.perf_counter() - inicio
+
+    resultado = resumen_latencias(latencias)
+    resultado.update({
+        'concurrencia': concurrencia,
+        'errores': len(errores),
+        'primer_error': errores[0] if errores else None,
+        'duracion_s': round(total, 3),
+        'throughput_rps': round(len(latencias) / total, 2) if total else 0.0,
+    })
+    return resultado
+
+
+def metadatos():
+    """Commit, intérprete y máquina, para saber qué se está comparando."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def escribir_resultado(resultado, ruta=None):
+    """Imprime el resultado y, si se indica, lo guarda en un archivo JSON."""
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False, default=str)
+    print(texto)
+    if ruta:
+        with open(ruta, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
@@ -0,0 +1,232 @@
+# benchmarks/endpoints.py
+# Latencia (p50/p95/p99) y throughput de las rutas principales contra una base de
+# datos MySQL/MariaDB desechable, con el cliente de pruebas de Flask (sin red) y con
+# un servidor waitress real, a distintos niveles de concurrencia.
+#
+# Uso:
+#   python benchmarks/endpoints.py --db ledesma_bench --proformas 100000 --json antes.json
+#   python benchmarks/endpoints.py --db ledesma_bench --sin-sembrar --concurrencia 1,8 \
+#       --escenarios lista,busqueda --json despues.json
+#
+# Sin --sin-sembrar la base de datos se borra y se vuelve a llenar (ver semilla.py).
+# Los escenarios de guardado escriben proformas nuevas en la base de prueba.
+"""Mide latencia y throughput de las rutas de la aplicación con datos sembrados."""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import date, timedelta
+
+import comun
+import semilla
+from busqueda_sql import comparar_busqueda_sql
+from guardado import escenarios_guardado
+
+import MySQLdb
+import MySQLdb.cursors
+
+PETICIONES = 200
+CONCURRENCIAS = '1,4,16'
+
+
+class ClienteFlask:
+    """Cliente de pruebas de Flask con la sesión iniciada (uno por hilo)."""
+
+    def __init__(self, app, usuario):
+        self.cliente = app.test_client()
+        respuesta = self.cliente.post('/login', data={'username': usuario, 'password': semilla.CLAVE_BENCH})
+        if respuesta.status_code != 302:
+            raise RuntimeError(f"No se pudo iniciar sesión como {usuario}")
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        respuesta = self.cliente.open(ruta, method=metodo, json=cuerpo)
+        datos = respuesta.get_data()
+        return respuesta.status_code, datos
+
+
+class ClienteHTTP:
+    """Conexión keep-alive contra waitress, con la cookie de sesión compartida."""
+
+    def __init__(self, puerto, cookie):
+        self.conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=120)
+        self.cookie = cookie
+
+    @staticmethod
+    def iniciar_sesion(puerto, usuario):
+        conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+        cuerpo = urllib.parse.urlencode({'username': usuario, 'password': semilla.CLAVE_BENCH})
+        conexion.request('POST', '/login', cuerpo, {'Content-Type': 'application/x-www-form-urlencoded'})
+        respuesta = conexion.getresponse()
+        respuesta.read()
+        cookie = respuesta.getheader('Set-Cookie')
+        conexion.close()
+        if respuesta.status != 302 or not cookie:
+            raise RuntimeError(f"No se pudo iniciar sesión como {usuario}")
+        return cookie.split(';', 1)[0]
+
+    def pedir(self, metodo, ruta, cuerpo=None):
+        cabeceras = {'Cookie': self.cookie}
+        datos = None
+        if cuerpo is not None:
+            datos = json.dumps(cuerpo)
+            cabeceras['Content-Type'] = 'application/json'
+        self.conexion.request(metodo, ruta, datos, cabeceras)
+        respuesta = self.conexion.getresponse()
+        return respuesta.status, respuesta.read()
+
+
+def datos_de_prueba(args):
+    """Id, proformas, términos de búsqueda y prefijos reales del usuario con el que se mide."""
+    conn = MySQLdb.connect(host=args.host, user=args.user, passwd=args.password, db=args.db,
+                           charset='utf8mb4', cursorclass=MySQLdb.cursors.DictCursor)
+    cur = conn.cursor()
+    cur.execute("SELECT id FROM users WHERE username = %s", [args.usuario])
+    fila = cur.fetchone()
+    if not fila:
+        raise SystemExit(f"No existe el usuario {args.usuario} en {args.db}.")
+    user_id = fila['id']
+    cur.execute("SELECT id FROM proformas WHERE user_id = %s ORDER BY id DESC LIMIT 5000", [user_id])
+    ids = [fila['id'] for fila in cur.fetchall()]
+    cur.execute("SELECT nombre FROM clientes WHERE user_id = %s LIMIT 500", [user_id])
+    nombres = [fila['nombre'] for fila in cur.fetchall()]
+    conn.close()
+    if not ids or not nombres:
+        raise SystemExit("El usuario de prueba no tiene proformas o clientes; siembre más datos.")
+    rnd = random.Random(args.semilla)
+    return {
+        'user_id': user_id,
+        'ids': ids,
+        # Búsquedas de una palabra del nombre del cliente (lo más habitual en la lista)
+        'terminos': sorted({rnd.choice(semilla.NOMBRES).split()[-1] for _ in range(20)}),
+        # Autocompletado: lo que hay escrito tras 2-5 letras
+        'prefijos': sorted({n[:rnd.randint(2, 5)] for n in rnd.sample(nombres, min(50, len(nombres)))}),
+    }
+
+
+def definir_escenarios(datos, cache_pdf):
+    """nombre -> (peticion(i) -> (metodo, ruta, cuerpo), fracción de PETICIONES, preparación(i))."""
+    ids, terminos, prefijos = datos['ids'], datos['terminos'], datos['prefijos']
+    hace_un_mes = (date.today() - timedelta(days=30)).isoformat()
+    # Lo que se escribe en la línea de item: prefijos de 2 a 6 letras de una palabra
+    palabras = [producto.split()[0].lower() for producto in semilla.PRODUCTOS] + [p.lower() for p in semilla.POTENCIAS]
+    terminos_items = sorted({palabra[:n] for palabra in palabras for n in range(2, min(6, len(palabra)) + 1)})
+
+    escenarios = {
+        'lista': (lambda i: ('GET', '/api/proformas?page=1', None), 1, None),
+        'lista_pagina_50': (lambda i: ('GET', '/api/proformas?page=50', None), 1, None),
+        'lista_cursor': (lambda i: ('GET', f"/api/proformas?after_id={ids[i % len(ids)]}", None), 1, None),
+        'busqueda': (lambda i: ('GET', f"/api/proformas?search={urllib.parse.quote(terminos[i % len(terminos)])}", None), 1, None),
+        'autocompletado': (lambda i: ('GET', f"/api/clientes/search?term={urllib.parse.quote(prefijos[i % len(prefijos)])}", None), 1, None),
+        'autocompletado_items': (lambda i: ('GET', f"/api/items/search?term={urllib.parse.quote(terminos_items[i % len(terminos_items)])}", None), 1, None),
+        # PDF sin caché (se invalida antes de cada petición) y con la caché ya llena
+        'pdf': (lambda i: ('GET', f"/api/proforma/{ids[i % len(ids)]}/pdf", None), 0.25,
+                lambda i: cache_pdf.invalidar(ids[i % len(ids)])),
+        'pdf_cache': (lambda i: ('GET', f"/api/proforma/{ids[0]}/pdf", None), 1, None),
+        'exportacion_csv': (lambda i: ('GET', f"/api/proformas/export?formato=csv&desde={hace_un_mes}", None), 0.1, None),
+        'exportacion_xlsx': (lambda i: ('GET', f"/api/proformas/export?formato=xlsx&desde={hace_un_mes}", None), 0.1, None),
+        'dashboard': (lambda i: ('GET', '/', None), 1, None),
+        'dashboard_stats': (lambda i: ('GET', '/api/dashboard_stats', None), 1, None),
+        'analitica': (lambda i: ('GET', '/api/analitica', None), 1, None),
+    }
+    # Latencia de guardado según la cantidad de items (ver también guardado.py)
+    escenarios.update(escenarios_guardado())
+    return escenarios
+
+
+def medir_escenarios(escenarios, seleccion, crear_cliente, concurrencias, peticiones):
+    resultados = {}
+    for nombre in seleccion:
+        peticion, fraccion, preparar = escenarios[nombre]
+        n = max(10, int(peticiones * fraccion))
+
+        def una(cliente, i, peticion=peticion, preparar=preparar):
+            if preparar:
+                preparar(i)
+            estado, _ = cliente.pedir(*peticion(i))
+            return estado < 400
+
+        resultados[nombre] = {}
+        for concurrencia in concurrencias:
+            # Una petición de calentamiento (cachés, índice de clientes, pool de conexiones)
+            crear_cliente().pedir(*peticion(0))
+            resultados[nombre][f"c{concurrencia}"] = comun.medir(una, n, concurrencia, crear_cliente)
+        print(f"  {nombre}: " + ", ".join(f"{c}: p50 {r['p50_ms']} ms, {r['throughput_rps']} rps"
+                                          for c, r in resultados[nombre].items()), flush=True)
+    return resultados
+
+
+def iniciar_waitress(app, hilos):
+    from waitress.server import create_server
+    servidor = create_server(app, host='127.0.0.1', port=0, threads=hilos)
+    threading.Thread(target=servidor.run, daemon=True).start()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    semilla.agregar_argumentos(parser)
+    parser.add_argument('--sin-sembrar', action='store_true', help='usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default='bench1', help='usuario con el que se hacen las peticiones')
+    parser.add_argument('--modo', choices=['test_client', 'waitress', 'ambos'], default='ambos')
+    parser.add_argument('--concurrencia', default=CONCURRENCIAS, help='lista separada por comas')
+    parser.add_argument('--peticiones', type=int, default=PETICIONES, help='por escenario y concurrencia')
+    parser.add_argument('--escenarios', help='lista separada por comas (por defecto, todos)')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+    concurrencias = [int(c) for c in args.concurrencia.split(',')]
+
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args).copy()}
+    resultado['parametros'].pop('password', None)
+
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.db}...", flush=True)
+        conn = semilla.recrear_base(args.host, args.user, args.password, args.db)
+        resultado['semilla'] = semilla.sembrar(conn, args.usuarios, args.proformas, args.items,
+                                               args.clientes, args.semilla)
+        conn.close()
+
+    import app as aplicacion
+    app = aplicacion.app
+    app.config.update(MYSQL_HOST=args.host, MYSQL_USER=args.user, MYSQL_PASSWORD=args.password, MYSQL_DB=args.db)
+    # Una conexión por hilo concurrente, más margen para los trabajos en segundo plano
+    aplicacion.mysql.pool.tamano = max(concurrencias) + app.config['JOBS_WORKERS'] + 2
+
+    # La primera preparación crea las tablas auxiliares y rellena índice, resumen y secuencias
+    inicio = time.perf_counter()
+    with app.app_context():
+        aplicacion.preparar_base_de_datos()
+    resultado['preparacion_s'] = round(time.perf_counter() - inicio, 2)
+
+    datos = datos_de_prueba(args)
+    escenarios = definir_escenarios(datos, aplicacion.cache_pdf)
+    seleccion = args.escenarios.split(',') if args.escenarios else list(escenarios)
+    desconocidos = set(seleccion) - set(escenarios)
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+    if args.modo in ('test_client', 'ambos'):
+        print("Cliente de pruebas de Flask:", flush=True)
+        resultado['test_client'] = medir_escenarios(
+            escenarios, seleccion, lambda: ClienteFlask(app, args.usuario), concurrencias, args.peticiones)
+
+    if args.modo in ('waitress', 'ambos'):
+        print("waitress:", flush=True)
+        servidor = iniciar_waitress(app, max(concurrencias))
+        try:
+            puerto = servidor.effective_port
+            cookie = ClienteHTTP.iniciar_sesion(puerto, args.usuario)
+            resultado['waitress'] = medir_escenarios(
+                escenarios, seleccion, lambda: ClienteHTTP(puerto, cookie), concurrencias, args.peticiones)
+        finally:
+            servidor.close()
+
+    resultado['busqueda_sql'] = comparar_busqueda_sql(args, datos['user_id'], datos['terminos'])
+    resultado['pool_conexiones'] = aplicacion.mysql.pool.metricas()
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
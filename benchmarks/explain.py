@@ -0,0 +1,266 @@
+# benchmarks/explain.py
+# Comprueba que ninguna consulta de la aplicación recorra tablas completas.
+#
+# Siembra una base desechable, la migra, recorre el login y el registro, todas las
+# rutas con un usuario normal (lecturas y escrituras) y las que cambian para un
+# administrador, y guarda cada sentencia que llegó a MySQL. Luego lanza EXPLAIN sobre
+# cada forma de sentencia distinta, en una conexión aparte, y falla (código de salida
+# 1) si alguna lee una tabla entera (type ALL) o un índice entero (type index)
+# estimando al menos --min-filas filas.
+#
+# Las pocas consultas que recorren por diseño (el administrador ve todas las
+# proformas) están en ESCANEOS_PERMITIDOS con su motivo: se informan, pero no fallan.
+#
+# Uso:
+#   python benchmarks/explain.py --db ledesma_bench --proformas 20000 --json explain.json
+"""Lanza EXPLAIN sobre las consultas de todas las rutas y falla si alguna recorre tablas completas."""
+import argparse
+import json
+import re
+import sys
+import time
+import urllib.parse
+from datetime import date
+
+import comun
+import semilla
+from endpoints import ClienteFlask, datos_de_prueba
+
+import MySQLdb
+import MySQLdb.cursors
+
+PROFORMAS = 20000
+MIN_FILAS = 100
+ACCESOS_COMPLETOS = ('ALL', 'index')
+_EXPLICABLES = ('SELECT', 'UPDATE', 'DELETE', 'INSERT')
+# Usuario que se registra y se promueve a administrador para la segunda pasada
+ADMIN = 'explain_admin'
+
+# (forma de la sentencia, motivo). Sólo para recorridos que son el comportamiento
+# esperado; cualquier otra consulta que recorra una tabla entera sigue fallando.
+_LISTA_ADMIN = r"FROM proformas p JOIN users u ON p\.user_id = u\.id"
+ESCANEOS_PERMITIDOS = [
+    # El administrador ve todas las proformas: contarlas es leerlas todas (el conteo
+    # se cachea por término, ver CONTEO_TTL_SEGUNDOS en app.py)
+    (rf"^SELECT COUNT\(p\.id\) as total {_LISTA_ADMIN}$",
+     "conteo de la lista del administrador, sin filtro de usuario"),
+    # Se lee la PRIMARY en orden descendente y se corta en LIMIT + OFFSET; EXPLAIN
+    # estima la tabla entera porque no descuenta el LIMIT
+    (rf"^SELECT p\.\*, u\.fullname as author {_LISTA_ADMIN} ORDER BY p\.id DESC LIMIT \? OFFSET \?$",
+     "página de la lista del administrador, recorrida por la PRIMARY hasta el LIMIT"),
+    # Términos más cortos que el token del ngram no usan FULLTEXT (busqueda.condicion_busqueda):
+    # sin el filtro de usuario, el LIKE '%...%' revisa todas las proformas
+    (rf"{_LISTA_ADMIN} WHERE \(p\.cliente LIKE \? OR p\.cotizacion_nro LIKE \?\)",
+     "búsqueda corta (LIKE) del administrador, sin filtro de usuario"),
+]
+
+
+def _pedir(cliente, metodo, ruta, cuerpo=None):
+    estado, contenido = cliente.pedir(metodo, ruta, cuerpo)
+    if estado >= 400:
+        print(f"  {metodo} {ruta} -> {estado}", file=sys.stderr)
+    return estado, contenido
+
+
+def recorrer_autenticacion(app):
+    """Registro y login con el formulario, como los envía el navegador."""
+    cliente = app.test_client()
+    cliente.get('/login')
+    cliente.get('/register')
+    # Con --sin-sembrar el usuario ya existe: el INSERT falla y también se revisa
+    cliente.post('/register', data={'fullname': 'Administrador Explain', 'username': ADMIN,
+                                    'password': semilla.CLAVE_BENCH})
+    cliente.post('/login', data={'username': ADMIN, 'password': 'incorrecta'})
+    cliente.post('/login', data={'username': 'no_existe', 'password': semilla.CLAVE_BENCH})
+    cliente.post('/login', data={'username': ADMIN, 'password': semilla.CLAVE_BENCH})
+    cliente.get('/logout')
+
+
+def recorrer_rutas_admin(cliente, datos):
+    """Las rutas cuyo SQL cambia para un administrador (la lista no filtra por usuario)."""
+    termino = datos['terminos'][0]
+    for ruta in ('/', '/lista_proformas', '/api/dashboard_stats', '/api/proformas?page=1',
+                 '/api/proformas?page=50', '/api/proformas?page=1&search=',
+                 f"/api/proformas?after_id={datos['ids'][len(datos['ids']) // 2]}",
+                 f"/api/proformas?after_id={datos['ids'][0]}&total=1",
+                 f"/api/proformas?search={termino}", f"/api/proformas?search={termino[:2]}",
+                 f"/api/proformas?search={termino[:1]}", '/api/db_pool', '/metrics'):
+        _pedir(cliente, 'GET', ruta)
+
+
+def recorrer_rutas(cliente, datos):
+    """Todas las rutas que consultan la base, como las usaría el navegador."""
+    proforma_id = datos['ids'][0]
+    termino = datos['terminos'][0]
+    prefijo = datos['prefijos'][0]
+    hoy = date.today().isoformat()
+    items = [{'item': f"Panel LED {k}W", 'cantidad': 1 + k, 'precio_unitario': 10 + k} for k in range(3)]
+
+    def pedir(metodo, ruta, cuerpo=None):
+        return _pedir(cliente, metodo, ruta, cuerpo)
+
+    for ruta in ('/', '/lista_proformas', '/clientes', '/crear_proforma', f"/proforma/editar/{proforma_id}",
+                 '/api/proformas?page=1', '/api/proformas?page=50',
+                 f"/api/proformas?after_id={datos['ids'][len(datos['ids']) // 2]}",
+                 f"/api/proformas?search={termino}", f"/api/proformas?search={termino[:2]}",
+                 f"/api/proformas?search={termino[:1]}", f"/api/proforma/{proforma_id}", f"/api/proforma/{proforma_id}/pdf",
+                 f"/api/proforma/{proforma_id}/preview", f"/api/proformas/pdf_zip?ids={proforma_id}",
+                 f"/api/proformas/export?formato=csv&desde={hoy}", '/api/clientes',
+                 f"/api/clientes/search?term={prefijo}", '/api/items/search?term=pa', '/api/proformas/next_number', '/api/dashboard_stats',
+                 '/api/analitica'):
+        pedir('GET', ruta)
+
+    # Escrituras sobre una proforma nueva, para no alterar las sembradas
+    _, contenido = pedir('POST', '/api/proformas', {'fecha': hoy, 'cliente': 'Cliente Explain',
+                                                    'incluye_igv': True, 'items': items})
+    nueva = json.loads(contenido).get('proforma_id') if contenido else None
+    if nueva:
+        _, contenido = pedir('GET', f"/api/proforma/{nueva}")
+        proforma = json.loads(contenido)
+        version = proforma.get('version', 1)
+        pedir('PUT', f"/api/proformas/{nueva}", {'fecha': hoy, 'cliente': 'Cliente Explain 2', 'version': version,
+                                                  'incluye_igv': False, 'items': items})
+        pedir('PATCH', f"/api/proformas/{nueva}", {'version': version + 1, 'items': {'add': items[:1]}})
+        pedir('PUT', f"/api/proformas/{nueva}/status", {'status': 'Aprobada'})
+        pedir('GET', f"/proforma/duplicar/{nueva}")
+        pedir('DELETE', f"/api/proformas/{nueva}")
+    # Acciones en lote sobre otra proforma nueva
+    _, contenido = pedir('POST', '/api/proformas', {'fecha': hoy, 'cliente': 'Cliente Explain',
+                                                    'incluye_igv': True, 'items': items})
+    lote = json.loads(contenido).get('proforma_id') if contenido else None
+    if lote:
+        pedir('POST', '/api/proformas/bulk', {'action': 'status', 'status': 'Rechazada', 'ids': [lote]})
+        pedir('POST', '/api/proformas/bulk', {'action': 'delete', 'ids': [lote]})
+    # Los días que tocaron estas escrituras se recalculan en el siguiente informe
+    pedir('GET', f"/api/analitica?desde={hoy}&hasta={hoy}")
+
+    # Lista de clientes: primera página, la siguiente y los cambios desde la primera
+    _, contenido = pedir('GET', '/api/clientes')
+    pagina = json.loads(contenido)
+    if pagina['pagination']['has_more']:
+        pedir('GET', '/api/clientes?' + urllib.parse.urlencode({
+            'after_nombre': pagina['pagination']['next_after_nombre'],
+            'after_id': pagina['pagination']['next_after_id']}))
+    pedir('POST', '/api/clientes', {'nombre': 'Cliente Explain', 'ruc_dni': '20123456789'})
+    _, contenido = pedir('GET', '/api/clientes?' + urllib.parse.urlencode({'since': pagina['sync']}))
+    cliente_id = next((c['id'] for c in json.loads(contenido)['clientes'] if c['nombre'] == 'Cliente Explain'), None)
+    if cliente_id:
+        pedir('PUT', f"/api/clientes/{cliente_id}", {'nombre': 'Cliente Explain 2'})
+        pedir('DELETE', f"/api/clientes/{cliente_id}")
+
+    _, contenido = pedir('POST', '/api/jobs', {'tipo': 'pdf', 'proforma_id': proforma_id})
+    trabajo = json.loads(contenido).get('id') if contenido else None
+    if trabajo:
+        # Se espera al trabajo para que sus consultas también se revisen
+        for _ in range(100):
+            _, contenido = pedir('GET', f"/api/jobs/{trabajo}")
+            if json.loads(contenido).get('estado') in ('terminado', 'error'):
+                break
+            time.sleep(0.1)
+
+
+def escaneo_permitido(forma):
+    """El motivo si la forma está en ESCANEOS_PERMITIDOS, si no None."""
+    return next((motivo for patron, motivo in ESCANEOS_PERMITIDOS if re.search(patron, forma)), None)
+
+
+def explicar(cur, sentencias, min_filas):
+    """EXPLAIN de cada forma de sentencia; devuelve (planes, problemas, permitidos)."""
+    import perfilador
+    planes, problemas, permitidos = [], [], []
+    vistas = set()
+    for sql in sentencias:
+        forma = perfilador.forma_sentencia(sql)
+        if forma in vistas or not sql.lstrip().upper().startswith(_EXPLICABLES):
+            continue
+        vistas.add(forma)
+        try:
+            cur.execute("EXPLAIN " + sql)
+            filas = [dict(fila) for fila in cur.fetchall()]
+        except MySQLdb.Error as e:
+            # Un INSERT ... VALUES no tiene plan que revisar
+            planes.append({'forma': forma, 'error': str(e)})
+            continue
+        # Recorrer una tabla derivada ya materializada (un GROUP BY) no es leer una tabla entera
+        malas = [f for f in filas
+                 if f.get('type') in ACCESOS_COMPLETOS and f.get('select_type') != 'INSERT'
+                 and not str(f.get('table') or '').startswith('<derived')
+                 and (f.get('rows') or 0) >= min_filas]
+        planes.append({'forma': forma, 'plan': filas})
+        if malas:
+            motivo = escaneo_permitido(forma)
+            if motivo:
+                permitidos.append({'forma': forma, 'motivo': motivo, 'filas': malas})
+            else:
+                problemas.append({'forma': forma, 'filas': malas})
+    return planes, problemas, permitidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    semilla.agregar_argumentos(parser)
+    parser.set_defaults(proformas=PROFORMAS)
+    parser.add_argument('--sin-sembrar', action='store_true', help='usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default='bench1', help='usuario con el que se recorren las rutas')
+    parser.add_argument('--min-filas', type=int, default=MIN_FILAS,
+                        help='filas estimadas a partir de las que un recorrido completo es un error')
+    parser.add_argument('--json', help='guardar los planes en este archivo')
+    args = parser.parse_args()
+
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.db}...", flush=True)
+        conn = semilla.recrear_base(args.host, args.user, args.password, args.db)
+        semilla.sembrar(conn, args.usuarios, args.proformas, args.items, args.clientes, args.semilla)
+        conn.close()
+
+    import app as aplicacion
+    app = aplicacion.app
+    app.config.update(MYSQL_HOST=args.host, MYSQL_USER=args.user, MYSQL_PASSWORD=args.password, MYSQL_DB=args.db)
+    with app.app_context():
+        aplicacion.preparar_base_de_datos()
+
+    # A partir de aquí, cada sentencia que llega a MySQL (con sus valores ya escritos)
+    sentencias = []
+
+    def capturar(cursor, consulta, parametros, duracion):
+        ejecutada = getattr(cursor, '_executed', None) or consulta
+        if isinstance(ejecutada, bytes):
+            ejecutada = ejecutada.decode('utf-8', 'replace')
+        sentencias.append(ejecutada)
+
+    conn = MySQLdb.connect(host=args.host, user=args.user, passwd=args.password, db=args.db,
+                           charset='utf8mb4', cursorclass=MySQLdb.cursors.DictCursor)
+    cur = conn.cursor()
+
+    aplicacion.mysql.agregar_observador(capturar)
+    datos = datos_de_prueba(args)
+    recorrer_autenticacion(app)
+    recorrer_rutas(ClienteFlask(app, args.usuario), datos)
+    # La aplicación no tiene ruta para dar el rol: se asigna por fuera, antes de iniciar sesión
+    cur.execute("UPDATE users SET role = 'admin' WHERE username = %s", [ADMIN])
+    conn.commit()
+    recorrer_rutas_admin(ClienteFlask(app, ADMIN), datos)
+
+    # ANALYZE para que las estimaciones de filas reflejen los datos recién sembrados
+    for tabla in ('proformas', 'proforma_items', 'clientes', 'analitica_diaria', 'analitica_dias'):
+        cur.execute(f"ANALYZE TABLE {tabla}")
+        cur.fetchall()
+    planes, problemas, permitidos = explicar(cur, list(sentencias), args.min_filas)
+    conn.rollback()
+    conn.close()
+
+    print(f"{len(sentencias)} sentencias, {len(planes)} formas distintas, {len(problemas)} con recorridos completos "
+          f"({len(permitidos)} permitidos por diseño)")
+    for permitido in permitidos:
+        print(f"  permitido: {permitido['motivo']}")
+    for problema in problemas:
+        for fila in problema['filas']:
+            print(f"  {fila.get('table')}: type={fila.get('type')} rows={fila.get('rows')} "
+                  f"key={fila.get('key')}\n    {problema['forma'][:200]}", file=sys.stderr)
+    comun.escribir_resultado({'meta': comun.metadatos(), 'min_filas': args.min_filas,
+                              'problemas': problemas, 'permitidos': permitidos, 'planes': planes}, args.json)
+    sys.exit(1 if problemas else 0)
+
+
+if __name__ == '__main__':
+    main()
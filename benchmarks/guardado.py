@@ -0,0 +1,112 @@
+# benchmarks/guardado.py
+# Latencia de guardar una proforma (POST /api/proformas) y de duplicarla
+# (/proforma/duplicar/<id>) según la cantidad de items, contra una base de datos
+# MySQL/MariaDB desechable, con el cliente de pruebas de Flask (sin red).
+#
+# Se mide con cada valor de --lotes como ITEMS_BATCH_SIZE: con 1 los items se
+# insertan de a uno, como antes de los INSERT de varias filas.
+#
+# Uso:
+#   python benchmarks/guardado.py --db ledesma_bench --items-por-guardado 1,10,50,200 \
+#       --lotes 1,100 --json guardado.json
+#
+# Sin --sin-sembrar la base de datos se borra y se vuelve a llenar (ver semilla.py).
+# Escribe proformas nuevas en la base de prueba.
+"""Mide la latencia de guardado y duplicado de proformas según la cantidad de items."""
+import argparse
+import json
+import time
+from datetime import date
+
+import comun
+import semilla
+
+TAMANOS = '1,10,50,200'
+LOTES = '1,100'
+PETICIONES = 50
+
+
+def items(n):
+    return [{'item': f"Panel LED {k}W", 'cantidad': 1 + k % 7, 'precio_unitario': 10 + k} for k in range(n)]
+
+
+def cuerpo_guardado(n):
+    return {'fecha': date.today().isoformat(), 'cliente': 'Cliente Bench', 'incluye_igv': True, 'items': items(n)}
+
+
+def escenarios_guardado(tamanos=(1, 10, 50, 200)):
+    """Escenarios guardar_N_items con el formato de endpoints.definir_escenarios."""
+    escenarios = {}
+    for n in tamanos:
+        cuerpo = cuerpo_guardado(n)
+        escenarios[f"guardar_{n}_items"] = (lambda i, cuerpo=cuerpo: ('POST', '/api/proformas', cuerpo), 0.25, None)
+    return escenarios
+
+
+def medir_tamano(cliente, n, peticiones):
+    cuerpo = cuerpo_guardado(n)
+
+    def guardar(_, i):
+        estado, _ = cliente.pedir('POST', '/api/proformas', cuerpo)
+        return estado < 400
+
+    estado, contenido = cliente.pedir('POST', '/api/proformas', cuerpo)
+    original = json.loads(contenido)['proforma_id'] if estado < 400 else None
+
+    def duplicar(_, i):
+        estado, _ = cliente.pedir('GET', f"/proforma/duplicar/{original}")
+        return estado < 400
+
+    # Secuencial: se mide la latencia de un guardado, no la concurrencia
+    return {
+        'guardar': comun.medir(guardar, peticiones, 1),
+        'duplicar': comun.medir(duplicar, peticiones, 1) if original else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    semilla.agregar_argumentos(parser)
+    parser.add_argument('--sin-sembrar', action='store_true', help='usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default='bench1', help='usuario con el que se guarda')
+    parser.add_argument('--items-por-guardado', default=TAMANOS, help='lista separada por comas')
+    parser.add_argument('--lotes', default=LOTES, help='valores de ITEMS_BATCH_SIZE, separados por comas')
+    parser.add_argument('--peticiones', type=int, default=PETICIONES, help='por tamaño y lote')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args).copy()}
+    resultado['parametros'].pop('password', None)
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.db}...", flush=True)
+        conn = semilla.recrear_base(args.host, args.user, args.password, args.db)
+        resultado['semilla'] = semilla.sembrar(conn, args.usuarios, args.proformas, args.items,
+                                               args.clientes, args.semilla)
+        conn.close()
+
+    import app as aplicacion
+    from endpoints import ClienteFlask
+    app = aplicacion.app
+    app.config.update(MYSQL_HOST=args.host, MYSQL_USER=args.user, MYSQL_PASSWORD=args.password, MYSQL_DB=args.db)
+    inicio = time.perf_counter()
+    with app.app_context():
+        aplicacion.preparar_base_de_datos()
+    resultado['preparacion_s'] = round(time.perf_counter() - inicio, 2)
+
+    cliente = ClienteFlask(app, args.usuario)
+    # Calentamiento: pool de conexiones, catálogo de items y secuencia del usuario
+    cliente.pedir('POST', '/api/proformas', cuerpo_guardado(1))
+
+    resultado['lotes'] = {}
+    for lote in (int(x) for x in args.lotes.split(',')):
+        app.config['ITEMS_BATCH_SIZE'] = lote
+        medidas = resultado['lotes'][f"lote_{lote}"] = {}
+        for n in (int(x) for x in args.items_por_guardado.split(',')):
+            medidas[f"{n}_items"] = medir_tamano(cliente, n, args.peticiones)
+            print(f"  lote {lote}, {n} items: guardar p50 {medidas[f'{n}_items']['guardar']['p50_ms']} ms",
+                  flush=True)
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/importtime.py
+# Mide el tiempo de importación de app.py (arranque en frío de un worker) con
+# `python -X importtime` y lo compara con un presupuesto.
+#
+# Uso:
+#   python benchmarks/importtime.py                 # presupuesto por defecto
+#   python benchmarks/importtime.py --budget-ms 400 --repeticiones 5 --json resultado.json
+#
+# Termina con código 1 si la mediana supera el presupuesto, para poder usarlo en CI.
+"""Mide el tiempo de importación de app.py y lo compara con un presupuesto."""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESUPUESTO_MS = 500
+# Módulos pesados que no deben cargarse al importar la aplicación
+PROHIBIDOS = ('pandas', 'numpy', 'openpyxl', 'fpdf', 'PIL')
+
+
+def medir_una_vez():
+    """Importa app en un proceso nuevo y devuelve {módulo: tiempo acumulado en µs}."""
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=RAIZ, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        sys.exit(f"No se pudo importar app:\n{proceso.stderr}")
+
+    acumulado = {}
+    for linea in proceso.stderr.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        _propio, total, nombre = [parte.strip() for parte in linea.split(':', 1)[1].split('|')]
+        acumulado[nombre] = int(total)
+    return acumulado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-ms', type=float, default=PRESUPUESTO_MS)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='módulos más lentos a mostrar')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    mediciones = [medir_una_vez() for _ in range(args.repeticiones)]
+    tiempos_app = [m.get('app', 0) / 1000 for m in mediciones]
+    mediana = statistics.median(tiempos_app)
+
+    ultima = mediciones[-1]
+    mas_lentos = sorted(((nombre, us / 1000) for nombre, us in ultima.items()
+                         if '.' not in nombre and nombre != 'app'),
+                        key=lambda par: par[1], reverse=True)[:args.top]
+    cargados_prohibidos = sorted({nombre.split('.')[0] for nombre in ultima} & set(PROHIBIDOS))
+
+    resultado = {
+        'import_app_ms': {'mediana': round(mediana, 1), 'min': round(min(tiempos_app), 1),
+                          'max': round(max(tiempos_app), 1)},
+        'presupuesto_ms': args.budget_ms,
+        'modulos_mas_lentos_ms': {nombre: round(ms, 1) for nombre, ms in mas_lentos},
+        'modulos_pesados_cargados': cargados_prohibidos,
+    }
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    if mediana > args.budget_ms or cargados_prohibidos:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+# benchmarks/pdf.py
+# Rendimiento de la generación de PDFs, sin base de datos:
+#   - documentos por segundo de renderizar_proforma, con y sin precarga de imágenes
+#     (render_pdf.py)
+#   - throughput del ZIP masivo según la cantidad de procesos del pool (zip_pdf.py)
+#
+# Uso:
+#   python benchmarks/pdf.py --documentos 50 --workers 1,2,4 --json pdf.json
+"""Mide la generación de PDFs individuales y del ZIP masivo con datos sintéticos."""
+import argparse
+
+import comun
+from render_pdf import comparar_precarga, proformas_sinteticas
+from zip_pdf import comparar_workers
+
+DOCUMENTOS = 50
+WORKERS = '1,2,4'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documentos', type=int, default=DOCUMENTOS)
+    parser.add_argument('--items', type=int, default=10, help='items por proforma')
+    parser.add_argument('--workers', default=WORKERS, help='tamaños del pool para el ZIP, separados por comas')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    proformas, items = proformas_sinteticas(args.documentos, args.items)
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args)}
+    resultado['render'] = comparar_precarga(proformas, items)
+    resultado['zip'] = comparar_workers(proformas, items, [int(w) for w in args.workers.split(',')])
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/render_pdf.py
+# Documentos por segundo de pdf_render.renderizar_proforma con las imágenes de marca
+# (logo y fondo) decodificadas una vez por proceso con preload_image, frente a
+# decodificarlas en cada documento (PDF.PRECARGAR_RECURSOS = False), sin base de datos.
+#
+# Se mide con proformas cortas (una página) y largas (unas 20 páginas: el fondo se
+# dibuja en cada una). Las páginas se cuentan en el PDF generado y se informan junto
+# a cada tamaño, para que el resultado diga qué se midió de verdad.
+#
+# Uso:
+#   python benchmarks/render_pdf.py --documentos 50 --items 3,420 --json render.json
+"""Mide el renderizado de PDFs con y sin precarga de las imágenes de marca."""
+import argparse
+import random
+import re
+import time
+from datetime import date
+
+import comun
+
+DOCUMENTOS = 50
+# 3 items caben en una página; 420 ocupan 20 con la plantilla actual
+ITEMS = '3,420'
+
+PAGINA = re.compile(rb'/Type\s*/Page\b')
+
+
+def proformas_sinteticas(n, items_por_proforma, semilla=42):
+    rnd = random.Random(semilla)
+    proformas, items = [], {}
+    for proforma_id in range(1, n + 1):
+        proformas.append({
+            'id': proforma_id, 'user_id': 1, 'cotizacion_nro': str(proforma_id), 'fecha': date.today(),
+            'cliente': f"Cliente Bench {proforma_id} S.A.C.", 'incluye_igv': rnd.random() < 0.8,
+            'monto_total': 0, 'status': 'Enviada', 'version': 1,
+        })
+        items[proforma_id] = [
+            {'id': k, 'item_descripcion': f"Panel LED {rnd.choice([12, 18, 24, 36])}W",
+             'cantidad': rnd.randint(1, 50), 'precio_unitario': round(rnd.uniform(5, 900), 2)}
+            for k in range(items_por_proforma)
+        ]
+    return proformas, items
+
+
+def contar_paginas(documento):
+    return len(PAGINA.findall(documento))
+
+
+def medir_render(proformas, items, precargar):
+    import pdf_render
+    pdf_render.PDF.PRECARGAR_RECURSOS = precargar
+    # El primer documento carga fuentes e imágenes; no se cuenta
+    pdf_render.renderizar_proforma(proformas[0], items[proformas[0]['id']])
+    latencias, total_bytes, paginas = [], 0, []
+    inicio = time.perf_counter()
+    for proforma in proformas:
+        t = time.perf_counter()
+        documento = pdf_render.renderizar_proforma(proforma, items[proforma['id']])
+        latencias.append((time.perf_counter() - t) * 1000)
+        total_bytes += len(documento)
+        paginas.append(contar_paginas(documento))
+    duracion = time.perf_counter() - inicio
+    resultado = comun.resumen_latencias(latencias)
+    resultado.update({
+        'documentos_por_s': round(len(proformas) / duracion, 2),
+        'bytes_medio': total_bytes // len(proformas),
+        'paginas_min': min(paginas),
+        'paginas_max': max(paginas),
+    })
+    return resultado
+
+
+def comparar_precarga(proformas, items):
+    return {
+        'con_precarga': medir_render(proformas, items, True),
+        'sin_precarga': medir_render(proformas, items, False),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documentos', type=int, default=DOCUMENTOS, help='por cada tamaño')
+    parser.add_argument('--items', default=ITEMS, help='items por proforma, separados por comas')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args), 'render': {}}
+    for n in (int(i) for i in args.items.split(',')):
+        proformas, items = proformas_sinteticas(args.documentos, n)
+        resultado['render'][f"{n}_items"] = comparar_precarga(proformas, items)
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
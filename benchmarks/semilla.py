@@ -0,0 +1,151 @@
+# benchmarks/semilla.py
+# Crea y llena una base de datos MySQL/MariaDB desechable para los benchmarks.
+#
+# Uso:
+#   python benchmarks/semilla.py --db ledesma_bench --usuarios 5 --proformas 100000 \
+#       --items 5 --clientes 2000
+#
+# La base de datos indicada se BORRA y se vuelve a crear. Los datos se generan con
+# una semilla fija, así que dos ejecuciones con los mismos volúmenes son comparables.
+# Los usuarios se llaman bench1, bench2, ... y tienen la contraseña CLAVE_BENCH.
+"""Crea una base de datos desechable con datos de prueba para los benchmarks."""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import comun  # noqa: F401  (añade la raíz del repositorio a sys.path)
+
+import MySQLdb
+import MySQLdb.cursors
+from werkzeug.security import generate_password_hash
+
+import esquema
+
+CLAVE_BENCH = 'bench'
+BASE_PROTEGIDA = 'ledesma_led_db'
+TAMANO_LOTE = 1000
+
+PREFIJOS = ['Constructora', 'Inversiones', 'Comercial', 'Servicios', 'Distribuidora',
+            'Industrias', 'Corporación', 'Inmobiliaria', 'Grupo', 'Consorcio']
+NOMBRES = ['Andina', 'del Sur', 'Pacífico', 'Los Olivos', 'San Martín', 'Miraflores',
+           'Surco', 'Lurín', 'Chorrillos', 'La Molina', 'Ñaña', 'Huaral', 'Ica', 'Cusco']
+SUFIJOS = ['S.A.C.', 'E.I.R.L.', 'S.A.', 'S.R.L.']
+PRODUCTOS = ['Panel LED', 'Reflector LED', 'Tira LED', 'Foco LED', 'Driver', 'Luminaria hermética',
+             'Campana industrial', 'Downlight', 'Poste solar', 'Dicroico LED']
+POTENCIAS = ['9W', '12W', '18W', '24W', '36W', '50W', '100W', '150W', '200W']
+
+
+def nombre_cliente(rnd, n):
+    return f"{rnd.choice(PREFIJOS)} {rnd.choice(NOMBRES)} {n} {rnd.choice(SUFIJOS)}"
+
+
+def _insertar_lotes(conn, sql, filas):
+    cur = conn.cursor()
+    for inicio in range(0, len(filas), TAMANO_LOTE):
+        # executemany de mysqlclient convierte el INSERT en uno solo de varias filas
+        cur.executemany(sql, filas[inicio:inicio + TAMANO_LOTE])
+    conn.commit()
+    cur.close()
+
+
+def recrear_base(host, user, password, db):
+    if db == BASE_PROTEGIDA:
+        sys.exit(f"Cancelado: {db} es la base de datos de la aplicación; use una desechable.")
+    conn = MySQLdb.connect(host=host, user=user, passwd=password, charset='utf8mb4',
+                           cursorclass=MySQLdb.cursors.DictCursor)
+    cur = conn.cursor()
+    cur.execute(f"DROP DATABASE IF EXISTS `{db}`")
+    cur.execute(f"CREATE DATABASE `{db}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+    cur.execute(f"USE `{db}`")
+    # Sólo las tablas de datos: búsqueda, estadísticas y secuencias las calcula la app
+    # al arrancar, a partir de lo sembrado
+    esquema.migrar(cur, hasta=esquema.VERSION_TABLAS_BASE)
+    conn.commit()
+    cur.close()
+    return conn
+
+
+def sembrar(conn, usuarios=5, proformas=10000, items=5, clientes=1000, semilla=42):
+    """Llena las tablas base. `items` es el promedio por proforma; `clientes` es el total."""
+    rnd = random.Random(semilla)
+    volumenes = {'usuarios': usuarios, 'proformas': proformas, 'items': 0, 'clientes': clientes}
+    inicio = time.perf_counter()
+
+    clave = generate_password_hash(CLAVE_BENCH)
+    _insertar_lotes(conn, "INSERT INTO users (id, fullname, username, password) VALUES (%s, %s, %s, %s)",
+                    [(u, f"Usuario Bench {u}", f"bench{u}", clave) for u in range(1, usuarios + 1)])
+
+    nombres_por_usuario = {u: [] for u in range(1, usuarios + 1)}
+    filas_clientes = []
+    for n in range(clientes):
+        user_id = n % usuarios + 1
+        nombre = nombre_cliente(rnd, n)
+        nombres_por_usuario[user_id].append(nombre)
+        filas_clientes.append((user_id, nombre, f"20{rnd.randrange(10**8, 10**9)}",
+                               f"Av. {rnd.choice(NOMBRES)} {rnd.randrange(100, 3000)}",
+                               f"9{rnd.randrange(10**7, 10**8)}", f"contacto{n}@example.com"))
+    _insertar_lotes(conn, "INSERT INTO clientes (user_id, nombre, ruc_dni, direccion, telefono, email) "
+                          "VALUES (%s, %s, %s, %s, %s, %s)", filas_clientes)
+
+    hoy = date.today()
+    numeros = {u: 0 for u in range(1, usuarios + 1)}
+    filas_proformas, filas_items = [], []
+    for proforma_id in range(1, proformas + 1):
+        user_id = rnd.randrange(1, usuarios + 1)
+        numeros[user_id] += 1
+        monto = 0.0
+        for _ in range(rnd.randint(1, max(1, 2 * items - 1))):
+            cantidad = rnd.randint(1, 50)
+            precio = round(rnd.uniform(5, 900), 2)
+            monto += cantidad * precio
+            filas_items.append((proforma_id, f"{rnd.choice(PRODUCTOS)} {rnd.choice(POTENCIAS)}", cantidad, precio))
+        cliente = rnd.choice(nombres_por_usuario[user_id] or ['Cliente Genérico'])
+        filas_proformas.append((proforma_id, user_id, str(numeros[user_id]),
+                                hoy - timedelta(days=rnd.randrange(0, 3 * 365)), cliente,
+                                rnd.random() < 0.8, round(monto, 2),
+                                rnd.choice(['Enviada', 'Enviada', 'Aprobada', 'Rechazada'])))
+        # Se vuelca por tramos para no acumular millones de filas en memoria
+        if len(filas_items) >= 20 * TAMANO_LOTE:
+            _volcar_proformas(conn, filas_proformas, filas_items)
+            volumenes['items'] += len(filas_items)
+            filas_proformas, filas_items = [], []
+    _volcar_proformas(conn, filas_proformas, filas_items)
+    volumenes['items'] += len(filas_items)
+
+    volumenes['duracion_s'] = round(time.perf_counter() - inicio, 2)
+    return volumenes
+
+
+def _volcar_proformas(conn, filas_proformas, filas_items):
+    _insertar_lotes(conn, "INSERT INTO proformas (id, user_id, cotizacion_nro, fecha, cliente, incluye_igv, "
+                          "monto_total, status) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", filas_proformas)
+    _insertar_lotes(conn, "INSERT INTO proforma_items (proforma_id, item_descripcion, cantidad, precio_unitario) "
+                          "VALUES (%s, %s, %s, %s)", filas_items)
+
+
+def agregar_argumentos(parser):
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--db', default='ledesma_bench', help='base de datos desechable (se borra)')
+    parser.add_argument('--usuarios', type=int, default=5)
+    parser.add_argument('--proformas', type=int, default=10000)
+    parser.add_argument('--items', type=int, default=5, help='items promedio por proforma')
+    parser.add_argument('--clientes', type=int, default=1000)
+    parser.add_argument('--semilla', type=int, default=42)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    agregar_argumentos(parser)
+    args = parser.parse_args()
+    conn = recrear_base(args.host, args.user, args.password, args.db)
+    volumenes = sembrar(conn, args.usuarios, args.proformas, args.items, args.clientes, args.semilla)
+    conn.close()
+    print(volumenes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+# benchmarks/workers.py
+# Throughput de la aplicación servida por gunicorn (gunicorn.conf.py) con 1, 2, 4 y 8
+# workers, contra una base de datos MySQL/MariaDB desechable.
+#
+# Por cada cantidad de workers se arranca un servidor en un proceso aparte (el mismo
+# script con --servir), se espera a /health/ready y se mide cada escenario de
+# endpoints.py con la misma concurrencia. Las cachés del servidor (compartida y de
+# PDF) van a una carpeta temporal nueva en cada arranque.
+#
+# Uso:
+#   python benchmarks/workers.py --db ledesma_bench --workers 1,2,4,8 --concurrencia 16 --json workers.json
+#
+# El generador de carga corre en la misma máquina: con pocos núcleos le quita CPU
+# al servidor, así que las cifras sólo son comparables entre sí.
+"""Mide el throughput con gunicorn a distintas cantidades de workers."""
+import argparse
+import http.client
+import os
+import runpy
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import comun
+import semilla
+from endpoints import ClienteHTTP, datos_de_prueba, definir_escenarios
+
+WORKERS = '1,2,4,8'
+CONCURRENCIA = 16
+PETICIONES = 400
+ESCENARIOS = 'lista,busqueda,pdf,analitica,dashboard'
+ESPERA_ARRANQUE = 60
+
+
+def servir(args):
+    """Proceso hijo: gunicorn con gunicorn.conf.py, los workers pedidos y la base de prueba."""
+    from gunicorn.app.base import BaseApplication
+
+    class Servidor(BaseApplication):
+        def load_config(self):
+            opciones = runpy.run_path(os.path.join(comun.RAIZ, 'gunicorn.conf.py'))
+            opciones.update(workers=args.workers, bind=f"127.0.0.1:{args.puerto}")
+            for nombre, valor in opciones.items():
+                if nombre in self.cfg.settings:
+                    self.cfg.set(nombre, valor)
+
+        def load(self):
+            # Con preload_app se llama una vez en el maestro, antes de crear los workers
+            import app as aplicacion
+            aplicacion.app.config.update(MYSQL_HOST=args.host, MYSQL_USER=args.user,
+                                         MYSQL_PASSWORD=args.password, MYSQL_DB=args.db)
+            return aplicacion.app
+
+    temporal = tempfile.mkdtemp(prefix='bench-workers-')
+    os.environ['SHARED_CACHE_PATH'] = os.path.join(temporal, 'cache_compartido.sqlite3')
+    os.environ['PDF_CACHE_DIR'] = os.path.join(temporal, 'cache_pdf')
+    Servidor().run()
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def esperar_listo(puerto, proceso):
+    limite = time.monotonic() + ESPERA_ARRANQUE
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError("El servidor terminó al arrancar")
+        try:
+            conexion = http.client.HTTPConnection('127.0.0.1', puerto, timeout=30)
+            conexion.request('GET', '/health/ready')
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"El servidor no respondió en {ESPERA_ARRANQUE} s")
+
+
+def medir_con_workers(args, workers, escenarios, seleccion):
+    puerto = puerto_libre()
+    comando = [sys.executable, os.path.abspath(__file__), '--servir', '--workers', str(workers),
+               '--puerto', str(puerto), '--host', args.host, '--user', args.user,
+               '--password', args.password, '--db', args.db]
+    proceso = subprocess.Popen(comando, cwd=comun.RAIZ, stderr=subprocess.DEVNULL)
+    try:
+        esperar_listo(puerto, proceso)
+        cookie = ClienteHTTP.iniciar_sesion(puerto, args.usuario)
+        resultados = {}
+        for nombre in seleccion:
+            peticion = escenarios[nombre][0]
+
+            def una(cliente, i, peticion=peticion):
+                estado, _ = cliente.pedir(*peticion(i))
+                return estado < 400
+
+            # Calentamiento: cada worker carga sus cachés en sus primeras peticiones
+            comun.medir(una, args.concurrencia * 2, args.concurrencia, lambda: ClienteHTTP(puerto, cookie))
+            resultados[nombre] = comun.medir(una, args.peticiones, args.concurrencia,
+                                             lambda: ClienteHTTP(puerto, cookie))
+        print(f"  {workers} workers: " + ", ".join(f"{n}: {r['throughput_rps']} rps"
+                                                   for n, r in resultados.items()), flush=True)
+        return resultados
+    finally:
+        proceso.send_signal(signal.SIGTERM)
+        proceso.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    semilla.agregar_argumentos(parser)
+    parser.add_argument('--sin-sembrar', action='store_true', help='usar los datos que ya tiene la base')
+    parser.add_argument('--usuario', default='bench1', help='usuario con el que se hacen las peticiones')
+    parser.add_argument('--workers', default=WORKERS, help='lista separada por comas')
+    parser.add_argument('--concurrencia', type=int, default=CONCURRENCIA)
+    parser.add_argument('--peticiones', type=int, default=PETICIONES, help='por escenario y cantidad de workers')
+    parser.add_argument('--escenarios', default=ESCENARIOS, help='de endpoints.py, separados por comas')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    # Uso interno: el proceso servidor
+    parser.add_argument('--servir', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--puerto', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        args.workers = int(args.workers)
+        servir(args)
+        return
+
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args).copy()}
+    resultado['parametros'].pop('password', None)
+    if not args.sin_sembrar:
+        print(f"Sembrando {args.db}...", flush=True)
+        conn = semilla.recrear_base(args.host, args.user, args.password, args.db)
+        resultado['semilla'] = semilla.sembrar(conn, args.usuarios, args.proformas, args.items,
+                                               args.clientes, args.semilla)
+        conn.close()
+
+    # Las preparaciones de los escenarios actúan sobre el proceso local: aquí no sirven
+    escenarios = definir_escenarios(datos_de_prueba(args), cache_pdf=None)
+    seleccion = args.escenarios.split(',')
+    desconocidos = set(seleccion) - set(escenarios)
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}")
+
+    resultado['workers'] = {}
+    for workers in (int(w) for w in args.workers.split(',')):
+        resultado['workers'][f"w{workers}"] = medir_con_workers(args, workers, escenarios, seleccion)
+
+    # Aceleración respecto de la primera cantidad de workers medida
+    base = next(iter(resultado['workers'].values()))
+    resultado['aceleracion'] = {
+        clave: {n: round(r['throughput_rps'] / base[n]['throughput_rps'], 2) if base[n]['throughput_rps'] else None
+                for n, r in medidas.items()}
+        for clave, medidas in resultado['workers'].items()
+    }
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
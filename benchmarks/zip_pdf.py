@@ -0,0 +1,68 @@
+# benchmarks/zip_pdf.py
+# Throughput del ZIP masivo de PDFs (pdf_lotes.generar_zip) según la cantidad de
+# procesos del pool que dibuja los documentos, sin base de datos ni caché de PDFs.
+#
+# Uso:
+#   python benchmarks/zip_pdf.py --documentos 50 --workers 1,2,4 --json zip.json
+#
+# Con menos núcleos que procesos la aceleración se estanca: anote `cpus` (en meta).
+"""Mide el ZIP masivo de PDFs con 1, 2, 4... procesos."""
+import argparse
+import time
+
+import comun
+from render_pdf import proformas_sinteticas
+
+DOCUMENTOS = 50
+WORKERS = '1,2,4'
+
+
+def medir_zip(proformas, items, max_workers):
+    import pdf_lotes
+    from cache_pdf import CachePDF
+
+    # Pool nuevo para cada tamaño (el de la aplicación se crea una sola vez por proceso)
+    if pdf_lotes._pool is not None:
+        pdf_lotes._pool.shutdown()
+        pdf_lotes._pool = None
+    pool = pdf_lotes.obtener_pool(max_workers)
+    # Arranque de los procesos (spawn) fuera de la medición
+    list(pool.map(abs, range(max_workers)))
+
+    inicio = time.perf_counter()
+    total_bytes = sum(len(parte) for parte in
+                      pdf_lotes.generar_zip(proformas, items, CachePDF(max_bytes=0), max_workers))
+    duracion = time.perf_counter() - inicio
+    return {
+        'workers': max_workers,
+        'duracion_s': round(duracion, 3),
+        'documentos_por_s': round(len(proformas) / duracion, 2),
+        'bytes_zip': total_bytes,
+    }
+
+
+def comparar_workers(proformas, items, workers):
+    medidas = [medir_zip(proformas, items, w) for w in workers]
+    # Aceleración respecto de la primera cantidad de procesos medida
+    base = medidas[0]['documentos_por_s']
+    for medida in medidas:
+        medida['aceleracion'] = round(medida['documentos_por_s'] / base, 2) if base else None
+    return medidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--documentos', type=int, default=DOCUMENTOS)
+    parser.add_argument('--items', type=int, default=10, help='items por proforma')
+    parser.add_argument('--workers', default=WORKERS, help='tamaños del pool, separados por comas')
+    parser.add_argument('--json', help='guardar el resultado en este archivo')
+    args = parser.parse_args()
+
+    proformas, items = proformas_sinteticas(args.documentos, args.items)
+    resultado = {'meta': comun.metadatos(), 'parametros': vars(args)}
+    resultado['zip'] = comparar_workers(proformas, items, [int(w) for w in args.workers.split(',')])
+    comun.escribir_resultado(resultado, args.json)
+
+
+if __name__ == '__main__':
+    main()
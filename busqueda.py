@@ -0,0 +1,113 @@
+# busqueda.py
+# Índice de búsqueda de texto completo para las proformas.
+#
+# La tabla `proformas_busqueda` guarda, por cada proforma, un único texto con el
+# cliente, el número de cotización y las descripciones de sus items. Sobre ese texto
+# hay un índice FULLTEXT con el parser ngram de MySQL, que funciona bien con palabras
+# parciales ("led", "pan" -> "panel") sin recurrir a LIKE '%term%'.
+import re
+
+# Tamaño mínimo de término que el parser ngram puede resolver (ngram_token_size por defecto).
+NGRAM_TOKEN_SIZE = 2
+
+CREATE_TABLE_BUSQUEDA = """
+    CREATE TABLE IF NOT EXISTS proformas_busqueda (
+        proforma_id INT NOT NULL PRIMARY KEY,
+        user_id INT NOT NULL,
+        contenido MEDIUMTEXT NOT NULL,
+        KEY idx_busqueda_user (user_id),
+        FULLTEXT KEY ft_busqueda_contenido (contenido) WITH PARSER ngram
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+"""
+
+# Reconstruye el texto de una o varias proformas directamente en el servidor,
+# sin traer los items a Python.
+_SELECT_CONTENIDO = """
+    SELECT p.id, p.user_id,
+           CONCAT_WS(' ', p.cliente, p.cotizacion_nro, GROUP_CONCAT(pi.item_descripcion SEPARATOR ' '))
+    FROM proformas p
+    LEFT JOIN proforma_items pi ON pi.proforma_id = p.id
+"""
+
+_UPSERT = """
+    ON DUPLICATE KEY UPDATE user_id = VALUES(user_id), contenido = VALUES(contenido)
+"""
+
+# Caracteres con significado especial en el modo BOOLEAN de MATCH ... AGAINST.
+_OPERADORES_BOOLEANOS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _ampliar_group_concat(cur):
+    # Por defecto GROUP_CONCAT corta en 1024 bytes, insuficiente para proformas grandes.
+    cur.execute("SET SESSION group_concat_max_len = 1048576")
+
+
+def crear_tabla_busqueda(cur):
+    """Crea la tabla de búsqueda si no existe y la llena si está vacía."""
+    cur.execute(CREATE_TABLE_BUSQUEDA)
+    cur.execute("SELECT 1 FROM proformas_busqueda LIMIT 1")
+    if cur.fetchone():
+        return
+    _ampliar_group_concat(cur)
+    cur.execute(
+        "INSERT INTO proformas_busqueda (proforma_id, user_id, contenido) "
+        + _SELECT_CONTENIDO + " GROUP BY p.id " + _UPSERT
+    )
+
+
+def indexar_proformas(cur, proforma_ids):
+    """Actualiza el texto indexado de las proformas indicadas (alta o edición)."""
+    proforma_ids = list(proforma_ids)
+    if not proforma_ids:
+        return
+    _ampliar_group_concat(cur)
+    placeholders = ", ".join(["%s"] * len(proforma_ids))
+    cur.execute(
+        "INSERT INTO proformas_busqueda (proforma_id, user_id, contenido) "
+        + _SELECT_CONTENIDO + f" WHERE p.id IN ({placeholders}) GROUP BY p.id " + _UPSERT,
+        proforma_ids
+    )
+
+
+def eliminar_del_indice(cur, proforma_ids):
+    """Quita del índice las proformas eliminadas."""
+    proforma_ids = list(proforma_ids)
+    if not proforma_ids:
+        return
+    placeholders = ", ".join(["%s"] * len(proforma_ids))
+    cur.execute(f"DELETE FROM proformas_busqueda WHERE proforma_id IN ({placeholders})", proforma_ids)
+
+
+def expresion_booleana(termino):
+    """Convierte lo que escribe el usuario en una expresión BOOLEAN MODE.
+
+    Cada palabra se exige (+) como frase, que con el parser ngram equivale a buscar
+    la secuencia de n-gramas. Devuelve None si ninguna palabra alcanza el tamaño
+    mínimo del n-grama, en cuyo caso hay que usar la búsqueda tradicional.
+    """
+    palabras = [p for p in _OPERADORES_BOOLEANOS.sub(' ', termino).split() if len(p) >= NGRAM_TOKEN_SIZE]
+    if not palabras:
+        return None
+    return " ".join(f'+"{p}"' for p in palabras)
+
+
+def condicion_busqueda(termino):
+    """Devuelve (join, where, params, score) para filtrar y ordenar la lista de proformas.
+
+    `score` es una expresión SQL con su propio marcador de parámetro que ordena por
+    relevancia; es None cuando se recurre al LIKE porque el término es demasiado corto.
+    """
+    expresion = expresion_booleana(termino)
+    if expresion is None:
+        return (
+            "",
+            "(p.cliente LIKE %s OR p.cotizacion_nro LIKE %s)",
+            [f"%{termino}%", f"%{termino}%"],
+            None,
+        )
+    return (
+        " JOIN proformas_busqueda b ON b.proforma_id = p.id ",
+        "MATCH(b.contenido) AGAINST (%s IN BOOLEAN MODE)",
+        [expresion],
+        "MATCH(b.contenido) AGAINST (%s IN BOOLEAN MODE)",
+    )
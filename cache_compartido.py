@@ -0,0 +1,223 @@
+# cache_compartido.py
+# Caché compartida entre los procesos (workers de gunicorn) de un mismo servidor.
+#
+# Con SHARED_CACHE_PATH configurado se guarda en un archivo SQLite (modo WAL, una
+# conexión por hilo); sin él, en un diccionario del propio proceso, que es lo que
+# basta con un solo proceso de waitress. Ofrece dos cosas:
+#
+#   valores       clave -> valor JSON con caducidad (por ejemplo, los conteos de
+#                 la paginación), calculado por un worker y aprovechado por todos
+#   generaciones  un contador por (espacio, id) que se incrementa cada vez que un
+#                 worker cambia esos datos. Las cachés que viven en memoria de cada
+#                 proceso (índice de clientes, catálogo de items) comparan antes de
+#                 usarse la generación que vieron con la actual y, si otro worker la
+#                 cambió, descartan su copia.
+#
+# Si el archivo no se puede usar, se avisa por stderr y se actúa con prudencia:
+# los valores no se encuentran y las copias locales se descartan.
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+# Cada cuántas escrituras se borran los valores caducados
+ESCRITURAS_POR_PURGA = 1000
+# Carácter mayor que cualquier otro, para acotar el rango de un prefijo
+_FIN_PREFIJO = '\U0010ffff'
+
+ESQUEMA = """
+    CREATE TABLE IF NOT EXISTS valores (
+        clave TEXT PRIMARY KEY,
+        valor TEXT NOT NULL,
+        expira REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS generaciones (
+        espacio TEXT NOT NULL,
+        id TEXT NOT NULL,
+        generacion INTEGER NOT NULL,
+        PRIMARY KEY (espacio, id)
+    );
+"""
+
+
+class _Memoria:
+    """Almacén del propio proceso (un solo worker)."""
+
+    def __init__(self):
+        self._valores = {}
+        self._generaciones = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._valores.get(clave)
+            if entrada and entrada[1] > time.time():
+                return entrada[0]
+            self._valores.pop(clave, None)
+            return None
+
+    def guardar(self, clave, valor, ttl):
+        with self._lock:
+            self._valores[clave] = (valor, time.time() + ttl)
+
+    def eliminar_prefijo(self, prefijo):
+        with self._lock:
+            for clave in [c for c in self._valores if c.startswith(prefijo)]:
+                del self._valores[clave]
+
+    def generacion(self, espacio, id):
+        with self._lock:
+            return self._generaciones.get((espacio, id), 0)
+
+    def incrementar(self, espacio, id):
+        with self._lock:
+            generacion = self._generaciones[(espacio, id)] = self._generaciones.get((espacio, id), 0) + 1
+            return generacion
+
+
+class _SQLite:
+    """Almacén en un archivo SQLite que comparten todos los procesos del servidor."""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._escrituras = 0
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: las abiertas antes de un fork no se heredan
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(ESQUEMA)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def obtener(self, clave):
+        fila = self._conexion().execute(
+            "SELECT valor FROM valores WHERE clave = ? AND expira > ?", (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def guardar(self, clave, valor, ttl):
+        conn = self._conexion()
+        conn.execute(
+            "INSERT OR REPLACE INTO valores (clave, valor, expira) VALUES (?, ?, ?)",
+            (clave, valor, time.time() + ttl)
+        )
+        self._escrituras += 1
+        if self._escrituras % ESCRITURAS_POR_PURGA == 0:
+            conn.execute("DELETE FROM valores WHERE expira <= ?", (time.time(),))
+
+    def eliminar_prefijo(self, prefijo):
+        self._conexion().execute(
+            "DELETE FROM valores WHERE clave >= ? AND clave < ?", (prefijo, prefijo + _FIN_PREFIJO)
+        )
+
+    def generacion(self, espacio, id):
+        fila = self._conexion().execute(
+            "SELECT generacion FROM generaciones WHERE espacio = ? AND id = ?", (espacio, id)
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def incrementar(self, espacio, id):
+        conn = self._conexion()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("""
+                INSERT INTO generaciones (espacio, id, generacion) VALUES (?, ?, 1)
+                ON CONFLICT (espacio, id) DO UPDATE SET generacion = generacion + 1
+            """, (espacio, id))
+            generacion = conn.execute(
+                "SELECT generacion FROM generaciones WHERE espacio = ? AND id = ?", (espacio, id)
+            ).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return generacion
+
+
+class CacheCompartido:
+    """Extensión de Flask: valores y generaciones comunes a todos los workers."""
+
+    def __init__(self, app=None):
+        self.backend = _Memoria()
+        # (espacio, id) -> generación con la que se cargó la copia de este proceso
+        self._vistas = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        ruta = app.config.get('SHARED_CACHE_PATH')
+        self.backend = _SQLite(ruta) if ruta else _Memoria()
+
+    # --- VALORES ---
+
+    def obtener(self, clave):
+        try:
+            valor = self.backend.obtener(clave)
+        except sqlite3.Error as e:
+            print(f"ADVERTENCIA: No se pudo leer la caché compartida: {e}", file=sys.stderr)
+            return None
+        return None if valor is None else json.loads(valor)
+
+    def guardar(self, clave, valor, ttl):
+        try:
+            self.backend.guardar(clave, json.dumps(valor), ttl)
+        except sqlite3.Error as e:
+            print(f"ADVERTENCIA: No se pudo escribir en la caché compartida: {e}", file=sys.stderr)
+
+    def eliminar_prefijo(self, prefijo):
+        try:
+            self.backend.eliminar_prefijo(prefijo)
+        except sqlite3.Error as e:
+            print(f"ADVERTENCIA: No se pudo invalidar la caché compartida: {e}", file=sys.stderr)
+
+    # --- GENERACIONES ---
+
+    def comprobar(self, espacio, id, descartar):
+        """Llama a `descartar(id)` si otro proceso cambió esos datos desde que se cargaron.
+
+        Llamar antes de usar la copia en memoria de este proceso.
+        """
+        clave = (espacio, str(id))
+        try:
+            actual = self.backend.generacion(*clave)
+        except sqlite3.Error as e:
+            print(f"ADVERTENCIA: No se pudo leer la caché compartida: {e}", file=sys.stderr)
+            actual = None
+        with self._lock:
+            vista = self._vistas.get(clave)
+            # Sin poder leerla, -1 obliga a descartar también en la próxima comprobación
+            self._vistas[clave] = -1 if actual is None else actual
+        # La primera vez que se consulta todavía no hay copia que descartar
+        if actual is None or (vista is not None and vista != actual):
+            descartar(id)
+
+    def publicar(self, espacio, id):
+        """Avisa a los demás procesos de un cambio (tras el commit).
+
+        La copia de este proceso sigue siendo válida si quien llama ya le aplicó el
+        cambio y nadie más publicó otro desde la última comprobación; si no, se
+        descartará en la siguiente.
+        """
+        clave = (espacio, str(id))
+        try:
+            nueva = self.backend.incrementar(*clave)
+        except sqlite3.Error as e:
+            print(f"ADVERTENCIA: No se pudo escribir en la caché compartida: {e}", file=sys.stderr)
+            with self._lock:
+                self._vistas[clave] = -1
+            return
+        with self._lock:
+            if self._vistas.get(clave) == nueva - 1:
+                self._vistas[clave] = nueva
@@ -0,0 +1,162 @@
+# cache_pdf.py
+# Caché de PDFs ya generados, direccionada por contenido.
+#
+# La clave es un hash de la fila de la proforma, sus items y la versión de la
+# plantilla: si cualquiera de ellos cambia, la clave cambia y el PDF se vuelve a
+# generar. Además se invalida explícitamente por id de proforma cuando ésta se
+# edita, cambia de estado, se elimina o se duplica, para liberar memoria y disco.
+#
+# Hay dos niveles: un LRU en memoria acotado por bytes y, opcionalmente, un
+# directorio en disco que sobrevive a los reinicios. El directorio también tiene
+# tope: cada tantas escrituras se mide y, si lo pasa, se borran los PDF usados hace
+# más tiempo (cada lectura renueva la fecha de modificación del archivo).
+import glob
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+# Subir este número cada vez que cambie el diseño del PDF (textos, márgenes, imágenes).
+PLANTILLA_PDF_VERSION = 1
+
+# Cada cuántas escrituras en disco se mide el directorio (la primera también)
+ESCRITURAS_POR_PODA = 50
+# Al pasar el tope se borra hasta quedar en esta fracción, para no podar en cada escritura
+FRACCION_TRAS_PODA = 0.9
+# Temporales de escrituras interrumpidas (un proceso que murió a medias)
+EDAD_MAXIMA_TEMPORAL = 3600
+
+
+def clave_pdf(proforma, items):
+    """Hash estable de todo lo que determina el contenido del PDF."""
+    contenido = json.dumps(
+        {'v': PLANTILLA_PDF_VERSION, 'proforma': proforma, 'items': list(items)},
+        sort_keys=True, default=str
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+class CachePDF:
+    def __init__(self, max_bytes=64 * 1024 * 1024, directorio=None, max_bytes_disco=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.directorio = directorio
+        self.max_bytes_disco = max_bytes_disco
+        self._escrituras_disco = 0
+        self._memoria = OrderedDict()  # (proforma_id, clave) -> bytes
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+
+    def _ruta(self, proforma_id, clave):
+        return os.path.join(self.directorio, f"{proforma_id}-{clave}.pdf")
+
+    def obtener(self, proforma_id, clave):
+        with self._lock:
+            datos = self._memoria.get((proforma_id, clave))
+            if datos is not None:
+                self._memoria.move_to_end((proforma_id, clave))
+                return datos
+
+        if not self.directorio:
+            return None
+        ruta = self._ruta(proforma_id, clave)
+        try:
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            # Recién usado: la poda borra primero los de fecha más antigua
+            os.utime(ruta)
+        except OSError:
+            pass
+        self._guardar_en_memoria(proforma_id, clave, datos)
+        return datos
+
+    def guardar(self, proforma_id, clave, datos):
+        self._guardar_en_memoria(proforma_id, clave, datos)
+        if not self.directorio:
+            return
+        try:
+            # Escritura atómica: otro hilo o proceso nunca ve un archivo a medias
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(datos)
+            os.replace(temporal, self._ruta(proforma_id, clave))
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo guardar el PDF en la caché de disco: {e}", file=sys.stderr)
+            return
+        with self._lock:
+            self._escrituras_disco += 1
+            podar = self._escrituras_disco % ESCRITURAS_POR_PODA == 1
+        if podar:
+            self.podar_disco()
+
+    def podar_disco(self):
+        """Si el directorio pasa de max_bytes_disco, borra los PDF usados hace más tiempo.
+
+        Devuelve cuántos archivos se borraron. Varios procesos pueden podar a la vez:
+        un archivo que otro ya borró simplemente se salta.
+        """
+        archivos, total = [], 0
+        limite_temporales = time.time() - EDAD_MAXIMA_TEMPORAL
+        try:
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    try:
+                        info = entrada.stat()
+                        if entrada.name.endswith('.tmp'):
+                            if info.st_mtime < limite_temporales:
+                                os.remove(entrada.path)
+                            continue
+                    except OSError:
+                        continue
+                    if entrada.name.endswith('.pdf'):
+                        archivos.append((info.st_mtime, info.st_size, entrada.path))
+                        total += info.st_size
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo revisar la caché de PDFs en disco: {e}", file=sys.stderr)
+            return 0
+        if total <= self.max_bytes_disco:
+            return 0
+        borrados = 0
+        objetivo = self.max_bytes_disco * FRACCION_TRAS_PODA
+        for _, tamano, ruta in sorted(archivos):
+            if total <= objetivo:
+                break
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except OSError:
+                pass
+            total -= tamano
+        return borrados
+
+    def invalidar(self, proforma_id):
+        with self._lock:
+            for llave in [k for k in self._memoria if k[0] == proforma_id]:
+                self._bytes -= len(self._memoria.pop(llave))
+        if self.directorio:
+            for ruta in glob.glob(os.path.join(self.directorio, f"{proforma_id}-*.pdf")):
+                try:
+                    os.remove(ruta)
+                except OSError:
+                    pass
+
+    def _guardar_en_memoria(self, proforma_id, clave, datos):
+        if len(datos) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._memoria.pop((proforma_id, clave), None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._memoria[(proforma_id, clave)] = datos
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes:
+                _, descartado = self._memoria.popitem(last=False)
+                self._bytes -= len(descartado)
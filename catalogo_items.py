@@ -0,0 +1,350 @@
+# catalogo_items.py
+# Catálogo en memoria de los items ya cotizados, para autocompletar las líneas.
+#
+# Cada usuario tiene su catálogo: una entrada por descripción distinta (agrupando
+# mayúsculas y tildes) con cuántas veces se usó, el precio medio y el último precio.
+# Se busca igual que en el índice de clientes: una lista ordenada de claves (la
+# descripción completa y cada una de sus palabras) en la que se ubica el prefijo con
+# bisect. Los resultados se ordenan por frecuencia de uso.
+#
+# Ordenar el rango de un prefijo corto ("p", "panel") costaría milisegundos, así que
+# al cargar se calcula el ranking de todos los prefijos con más de UMBRAL_RANGO claves,
+# de abajo hacia arriba (los primeros de un prefijo están entre los primeros de sus
+# hijos). Los demás rangos son chicos y se ordenan al pedirlos y se memorizan. Cuando
+# una entrada suma usos, los rankings que la contienen se corrigen en el lugar; sólo
+# se descartan si baja una entrada que estaba en ellos.
+#
+# El catálogo se carga la primera vez que se usa (una consulta agregada sobre todo el
+# historial) y después se mantiene con los cambios de cada guardado, sin volver a leer
+# la base de datos. Se descarta por LRU cuando se supera el presupuesto de memoria.
+#
+# Cada guardado avisa antes de su commit (iniciar_cambio) y aplica sus líneas después
+# (registrar). Una carga que coincida con un guardado en curso no se conserva: su
+# consulta pudo ver ya esas líneas, que registrar() volvería a sumar.
+import bisect
+import heapq
+import threading
+from collections import OrderedDict
+
+from indice_clientes import normalizar
+
+# Presupuesto total de descripciones en memoria entre todos los usuarios.
+MAX_ENTRADAS = 500000
+# Prefijos con más claves que esto se rankean al cargar; el resto, al buscarlos.
+UMBRAL_RANGO = 256
+# Rankings de prefijos chicos memorizados por usuario, y resultados por búsqueda.
+MAX_PREFIJOS = 2000
+LIMITE = 10
+# Carácter mayor que cualquier otro, para acotar el rango de un prefijo.
+_FIN_PREFIJO = '\U0010ffff'
+
+CONSULTA_CARGA = """
+    SELECT t.descripcion, t.usos, t.total, t.ultimo_id, pi.precio_unitario AS ultimo_precio
+    FROM (
+        SELECT pi.item_descripcion AS descripcion, COUNT(*) AS usos,
+               SUM(pi.precio_unitario) AS total, MAX(pi.id) AS ultimo_id
+        FROM proformas p
+        JOIN proforma_items pi ON pi.proforma_id = p.id
+        WHERE p.user_id = %s
+        GROUP BY pi.item_descripcion
+    ) t
+    JOIN proforma_items pi ON pi.id = t.ultimo_id
+"""
+
+
+class _Articulo:
+    __slots__ = ('descripcion', 'usos', 'total', 'ultimo_precio', 'reciente')
+
+    def __init__(self, descripcion):
+        self.descripcion = descripcion
+        self.usos = 0
+        self.total = 0.0
+        self.ultimo_precio = None
+        self.reciente = 0
+
+    def como_dict(self):
+        return {
+            'descripcion': self.descripcion,
+            'usos': self.usos,
+            'precio_promedio': round(self.total / self.usos, 2),
+            'ultimo_precio': self.ultimo_precio,
+        }
+
+
+def _claves(nombre):
+    """Claves de búsqueda de una descripción normalizada: completa y cada palabra."""
+    claves = {nombre}
+    claves.update(nombre.split()[1:])
+    return claves
+
+
+class _CatalogoUsuario:
+    def __init__(self, filas):
+        self.articulos = {}  # descripción normalizada -> _Articulo
+        self.reloj = 0
+        for fila in filas:
+            nombre = normalizar(fila['descripcion'])
+            if not nombre:
+                continue
+            articulo = self.articulos.get(nombre)
+            if articulo is None:
+                articulo = self.articulos[nombre] = _Articulo(fila['descripcion'])
+            articulo.usos += int(fila['usos'])
+            articulo.total += float(fila['total'])
+            # Varias filas con la misma descripción normalizada: manda la más reciente
+            if fila['ultimo_id'] > articulo.reciente:
+                articulo.reciente = fila['ultimo_id']
+                articulo.ultimo_precio = float(fila['ultimo_precio'])
+                articulo.descripcion = fila['descripcion']
+            self.reloj = max(self.reloj, fila['ultimo_id'])
+        pares = sorted((clave, nombre) for nombre in self.articulos for clave in _claves(nombre))
+        self.claves = [clave for clave, _ in pares]
+        self.nombres = [nombre for _, nombre in pares]
+        # prefijo -> (límite, descripciones normalizadas de mayor a menor uso)
+        self.fijos = {}
+        self.rankings = OrderedDict()
+        self._precalcular('', 0, len(self.claves))
+
+    def __len__(self):
+        return len(self.articulos)
+
+    def _puntaje(self, nombre):
+        articulo = self.articulos[nombre]
+        return articulo.usos, articulo.reciente
+
+    def _precalcular(self, prefijo, inicio, fin):
+        """Ranking del rango [inicio, fin) de claves que empiezan por `prefijo`.
+
+        Los rangos grandes se arman con los rankings de cada prefijo una letra más largo
+        y se guardan en `fijos`; los chicos se ordenan directamente y no se guardan.
+        """
+        if fin - inicio <= UMBRAL_RANGO:
+            return heapq.nlargest(LIMITE, set(self.nombres[inicio:fin]), key=self._puntaje)
+        largo = len(prefijo)
+        candidatos = set()
+        posicion = inicio
+        while posicion < fin:
+            clave = self.claves[posicion]
+            if len(clave) == largo:
+                # La clave es justo el prefijo (una palabra que se repite en muchas descripciones)
+                candidatos.add(self.nombres[posicion])
+                posicion += 1
+                continue
+            hijo = clave[:largo + 1]
+            fin_hijo = bisect.bisect_right(self.claves, hijo + _FIN_PREFIJO, posicion, fin)
+            candidatos.update(self._precalcular(hijo, posicion, fin_hijo))
+            posicion = fin_hijo
+        ranking = heapq.nlargest(LIMITE, candidatos, key=self._puntaje)
+        if prefijo:
+            self.fijos[prefijo] = (LIMITE, ranking)
+        return ranking
+
+    def _rankear(self, prefijo, limite):
+        inicio = bisect.bisect_left(self.claves, prefijo)
+        fin = bisect.bisect_right(self.claves, prefijo + _FIN_PREFIJO, lo=inicio)
+        ranking = heapq.nlargest(limite, set(self.nombres[inicio:fin]), key=self._puntaje)
+        self.rankings[prefijo] = (limite, ranking)
+        if len(self.rankings) > MAX_PREFIJOS:
+            self.rankings.popitem(last=False)
+        return ranking
+
+    def buscar(self, termino, limite):
+        prefijo = normalizar(termino)
+        if not prefijo:
+            return []
+        memorizado = self.fijos.get(prefijo)
+        if memorizado is None:
+            memorizado = self.rankings.get(prefijo)
+            if memorizado is not None:
+                self.rankings.move_to_end(prefijo)
+        if memorizado is not None and memorizado[0] >= limite:
+            ranking = memorizado[1]
+        else:
+            ranking = self._rankear(prefijo, limite)
+        return [self.articulos[nombre].como_dict() for nombre in ranking[:limite]]
+
+    def _corregir_rankings(self, nombre, subio):
+        # Sólo los prefijos de alguna clave de esta descripción pueden haber cambiado
+        prefijos = {clave[:largo] for clave in _claves(nombre) for largo in range(1, len(clave) + 1)}
+        for memorizados in (self.fijos, self.rankings):
+            for prefijo in prefijos:
+                memorizado = memorizados.get(prefijo)
+                if memorizado is None:
+                    continue
+                limite, ranking = memorizado
+                if not subio:
+                    # Si bajó una de las primeras, no sabemos cuál la reemplaza
+                    if nombre in ranking:
+                        del memorizados[prefijo]
+                    continue
+                if nombre not in ranking:
+                    ranking.append(nombre)
+                ranking.sort(key=self._puntaje, reverse=True)
+                del ranking[limite:]
+
+    def sumar(self, descripcion, precio):
+        nombre = normalizar(descripcion)
+        if not nombre:
+            return 0
+        nuevas = 0
+        articulo = self.articulos.get(nombre)
+        if articulo is None:
+            articulo = self.articulos[nombre] = _Articulo(descripcion)
+            for clave in _claves(nombre):
+                posicion = bisect.bisect_left(self.claves, clave)
+                self.claves.insert(posicion, clave)
+                self.nombres.insert(posicion, nombre)
+            nuevas = 1
+        self.reloj += 1
+        articulo.usos += 1
+        articulo.total += float(precio)
+        articulo.ultimo_precio = float(precio)
+        articulo.reciente = self.reloj
+        articulo.descripcion = descripcion
+        self._corregir_rankings(nombre, subio=True)
+        return nuevas
+
+    def restar(self, descripcion, precio):
+        # El último precio se conserva: es el último que el usuario escribió
+        nombre = normalizar(descripcion)
+        articulo = self.articulos.get(nombre)
+        if articulo is None:
+            return 0
+        articulo.usos -= 1
+        articulo.total -= float(precio)
+        self._corregir_rankings(nombre, subio=False)
+        if articulo.usos > 0:
+            return 0
+        del self.articulos[nombre]
+        for clave in _claves(nombre):
+            posicion = bisect.bisect_left(self.claves, clave)
+            while self.nombres[posicion] != nombre:
+                posicion += 1
+            del self.claves[posicion]
+            del self.nombres[posicion]
+        return -1
+
+
+class CatalogoItems:
+    """Caché LRU de catálogos por usuario, segura para los hilos de waitress."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._catalogos = OrderedDict()
+        self._entradas = 0
+        # Sólo de los usuarios con alguna carga en curso: user_id -> [generación, cargas]
+        self._cargas = {}
+        # Guardados entre iniciar_cambio() y registrar() (o cancelar_cambio()), por usuario
+        self._en_curso = {}
+        self._lock = threading.Lock()
+
+    def buscar(self, user_id, termino, cargar, limite=LIMITE):
+        """Descripciones que empiezan por `termino` (o alguna de sus palabras), por frecuencia.
+
+        `cargar(user_id)` devuelve las filas de CONSULTA_CARGA si el catálogo no está en memoria.
+        """
+        with self._lock:
+            catalogo = self._catalogos.get(user_id)
+            if catalogo is not None:
+                self._catalogos.move_to_end(user_id)
+                return catalogo.buscar(termino, limite)
+            carga = self._cargas.setdefault(user_id, [0, 0])
+            carga[1] += 1
+            generacion = carga[0]
+
+        try:
+            catalogo = _CatalogoUsuario(cargar(user_id))
+        except Exception:
+            with self._lock:
+                self._terminar_carga(user_id)
+            raise
+        with self._lock:
+            self._guardar(user_id, catalogo, generacion)
+            return catalogo.buscar(termino, limite)
+
+    def iniciar_cambio(self, user_id):
+        """Avisa de un guardado que cambia líneas del usuario. Llamar antes del commit.
+
+        Hasta que se llame a registrar() o a cancelar_cambio() no se conserva ninguna
+        carga del catálogo de ese usuario.
+        """
+        with self._lock:
+            self._en_curso[user_id] = self._en_curso.get(user_id, 0) + 1
+            self._avanzar_generacion(user_id)
+
+    def cancelar_cambio(self, user_id):
+        """El commit avisado con iniciar_cambio() falló: no hay líneas que aplicar."""
+        with self._lock:
+            self._terminar_cambio(user_id)
+
+    def registrar(self, user_id, agregados=(), quitados=()):
+        """Aplica los items (descripción, precio) guardados y eliminados por el usuario.
+
+        Si su catálogo no está en memoria no hay nada que hacer: se cargará con estos
+        cambios ya incluidos. Llamar después del commit; cierra el iniciar_cambio() de
+        ese guardado. None en lugar de una lista indica líneas que no se leyeron de la
+        base porque el catálogo no estaba cargado; si entretanto otra petición lo cargó,
+        no se puede corregir y se descarta.
+        """
+        with self._lock:
+            self._terminar_cambio(user_id)
+            # Una carga que esté en curso ya no incluye estos cambios: se descarta
+            self._avanzar_generacion(user_id)
+            catalogo = self._catalogos.get(user_id)
+            if catalogo is None:
+                return
+            if agregados is None or quitados is None:
+                del self._catalogos[user_id]
+                self._entradas -= len(catalogo)
+                return
+            for descripcion, precio in quitados:
+                self._entradas += catalogo.restar(descripcion, precio)
+            for descripcion, precio in agregados:
+                self._entradas += catalogo.sumar(descripcion, precio)
+
+    def cargado(self, user_id):
+        """Si vale la pena leer los items que se van a eliminar para descontarlos."""
+        with self._lock:
+            return user_id in self._catalogos
+
+    def invalidar(self, user_id):
+        with self._lock:
+            self._avanzar_generacion(user_id)
+            catalogo = self._catalogos.pop(user_id, None)
+            if catalogo is not None:
+                self._entradas -= len(catalogo)
+
+    def _avanzar_generacion(self, user_id):
+        # Sin cargas en curso no hay nada que descartar
+        carga = self._cargas.get(user_id)
+        if carga is not None:
+            carga[0] += 1
+
+    def _terminar_carga(self, user_id):
+        carga = self._cargas[user_id]
+        carga[1] -= 1
+        if not carga[1]:
+            del self._cargas[user_id]
+
+    def _terminar_cambio(self, user_id):
+        pendientes = self._en_curso.get(user_id, 0) - 1
+        if pendientes > 0:
+            self._en_curso[user_id] = pendientes
+        else:
+            self._en_curso.pop(user_id, None)
+
+    def _guardar(self, user_id, catalogo, generacion):
+        # Si hubo cambios mientras cargábamos, o hay un guardado entre su commit y su
+        # registrar(), el catálogo puede no coincidir con lo que se le va a aplicar
+        vigente = self._cargas[user_id][0] == generacion
+        self._terminar_carga(user_id)
+        if not vigente or self._en_curso.get(user_id):
+            return
+        anterior = self._catalogos.pop(user_id, None)
+        if anterior is not None:
+            self._entradas -= len(anterior)
+        self._catalogos[user_id] = catalogo
+        self._entradas += len(catalogo)
+        while self._entradas > self.max_entradas and len(self._catalogos) > 1:
+            _, descartado = self._catalogos.popitem(last=False)
+            self._entradas -= len(descartado)
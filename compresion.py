@@ -0,0 +1,118 @@
+# compresion.py
+# Compresión de las respuestas (gzip y, si está instalado el paquete brotli, br).
+#
+# Se comprimen sólo los tipos de texto (JSON, HTML, CSS, JS, CSV) que superan
+# COMPRESS_MIN_BYTES: por debajo de ~1 KB las cabeceras pesan más que el ahorro.
+# Los PDF, ZIP y XLSX ya vienen comprimidos y se envían tal cual, igual que las
+# respuestas por partes (exportaciones), que se entregan a medida que se generan.
+#
+# Los archivos estáticos (send_file) se comprimen una sola vez y se guardan en
+# memoria por su ETag. Al comprimir, el ETag pasa a ser débil (W/"..."): el
+# contenido en bytes ya no es el mismo, pero el recurso sí, y los If-None-Match
+# se siguen comparando en forma débil.
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TIPOS_COMPRIMIBLES = {
+    'application/json', 'application/javascript', 'text/javascript', 'text/html',
+    'text/css', 'text/plain', 'text/csv', 'image/svg+xml',
+}
+# Archivos de /static comprimidos que se conservan (son pocos y pequeños)
+MAX_ESTATICOS = 64
+MAX_BYTES_ESTATICO = 1024 * 1024
+
+
+class Compresion:
+    """Extensión de Flask que comprime las respuestas de texto según Accept-Encoding."""
+
+    def __init__(self, app=None):
+        self._estaticos = OrderedDict()  # (etag, codificación) -> bytes comprimidos
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_bytes = app.config.get('COMPRESS_MIN_BYTES', 1024)
+        self.nivel_gzip = app.config.get('COMPRESS_GZIP_LEVEL', 6)
+        self.calidad_br = app.config.get('COMPRESS_BR_QUALITY', 5)
+        app.after_request(self._comprimir)
+
+    def elegir_codificacion(self, accept_encodings):
+        """'br', 'gzip' o None según lo que acepta el cliente (y lo que tenemos)."""
+        calidad_gzip = accept_encodings['gzip']
+        calidad_br = accept_encodings['br'] if brotli is not None else 0
+        if calidad_br and calidad_br >= calidad_gzip:
+            return 'br'
+        if calidad_gzip:
+            return 'gzip'
+        return None
+
+    def comprimir(self, datos, codificacion):
+        if codificacion == 'br':
+            return brotli.compress(datos, quality=self.calidad_br)
+        return gzip.compress(datos, compresslevel=self.nivel_gzip, mtime=0)
+
+    def _comprimir(self, response):
+        if (response.status_code != 200 or response.is_streamed and not response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in TIPOS_COMPRIMIBLES):
+            return response
+        # Varía según Accept-Encoding aunque esta vez no se comprima
+        response.vary.add('Accept-Encoding')
+        codificacion = self.elegir_codificacion(request.accept_encodings)
+        if codificacion is None:
+            return response
+        largo = response.content_length
+        if largo is not None and largo < self.min_bytes:
+            return response
+
+        if response.direct_passthrough:
+            # send_file fuera de /static (descargas de trabajos): se envía tal cual
+            if request.endpoint != 'static':
+                return response
+            comprimido = self._estatico(response, codificacion)
+            if comprimido is None:
+                return response
+        else:
+            datos = response.get_data()
+            if len(datos) < self.min_bytes:
+                return response
+            comprimido = self.comprimir(datos, codificacion)
+
+        response.set_data(comprimido)
+        response.headers['Content-Encoding'] = codificacion
+        etag, debil = response.get_etag()
+        if etag and not debil:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _estatico(self, response, codificacion):
+        """Archivo de send_file: se comprime una vez por versión (ETag) del archivo."""
+        etag, _ = response.get_etag()
+        if not etag or (response.content_length or 0) > MAX_BYTES_ESTATICO:
+            return None
+        clave = (etag, codificacion)
+        with self._lock:
+            comprimido = self._estaticos.get(clave)
+            if comprimido is not None:
+                self._estaticos.move_to_end(clave)
+        archivo = response.response
+        response.direct_passthrough = False
+        if comprimido is None:
+            comprimido = self.comprimir(response.get_data(), codificacion)
+            with self._lock:
+                self._estaticos[clave] = comprimido
+                while len(self._estaticos) > MAX_ESTATICOS:
+                    self._estaticos.popitem(last=False)
+        # El archivo que abrió send_file ya no se va a enviar
+        if hasattr(archivo, 'close'):
+            archivo.close()
+        return comprimido
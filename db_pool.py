@@ -0,0 +1,269 @@
+# db_pool.py
+# Pool de conexiones MySQL compartido por los hilos del servidor.
+#
+# Reemplaza a flask_mysqldb, que abría una conexión nueva en cada petición (y a
+# los mysql.connection.ping() repartidos por las rutas). Las conexiones se
+# reutilizan; sólo se comprueban con ping() al sacarlas del pool si llevaban
+# un rato sin usarse, y se renuevan al superar su tiempo de vida máximo. Al
+# devolverlas se hace rollback sólo si quedó una transacción abierta.
+#
+# Los cursores avisan a los observadores registrados (métricas, perfilador)
+# tras cada consulta, con el SQL y su duración.
+import functools
+import threading
+import time
+from collections import deque
+
+import MySQLdb
+import MySQLdb.connections
+import MySQLdb.cursors
+from flask import g
+
+
+class PoolAgotado(Exception):
+    """No se liberó ninguna conexión dentro del tiempo de espera."""
+
+
+class _Conexion:
+    __slots__ = ('conn', 'creada', 'ultimo_uso')
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.creada = self.ultimo_uso = time.monotonic()
+
+
+class _CursorObservado:
+    """Mezcla para las clases de cursor: avisa a los observadores tras cada consulta."""
+    _observadores = ()
+    _en_lote = False
+
+    def execute(self, query, args=None):
+        if self._en_lote:
+            # executemany llama a execute por cada fila si no puede agrupar el INSERT
+            return super().execute(query, args)
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            self._avisar(query, args, time.perf_counter() - inicio)
+
+    def executemany(self, query, args):
+        inicio = time.perf_counter()
+        self._en_lote = True
+        try:
+            return super().executemany(query, args)
+        finally:
+            self._en_lote = False
+            self._avisar(query, args, time.perf_counter() - inicio)
+
+    def _avisar(self, query, args, duracion):
+        for observador in self._observadores:
+            observador(self, query, args, duracion)
+
+
+@functools.lru_cache(maxsize=None)
+def _clase_observada(clase):
+    return type(f"{clase.__name__}Observado", (_CursorObservado, clase), {})
+
+
+class ConexionObservada(MySQLdb.connections.Connection):
+    """Conexión cuyos cursores (de cualquier clase) pasan por los observadores del pool.
+
+    También recuerda si se ejecutó algo desde el último commit o rollback, para que
+    el pool sólo haga rollback al recibirla si quedó una transacción abierta.
+    """
+    observadores = ()
+    transaccion_abierta = False
+
+    def query(self, query):
+        # Todos los cursores ejecutan sus sentencias a través de query()
+        self.transaccion_abierta = True
+        return super().query(query)
+
+    def commit(self):
+        super().commit()
+        self.transaccion_abierta = False
+
+    def rollback(self):
+        super().rollback()
+        self.transaccion_abierta = False
+
+    def cursor(self, cursorclass=None):
+        if not self.observadores:
+            return super().cursor(cursorclass)
+        cur = super().cursor(_clase_observada(cursorclass or self.cursorclass))
+        cur._observadores = self.observadores
+        return cur
+
+
+class ConnectionPool:
+    def __init__(self, crear_conexion, tamano=10, tiempo_espera=10, max_inactividad=60, max_vida=3600):
+        self.crear_conexion = crear_conexion
+        self.tamano = tamano
+        self.tiempo_espera = tiempo_espera
+        self.max_inactividad = max_inactividad
+        self.max_vida = max_vida
+        self._libres = deque()
+        self._abiertas = 0
+        self._condicion = threading.Condition()
+        # Métricas
+        self._prestamos = 0
+        self._espera_total = 0.0
+        self._espera_maxima = 0.0
+        self._agotados = 0
+        self._creadas = 0
+        self._descartadas = 0
+
+    def obtener(self):
+        """Presta una conexión sana; espera si todas están en uso."""
+        inicio = time.monotonic()
+        with self._condicion:
+            while not self._libres and self._abiertas >= self.tamano:
+                restante = self.tiempo_espera - (time.monotonic() - inicio)
+                if restante <= 0:
+                    self._agotados += 1
+                    raise PoolAgotado(f"No hay conexiones libres tras {self.tiempo_espera}s")
+                self._condicion.wait(restante)
+            entrada = self._libres.pop() if self._libres else None
+            if entrada is None:
+                # Reservamos el hueco antes de conectar, fuera del lock
+                self._abiertas += 1
+            espera = time.monotonic() - inicio
+            self._prestamos += 1
+            self._espera_total += espera
+            self._espera_maxima = max(self._espera_maxima, espera)
+
+        try:
+            if entrada is not None:
+                entrada = self._revisar(entrada)
+            if entrada is None:
+                entrada = _Conexion(self.crear_conexion())
+                with self._condicion:
+                    self._creadas += 1
+        except Exception:
+            self._liberar_hueco()
+            raise
+        return entrada
+
+    def devolver(self, entrada, descartar=False):
+        # Sólo se cierra la transacción que la petición haya dejado abierta: tras un
+        # commit, o sin haber consultado nada, el rollback sería un viaje de más
+        if not descartar and getattr(entrada.conn, 'transaccion_abierta', True):
+            try:
+                entrada.conn.rollback()
+            except MySQLdb.Error:
+                descartar = True
+        if descartar:
+            self._cerrar(entrada)
+            self._liberar_hueco()
+            return
+        entrada.ultimo_uso = time.monotonic()
+        with self._condicion:
+            self._libres.append(entrada)
+            self._condicion.notify()
+
+    def metricas(self):
+        with self._condicion:
+            return {
+                'tamano': self.tamano,
+                'abiertas': self._abiertas,
+                'libres': len(self._libres),
+                'en_uso': self._abiertas - len(self._libres),
+                'prestamos': self._prestamos,
+                'espera_total_s': round(self._espera_total, 6),
+                'espera_media_s': round(self._espera_total / self._prestamos, 6) if self._prestamos else 0.0,
+                'espera_maxima_s': round(self._espera_maxima, 6),
+                'agotados': self._agotados,
+                'creadas': self._creadas,
+                'descartadas': self._descartadas,
+            }
+
+    def _revisar(self, entrada):
+        """Devuelve la conexión si sigue sirviendo, o None si hubo que cerrarla."""
+        ahora = time.monotonic()
+        if ahora - entrada.creada > self.max_vida:
+            self._cerrar(entrada)
+            return None
+        if ahora - entrada.ultimo_uso > self.max_inactividad:
+            try:
+                entrada.conn.ping()
+            except MySQLdb.Error:
+                self._cerrar(entrada)
+                return None
+        return entrada
+
+    def _cerrar(self, entrada):
+        try:
+            entrada.conn.close()
+        except MySQLdb.Error:
+            pass
+        with self._condicion:
+            self._descartadas += 1
+
+    def _liberar_hueco(self):
+        with self._condicion:
+            self._abiertas -= 1
+            self._condicion.notify()
+
+
+class MySQLPool:
+    """Extensión de Flask con la misma interfaz que flask_mysqldb: `mysql.connection`.
+
+    La conexión se toma del pool la primera vez que una petición la usa y se
+    devuelve automáticamente al terminar el contexto de la aplicación.
+    """
+
+    def __init__(self, app=None):
+        self.pool = None
+        # Funciones observador(cursor, consulta, parámetros, duración) llamadas tras cada consulta
+        self.observadores = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+
+        def crear_conexion():
+            conn = ConexionObservada(
+                host=config['MYSQL_HOST'],
+                user=config['MYSQL_USER'],
+                passwd=config['MYSQL_PASSWORD'],
+                db=config['MYSQL_DB'],
+                charset=config.get('MYSQL_CHARSET', 'utf8mb4'),
+                cursorclass=getattr(MySQLdb.cursors, config.get('MYSQL_CURSORCLASS', 'Cursor')),
+            )
+            # La misma lista: los observadores añadidos después también se aplican
+            conn.observadores = self.observadores
+            return conn
+
+        self.pool = ConnectionPool(
+            crear_conexion,
+            tamano=config.get('MYSQL_POOL_SIZE', 10),
+            tiempo_espera=config.get('MYSQL_POOL_TIMEOUT', 10),
+            max_inactividad=config.get('MYSQL_POOL_MAX_IDLE', 60),
+            max_vida=config.get('MYSQL_POOL_MAX_LIFETIME', 3600),
+        )
+        app.teardown_appcontext(self.teardown)
+
+    @property
+    def connection(self):
+        entrada = g.get('_mysql_pool_conexion')
+        if entrada is None:
+            entrada = self.pool.obtener()
+            g._mysql_pool_conexion = entrada
+        return entrada.conn
+
+    def agregar_observador(self, observador):
+        self.observadores.append(observador)
+
+    def descartar_conexion(self):
+        """Cierra (sin devolverla al pool) la conexión que tenga prestada la petición actual."""
+        entrada = g.pop('_mysql_pool_conexion', None)
+        if entrada is not None:
+            self.pool.devolver(entrada, descartar=True)
+
+    def teardown(self, exception):
+        entrada = g.pop('_mysql_pool_conexion', None)
+        if entrada is not None:
+            # Si la petición falló por un error de MySQL, la conexión puede haber quedado inservible
+            self.pool.devolver(entrada, descartar=isinstance(exception, MySQLdb.OperationalError))
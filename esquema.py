@@ -0,0 +1,246 @@
+# esquema.py
+# Esquema de la base de datos y sus migraciones versionadas.
+#
+# Cada migración tiene un número y se aplica una sola vez: la tabla
+# `schema_version` guarda las ya aplicadas. Las migraciones están escritas para
+# poder ejecutarse sobre una base que ya tenga parte de los cambios (las bases
+# creadas antes de este módulo tienen las tablas, pero no sus índices), así que
+# el primer arranque sobre una base existente simplemente la pone al día.
+#
+# Para cambiar el esquema se añade una migración nueva al final de MIGRACIONES;
+# nunca se modifica una ya publicada.
+import analitica
+import busqueda
+import estadisticas
+import secuencias
+import trabajos
+
+# Bloqueo con nombre de MySQL: si arrancan varios procesos a la vez, migra uno solo
+BLOQUEO_MIGRACIONES = 'ledesma_led_migraciones'
+
+CREATE_SCHEMA_VERSION = """
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT NOT NULL PRIMARY KEY,
+        descripcion VARCHAR(255) NOT NULL,
+        aplicada DATETIME NOT NULL
+    ) ENGINE=InnoDB
+"""
+
+TABLAS_BASE = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        fullname VARCHAR(100) NOT NULL,
+        username VARCHAR(50) NOT NULL UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(20) NOT NULL DEFAULT 'user'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    """CREATE TABLE IF NOT EXISTS proformas (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        cotizacion_nro VARCHAR(50) NOT NULL,
+        fecha DATE NOT NULL,
+        cliente VARCHAR(255) NOT NULL,
+        incluye_igv BOOLEAN NOT NULL DEFAULT TRUE,
+        monto_total DECIMAL(12, 2) NOT NULL DEFAULT 0,
+        status ENUM('Enviada', 'Aprobada', 'Rechazada') NOT NULL DEFAULT 'Enviada'
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    """CREATE TABLE IF NOT EXISTS proforma_items (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        proforma_id INT NOT NULL,
+        item_descripcion VARCHAR(255) NOT NULL,
+        cantidad INT NOT NULL,
+        precio_unitario DECIMAL(12, 2) NOT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+    """CREATE TABLE IF NOT EXISTS clientes (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        user_id INT NOT NULL,
+        nombre VARCHAR(255) NOT NULL,
+        ruc_dni VARCHAR(20),
+        direccion VARCHAR(255),
+        telefono VARCHAR(20),
+        email VARCHAR(100)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4""",
+]
+
+# Ids de los clientes eliminados, para que la sincronización (?since=) los quite
+CREATE_TABLE_CLIENTES_ELIMINADOS = """
+    CREATE TABLE IF NOT EXISTS clientes_eliminados (
+        cliente_id INT NOT NULL PRIMARY KEY,
+        user_id INT NOT NULL,
+        eliminado DATETIME(6) NOT NULL,
+        INDEX idx_eliminados_user (user_id, eliminado)
+    ) ENGINE=InnoDB
+"""
+
+
+# --- AUXILIARES (MySQL no soporta ADD COLUMN / ADD INDEX IF NOT EXISTS) ---
+
+def asegurar_columna(cur, tabla, columna, definicion):
+    """Añade la columna si todavía no existe."""
+    cur.execute(
+        "SELECT 1 FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (tabla, columna)
+    )
+    if not cur.fetchone():
+        cur.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+def asegurar_indice(cur, tabla, nombre, columnas):
+    """Crea el índice si no hay ninguno con ese nombre."""
+    cur.execute(
+        "SELECT 1 FROM information_schema.STATISTICS WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s",
+        (tabla, nombre)
+    )
+    if not cur.fetchone():
+        cur.execute(f"ALTER TABLE {tabla} ADD INDEX {nombre} ({columnas})")
+
+
+# --- MIGRACIONES ---
+
+def _tablas_base(cur):
+    for ddl in TABLAS_BASE:
+        cur.execute(ddl)
+
+
+def _columna_version(cur):
+    # Versión de cada proforma, para detectar ediciones simultáneas
+    asegurar_columna(cur, 'proformas', 'version', "INT NOT NULL DEFAULT 1")
+
+
+def _indices_compuestos(cur):
+    # Lista, cursor y conteo por usuario en orden de id (sin filesort)
+    asegurar_indice(cur, 'proformas', 'idx_proformas_user_id', 'user_id, id')
+    # Exportación y estadísticas por rango de fechas
+    asegurar_indice(cur, 'proformas', 'idx_proformas_user_fecha', 'user_id, fecha')
+    # Items de una o varias proformas, en su orden de inserción
+    asegurar_indice(cur, 'proforma_items', 'idx_items_proforma', 'proforma_id, id')
+    # Lista de clientes ordenada por nombre y carga del índice de autocompletado
+    asegurar_indice(cur, 'clientes', 'idx_clientes_user_nombre', 'user_id, nombre')
+
+
+def _numero_cotizacion(cur):
+    # Copia numérica del número de cotización (NULL si se escribió algo no numérico),
+    # calculada por MySQL: MAX() por usuario sale del índice en lugar de un CAST fila a fila
+    asegurar_columna(
+        cur, 'proformas', 'cotizacion_num',
+        "INT UNSIGNED AS (IF(cotizacion_nro REGEXP '^[0-9]{1,9}$', CAST(cotizacion_nro AS UNSIGNED), NULL)) STORED"
+    )
+    asegurar_indice(cur, 'proformas', 'idx_proformas_user_num', 'user_id, cotizacion_num')
+
+
+def _items_en_cascada(cur):
+    # Los items de proformas ya eliminadas impedirían crear la clave foránea
+    cur.execute("""
+        DELETE pi FROM proforma_items pi
+        LEFT JOIN proformas p ON p.id = pi.proforma_id
+        WHERE p.id IS NULL
+    """)
+    cur.execute("""
+        SELECT rc.CONSTRAINT_NAME AS nombre, rc.DELETE_RULE AS regla
+        FROM information_schema.REFERENTIAL_CONSTRAINTS rc
+        JOIN information_schema.KEY_COLUMN_USAGE k
+          ON k.CONSTRAINT_SCHEMA = rc.CONSTRAINT_SCHEMA AND k.CONSTRAINT_NAME = rc.CONSTRAINT_NAME
+         AND k.TABLE_NAME = rc.TABLE_NAME
+        WHERE rc.CONSTRAINT_SCHEMA = DATABASE() AND rc.TABLE_NAME = 'proforma_items'
+          AND k.COLUMN_NAME = 'proforma_id'
+    """)
+    existentes = cur.fetchall()
+    if any(fila['regla'] == 'CASCADE' for fila in existentes):
+        return
+    for fila in existentes:
+        cur.execute(f"ALTER TABLE proforma_items DROP FOREIGN KEY {fila['nombre']}")
+    cur.execute("""
+        ALTER TABLE proforma_items ADD CONSTRAINT fk_items_proforma
+        FOREIGN KEY (proforma_id) REFERENCES proformas (id) ON DELETE CASCADE
+    """)
+
+
+def _tabla_busqueda(cur):
+    # Índice FULLTEXT de las proformas (se llena la primera vez)
+    busqueda.crear_tabla_busqueda(cur)
+
+
+def _tablas_estadisticas(cur):
+    # Resumen por usuario para el dashboard (se calcula la primera vez)
+    estadisticas.crear_tablas_estadisticas(cur)
+
+
+def _tabla_secuencias(cur):
+    # Secuencia de números de cotización por usuario (se completa con los ya usados)
+    secuencias.crear_tabla_secuencias(cur)
+
+
+def _tabla_trabajos(cur):
+    # Cola de trabajos en segundo plano (exportaciones pesadas)
+    cur.execute(trabajos.CREATE_TABLE_TRABAJOS)
+
+
+def _sincronizacion_clientes(cur):
+    # Última modificación de cada cliente (la mantiene MySQL) y registro de eliminados
+    asegurar_columna(
+        cur, 'clientes', 'updated_at',
+        "DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)"
+    )
+    asegurar_indice(cur, 'clientes', 'idx_clientes_user_updated', 'user_id, updated_at')
+    cur.execute(CREATE_TABLE_CLIENTES_ELIMINADOS)
+
+
+def _latido_trabajos(cur):
+    # Proceso que ejecuta cada trabajo y su último latido, para no esperar al TTL si muere
+    asegurar_columna(cur, 'trabajos', 'proceso', "VARCHAR(100) NULL")
+    asegurar_columna(cur, 'trabajos', 'latido', "DATETIME NULL")
+    asegurar_indice(cur, 'trabajos', 'idx_trabajos_latido', 'estado, latido')
+
+
+def _analitica_diaria(cur):
+    # Resumen diario por cliente, estado e IGV para los informes (se calcula la primera vez)
+    analitica.crear_tablas_analitica(cur)
+
+
+MIGRACIONES = [
+    (1, 'Tablas base: users, proformas, proforma_items, clientes', _tablas_base),
+    (2, 'Columna version en proformas', _columna_version),
+    (3, 'Índices compuestos para las consultas frecuentes', _indices_compuestos),
+    (4, 'Número de cotización numérico e indexado', _numero_cotizacion),
+    (5, 'Items eliminados en cascada con su proforma', _items_en_cascada),
+    (6, 'Tabla de búsqueda FULLTEXT', _tabla_busqueda),
+    (7, 'Tablas de estadísticas', _tablas_estadisticas),
+    (8, 'Secuencias de números de cotización', _tabla_secuencias),
+    (9, 'Cola de trabajos', _tabla_trabajos),
+    (10, 'Sincronización incremental de clientes', _sincronizacion_clientes),
+    (11, 'Resumen diario para la analítica', _analitica_diaria),
+    (12, 'Latido de los trabajos en curso', _latido_trabajos),
+]
+
+# Hasta aquí sólo hay tablas de datos; lo siguiente se calcula a partir de ellas
+VERSION_TABLAS_BASE = 5
+
+
+def migrar(cur, hasta=None):
+    """Aplica en orden las migraciones pendientes (hasta la versión `hasta`, si se indica).
+
+    Usa un cursor de diccionarios. Cada migración se confirma por separado (en MySQL
+    los ALTER TABLE confirman la transacción igualmente). Devuelve las versiones aplicadas.
+    """
+    cur.execute(CREATE_SCHEMA_VERSION)
+    cur.execute("SELECT GET_LOCK(%s, 60) AS obtenido", [BLOQUEO_MIGRACIONES])
+    if not cur.fetchone()['obtenido']:
+        raise RuntimeError("Otro proceso lleva más de 60 s aplicando migraciones")
+    try:
+        cur.execute("SELECT version FROM schema_version")
+        aplicadas = {fila['version'] for fila in cur.fetchall()}
+        nuevas = []
+        for version, descripcion, migracion in MIGRACIONES:
+            if version in aplicadas or (hasta is not None and version > hasta):
+                continue
+            migracion(cur)
+            cur.execute(
+                "INSERT INTO schema_version (version, descripcion, aplicada) VALUES (%s, %s, NOW())",
+                (version, descripcion)
+            )
+            cur.connection.commit()
+            nuevas.append(version)
+        return nuevas
+    finally:
+        cur.execute("SELECT RELEASE_LOCK(%s)", [BLOQUEO_MIGRACIONES])
+        cur.fetchall()
@@ -0,0 +1,143 @@
+# estadisticas.py
+# Resumen por usuario para el dashboard, mantenido de forma incremental.
+#
+# En lugar de recorrer todas las proformas en cada carga del dashboard, cada
+# operación que crea, edita, elimina o cambia el estado de una proforma aplica
+# su diferencia (+1 / -1, monto nuevo - monto anterior, ...) sobre dos tablas
+# pequeñas, dentro de la misma transacción que la propia operación:
+#
+#   user_stats          una fila por usuario: cantidad, monto total y cantidad por estado
+#   user_stats_mensual  cantidad de proformas por usuario y mes (AAAA-MM)
+#
+# Los días afectados quedan además pendientes de recalcular en el resumen diario de
+# la analítica (analitica.py), que se recalcula por días en lugar de por diferencias.
+import analitica
+
+# Estado de la proforma -> columna de user_stats
+COLUMNAS_ESTADO = {'Enviada': 'enviadas', 'Aprobada': 'aprobadas', 'Rechazada': 'rechazadas'}
+
+CREATE_USER_STATS = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id INT NOT NULL PRIMARY KEY,
+        total_proformas INT NOT NULL DEFAULT 0,
+        monto_total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        enviadas INT NOT NULL DEFAULT 0,
+        aprobadas INT NOT NULL DEFAULT 0,
+        rechazadas INT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB
+"""
+
+CREATE_USER_STATS_MENSUAL = """
+    CREATE TABLE IF NOT EXISTS user_stats_mensual (
+        user_id INT NOT NULL,
+        mes CHAR(7) NOT NULL,
+        cantidad INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, mes)
+    ) ENGINE=InnoDB
+"""
+
+
+def crear_tablas_estadisticas(cur):
+    """Crea las tablas del resumen y, si están vacías, las calcula desde las proformas."""
+    cur.execute(CREATE_USER_STATS)
+    cur.execute(CREATE_USER_STATS_MENSUAL)
+    cur.execute("SELECT 1 FROM user_stats LIMIT 1")
+    if cur.fetchone():
+        return
+    recalcular(cur)
+
+
+def recalcular(cur, user_id=None):
+    """Reconstruye el resumen desde cero (de todos los usuarios o de uno solo)."""
+    filtro, params = ("WHERE user_id = %s", [user_id]) if user_id is not None else ("", [])
+    cur.execute(f"DELETE FROM user_stats {filtro}", params)
+    cur.execute(f"DELETE FROM user_stats_mensual {filtro}", params)
+    cur.execute(f"""
+        INSERT INTO user_stats (user_id, total_proformas, monto_total, enviadas, aprobadas, rechazadas)
+        SELECT user_id, COUNT(id), COALESCE(SUM(monto_total), 0),
+               SUM(status = 'Enviada'), SUM(status = 'Aprobada'), SUM(status = 'Rechazada')
+        FROM proformas {filtro}
+        GROUP BY user_id
+    """, params)
+    cur.execute(f"""
+        INSERT INTO user_stats_mensual (user_id, mes, cantidad)
+        SELECT user_id, DATE_FORMAT(fecha, '%%Y-%%m') AS mes, COUNT(id)
+        FROM proformas {filtro}
+        GROUP BY user_id, mes
+    """, params)
+
+
+def _mes(fecha):
+    if not fecha:
+        return None
+    # Las fechas llegan como date/datetime desde MySQL o como 'AAAA-MM-DD' desde el formulario
+    return fecha[:7] if isinstance(fecha, str) else fecha.strftime('%Y-%m')
+
+
+def registrar_cambio(cur, user_id, anterior=None, nueva=None):
+    """Aplica al resumen la diferencia entre dos versiones de una proforma.
+
+    `anterior` y `nueva` son diccionarios con 'monto_total', 'fecha' y 'status';
+    se pasa None como `anterior` al crear y como `nueva` al eliminar. Llamar también
+    cuando sólo cambian el cliente o el IGV: los días se marcan para la analítica.
+    """
+    registrar_cambios(cur, user_id, [(anterior, nueva)])
+
+
+def registrar_cambios(cur, user_id, cambios):
+    """Igual que registrar_cambio para varias proformas (pares (anterior, nueva)) a la vez."""
+    deltas = {'total_proformas': 0, 'monto_total': 0.0, 'enviadas': 0, 'aprobadas': 0, 'rechazadas': 0}
+    meses = {}
+    fechas = []
+    for anterior, nueva in cambios:
+        for proforma, signo in ((anterior, -1), (nueva, 1)):
+            if proforma is None:
+                continue
+            deltas['total_proformas'] += signo
+            deltas['monto_total'] += signo * float(proforma.get('monto_total') or 0)
+            columna = COLUMNAS_ESTADO.get(proforma.get('status'))
+            if columna:
+                deltas[columna] += signo
+            mes = _mes(proforma.get('fecha'))
+            if mes:
+                meses[mes] = meses.get(mes, 0) + signo
+            fechas.append(proforma.get('fecha'))
+
+    if any(deltas.values()):
+        cur.execute("""
+            INSERT INTO user_stats (user_id, total_proformas, monto_total, enviadas, aprobadas, rechazadas)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                total_proformas = total_proformas + VALUES(total_proformas),
+                monto_total = monto_total + VALUES(monto_total),
+                enviadas = enviadas + VALUES(enviadas),
+                aprobadas = aprobadas + VALUES(aprobadas),
+                rechazadas = rechazadas + VALUES(rechazadas)
+        """, (user_id, deltas['total_proformas'], round(deltas['monto_total'], 2),
+              deltas['enviadas'], deltas['aprobadas'], deltas['rechazadas']))
+
+    cambios_mes = [(user_id, mes, delta) for mes, delta in meses.items() if delta]
+    if cambios_mes:
+        cur.executemany("""
+            INSERT INTO user_stats_mensual (user_id, mes, cantidad) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE cantidad = cantidad + VALUES(cantidad)
+        """, cambios_mes)
+
+    analitica.marcar_dias(cur, user_id, fechas)
+
+
+def obtener_resumen(cur, user_id):
+    cur.execute("SELECT * FROM user_stats WHERE user_id = %s", [user_id])
+    resumen = cur.fetchone()
+    if not resumen:
+        return {'total_proformas': 0, 'monto_total': 0, 'enviadas': 0, 'aprobadas': 0, 'rechazadas': 0}
+    return resumen
+
+
+def obtener_meses(cur, user_id, desde_mes):
+    """Cantidad de proformas por mes a partir de `desde_mes` (AAAA-MM), en orden."""
+    cur.execute(
+        "SELECT mes, cantidad FROM user_stats_mensual WHERE user_id = %s AND mes >= %s AND cantidad > 0 ORDER BY mes ASC",
+        (user_id, desde_mes)
+    )
+    return cur.fetchall()
@@ -0,0 +1,73 @@
+# exportacion.py
+# Exportación de proformas a Excel o CSV con memoria constante.
+#
+# Las filas se leen de un cursor del lado del servidor en bloques y se escriben a
+# medida que llegan: en CSV cada bloque se envía directamente al navegador; en
+# Excel se usa el modo write-only de openpyxl (que vuelca las filas a un archivo
+# temporal) y el .xlsx resultante se envía por partes desde disco.
+import csv
+import io
+import tempfile
+
+from openpyxl import Workbook
+
+TAMANO_BLOQUE = 500
+TAMANO_TROZO = 64 * 1024
+
+COLUMNAS = ['Nro Proforma', 'Fecha', 'Cliente', 'Estado', 'Item', 'Cantidad',
+            'Precio Unitario', 'Monto Total Proforma', 'Incluye IGV']
+
+
+def _fila(row):
+    return [
+        row['cotizacion_nro'],
+        row['fecha'].strftime('%Y-%m-%d') if row['fecha'] else '',
+        row['cliente'],
+        row['status'],
+        row['item_descripcion'],
+        row['cantidad'],
+        row['precio_unitario'],
+        row['monto_total'],
+        'Sí' if row['incluye_igv'] else 'No',
+    ]
+
+
+def bloques_de_filas(cur, primer_bloque):
+    """Recorre el cursor en bloques de TAMANO_BLOQUE, empezando por uno ya leído."""
+    bloque = primer_bloque
+    while bloque:
+        yield [_fila(row) for row in bloque]
+        bloque = cur.fetchmany(TAMANO_BLOQUE)
+
+
+def generar_csv(bloques):
+    # El BOM hace que Excel reconozca el archivo como UTF-8 (tildes y ñ)
+    yield '\ufeff'.encode('utf-8')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNAS)
+    for bloque in bloques:
+        writer.writerows(bloque)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generar_xlsx(bloques):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Proformas')
+    ws.append(COLUMNAS)
+    for bloque in bloques:
+        for fila in bloque:
+            ws.append(fila)
+
+    with tempfile.TemporaryFile() as archivo:
+        wb.save(archivo)
+        archivo.seek(0)
+        while True:
+            trozo = archivo.read(TAMANO_TROZO)
+            if not trozo:
+                break
+            yield trozo
@@ -0,0 +1,55 @@
+# gunicorn.conf.py
+# Modo multiproceso: `gunicorn -c gunicorn.conf.py app:app` (Linux). En Windows, sin
+# fork, se sigue sirviendo con un solo proceso: `waitress-serve --port=8000 app:app`.
+#
+# Los PDF, la analítica con pandas y el armado de JSON son Python puro, así que un
+# solo proceso de waitress usa un núcleo por el GIL. Aquí hay un worker por núcleo,
+# cada uno con unos pocos hilos para solapar las esperas a MySQL.
+#
+# Con preload_app la aplicación se importa una vez en el proceso maestro y los
+# workers nacen por fork compartiendo esa memoria; no se abre nada al importar
+# (conexiones, hilos y pools se crean en cada worker al usarse por primera vez).
+# max_requests recicla cada worker tras unas cuantas peticiones, con un margen
+# aleatorio para que no se reinicien todos a la vez.
+#
+# Las cachés en memoria de cada worker se mantienen coherentes con la caché
+# compartida (SHARED_CACHE_PATH, ver cache_compartido.py) y los PDF generados se
+# comparten en disco (PDF_CACHE_DIR). /metrics suma las métricas que cada worker
+# vuelca en METRICS_DIR (ver metricas.py). Todos los valores se pueden cambiar con
+# variables de entorno o con opciones en la línea de comandos.
+import os
+import shutil
+
+_RAIZ = os.path.dirname(os.path.abspath(__file__))
+_INSTANCIA = os.path.join(_RAIZ, 'instance')
+
+# app.py lee estas variables al importarse, y eso ocurre después de cargar este archivo
+os.environ.setdefault('SHARED_CACHE_PATH', os.path.join(_INSTANCIA, 'cache_compartido.sqlite3'))
+os.environ.setdefault('PDF_CACHE_DIR', os.path.join(_INSTANCIA, 'cache_pdf'))
+os.environ.setdefault('METRICS_DIR', os.path.join(_INSTANCIA, 'metricas'))
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+# Una exportación grande o un ZIP de PDFs pueden tardar; lo más pesado va a trabajos
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # Las métricas empiezan de cero con cada arranque del servidor, como en un solo proceso
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def worker_exit(server, worker):
+    # Un worker reciclado (max_requests) o detenido devuelve a la cola los trabajos en
+    # segundo plano que no alcanzó a terminar; los retoma el siguiente worker. Sus
+    # métricas se vuelcan una última vez para que el total no pierda sus últimas peticiones
+    from app import cola_trabajos, metricas
+    cola_trabajos.cerrar()
+    metricas.volcar()
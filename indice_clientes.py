@@ -0,0 +1,125 @@
+# indice_clientes.py
+# Índice en memoria para el autocompletado de clientes.
+#
+# Cada usuario tiene su propio índice: una lista ordenada de claves normalizadas
+# (nombre completo, cada palabra del nombre y el RUC/DNI) en la que se buscan
+# prefijos con bisect. Los índices se cargan la primera vez que se usan, se
+# descartan por LRU cuando superan el presupuesto de memoria y se invalidan
+# cada vez que el usuario crea, edita o elimina un cliente. Fuera de los índices
+# sólo se guarda estado de los usuarios con una carga en curso.
+import bisect
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Presupuesto total de claves en memoria entre todos los usuarios.
+MAX_ENTRADAS = 200000
+# Carácter mayor que cualquier otro, para acotar el rango de un prefijo.
+_FIN_PREFIJO = '\U0010ffff'
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes, para que 'jose' encuentre 'José'."""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower().strip()
+
+
+class _IndiceUsuario:
+    """Claves ordenadas de un usuario, cada una apuntando a la posición de su cliente."""
+
+    def __init__(self, clientes):
+        self.clientes = list(clientes)
+        self.nombres = [normalizar(cliente.get('nombre')) for cliente in self.clientes]
+        pares = set()
+        for pos, cliente in enumerate(self.clientes):
+            nombre = self.nombres[pos]
+            if nombre:
+                pares.add((nombre, pos))
+                for palabra in nombre.split()[1:]:
+                    pares.add((palabra, pos))
+            ruc = normalizar(cliente.get('ruc_dni'))
+            if ruc:
+                pares.add((ruc, pos))
+        pares = sorted(pares)
+        self.claves = [clave for clave, _ in pares]
+        self.posiciones = [pos for _, pos in pares]
+
+    def __len__(self):
+        return len(self.claves)
+
+    def buscar(self, termino, limite):
+        prefijo = normalizar(termino)
+        if not prefijo:
+            return []
+        inicio = bisect.bisect_left(self.claves, prefijo)
+        fin = bisect.bisect_right(self.claves, prefijo + _FIN_PREFIJO, lo=inicio)
+        encontrados = sorted(set(self.posiciones[inicio:fin]), key=self.nombres.__getitem__)
+        return [self.clientes[pos] for pos in encontrados[:limite]]
+
+
+class IndiceClientes:
+    """Caché LRU de índices por usuario, segura para los hilos de waitress."""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self._indices = OrderedDict()
+        self._entradas = 0
+        # Sólo de los usuarios con alguna carga en curso: user_id -> [generación, cargas].
+        # Una invalidación durante la carga cambia la generación y el resultado se descarta.
+        self._cargas = {}
+        self._lock = threading.Lock()
+
+    def buscar(self, user_id, termino, cargar, limite=10):
+        """Busca por prefijo; `cargar(user_id)` devuelve los clientes si no hay índice."""
+        with self._lock:
+            indice = self._indices.get(user_id)
+            if indice is not None:
+                self._indices.move_to_end(user_id)
+            else:
+                carga = self._cargas.setdefault(user_id, [0, 0])
+                carga[1] += 1
+                generacion = carga[0]
+        if indice is not None:
+            return indice.buscar(termino, limite)
+
+        try:
+            indice = _IndiceUsuario(cargar(user_id))
+        except Exception:
+            with self._lock:
+                self._terminar_carga(user_id)
+            raise
+        self._guardar(user_id, indice, generacion)
+        return indice.buscar(termino, limite)
+
+    def invalidar(self, user_id):
+        with self._lock:
+            carga = self._cargas.get(user_id)
+            if carga is not None:
+                carga[0] += 1
+            indice = self._indices.pop(user_id, None)
+            if indice is not None:
+                self._entradas -= len(indice)
+
+    def _terminar_carga(self, user_id):
+        carga = self._cargas[user_id]
+        carga[1] -= 1
+        if not carga[1]:
+            del self._cargas[user_id]
+
+    def _guardar(self, user_id, indice, generacion):
+        with self._lock:
+            vigente = self._cargas[user_id][0] == generacion
+            self._terminar_carga(user_id)
+            # Si hubo una invalidación mientras cargábamos, el índice ya está desactualizado
+            if not vigente:
+                return
+            anterior = self._indices.pop(user_id, None)
+            if anterior is not None:
+                self._entradas -= len(anterior)
+            self._indices[user_id] = indice
+            self._entradas += len(indice)
+            while self._entradas > self.max_entradas and len(self._indices) > 1:
+                _, descartado = self._indices.popitem(last=False)
+                self._entradas -= len(descartado)
@@ -0,0 +1,316 @@
+# metricas.py
+# Métricas de la aplicación en formato de texto de Prometheus, sin dependencias.
+#
+# Por cada petición se mide la latencia (por endpoint, método y código de estado),
+# cuántas consultas SQL ejecutó y cuánto tiempo pasó esperando a MySQL; además se
+# registran el tiempo y tamaño de cada PDF dibujado y las filas de cada exportación.
+# El resumen de la petición se devuelve también en la cabecera Server-Timing, que
+# el navegador muestra en la pestaña de red.
+#
+# Todo se guarda en memoria del proceso (un contador por cubeta del histograma),
+# así que el coste por petición es un par de bisect y sumas bajo un lock.
+#
+# Con varios workers (METRICS_DIR configurado, ver gunicorn.conf.py) cada proceso
+# vuelca sus series a <METRICS_DIR>/<pid>.json cada pocos segundos y al salir, y
+# /metrics suma los archivos de todos: cada raspado ve el total del servidor, sea
+# cual sea el worker que lo atiende. Los archivos de procesos que ya no existen se
+# acumulan en terminados.json, así que los contadores no retroceden al reciclarse
+# un worker.
+import bisect
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from flask import g, has_app_context, request
+
+# Límites de las cubetas, en segundos o en unidades según el histograma
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+LIMITES_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+LIMITES_BYTES = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 5_000_000)
+LIMITES_FILAS = (100, 1_000, 10_000, 100_000, 1_000_000)
+
+# Archivo con la suma de los procesos que ya terminaron, y cerrojo para acumularlos
+TERMINADOS = 'terminados.json'
+CERROJO = '.cerrojo'
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _etiquetas(nombres, valores, extra=''):
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _sumar_series(destino, origen):
+    """Suma en `destino` las series de `origen` (totales o listas de cubetas)."""
+    for valores, dato in origen.items():
+        actual = destino.get(valores)
+        if actual is None:
+            destino[valores] = list(dato) if isinstance(dato, list) else dato
+        elif isinstance(dato, list):
+            destino[valores] = [a + b for a, b in zip(actual, dato)]
+        else:
+            destino[valores] = actual + dato
+
+
+def _proceso_vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Contador:
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def sumar(self, cantidad=1, *valores):
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def copia(self):
+        with self._lock:
+            return dict(self._valores)
+
+    def exposicion(self, series=None):
+        """Líneas de texto; `series` reemplaza a las del proceso (la suma de los workers)."""
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter"]
+        series = sorted((self.copia() if series is None else series).items())
+        for valores, total in series:
+            lineas.append(f"{self.nombre}{_etiquetas(self.etiquetas, valores)} {_numero(total)}")
+        return lineas
+
+
+class Histograma:
+    def __init__(self, nombre, ayuda, etiquetas=(), limites=LIMITES_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.limites = tuple(limites)
+        self._series = {}  # valores de etiquetas -> [cubetas..., +Inf, suma]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, *valores):
+        # Cubeta más baja cuyo límite es >= valor (Prometheus usa le = "menor o igual")
+        indice = bisect.bisect_left(self.limites, valor)
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [0] * (len(self.limites) + 2)
+            serie[indice] += 1
+            serie[-1] += valor
+
+    def copia(self):
+        with self._lock:
+            return {valores: list(serie) for valores, serie in self._series.items()}
+
+    def exposicion(self, series=None):
+        """Líneas de texto; `series` reemplaza a las del proceso (la suma de los workers)."""
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        series = sorted((self.copia() if series is None else series).items())
+        for valores, serie in series:
+            acumulado = 0
+            for limite, cantidad in zip(self.limites + ('+Inf',), serie):
+                acumulado += cantidad
+                le = f'le="{limite}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, valores, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {acumulado}")
+        return lineas
+
+
+class Metricas:
+    """Extensión de Flask que mide cada petición y acumula las métricas del proceso."""
+
+    def __init__(self, app=None):
+        self.latencia = Histograma(
+            'http_request_duration_seconds', 'Tiempo hasta la respuesta (en descargas por partes, hasta el primer byte).',
+            ('endpoint', 'method', 'status'))
+        self.consultas = Histograma(
+            'http_request_db_queries', 'Consultas SQL ejecutadas por petición.', ('endpoint',), LIMITES_CONSULTAS)
+        self.tiempo_db = Histograma(
+            'http_request_db_seconds', 'Tiempo total en MySQL por petición.', ('endpoint',))
+        self.pdf_segundos = Histograma('pdf_render_seconds', 'Tiempo de dibujo de cada PDF.', ('origen',))
+        self.pdf_bytes = Histograma('pdf_render_bytes', 'Tamaño de cada PDF dibujado.', ('origen',), LIMITES_BYTES)
+        self.pdf_cache = Contador('pdf_cache_total', 'Consultas a la caché de PDFs.', ('resultado',))
+        self.filas_exportadas = Contador('export_rows_total', 'Filas escritas en exportaciones.', ('formato',))
+        self.filas_por_exportacion = Histograma(
+            'export_rows', 'Filas de cada exportación.', ('formato',), LIMITES_FILAS)
+        self._todas = [self.latencia, self.consultas, self.tiempo_db, self.pdf_segundos, self.pdf_bytes,
+                       self.pdf_cache, self.filas_exportadas, self.filas_por_exportacion]
+        self.directorio = None
+        self.intervalo_volcado = 5
+        self._ultimo_volcado = 0.0
+        self._volcado_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.directorio = app.config.get('METRICS_DIR')
+        self.intervalo_volcado = app.config.get('METRICS_FLUSH_SECONDS', 5)
+        # Se registra antes que el resto de hooks para medir también su tiempo
+        app.before_request(self._iniciar)
+        app.after_request(self._terminar)
+
+    # --- POR PETICIÓN ---
+
+    def _iniciar(self):
+        g._metricas_inicio = time.perf_counter()
+        g._metricas_db = [0, 0.0]
+        g._metricas_pdf = 0.0
+
+    def _terminar(self, response):
+        inicio = g.get('_metricas_inicio')
+        if inicio is None:
+            return response
+        duracion = time.perf_counter() - inicio
+        endpoint = request.endpoint or 'sin_ruta'
+        consultas, tiempo_db = g._metricas_db
+
+        self.latencia.observar(duracion, endpoint, request.method, str(response.status_code))
+        self.consultas.observar(consultas, endpoint)
+        self.tiempo_db.observar(tiempo_db, endpoint)
+
+        partes = [f'db;dur={tiempo_db * 1000:.1f};desc="{consultas} consultas"']
+        if g._metricas_pdf:
+            partes.append(f'pdf;dur={g._metricas_pdf * 1000:.1f}')
+        partes.append(f'app;dur={duracion * 1000:.1f}')
+        response.headers.add('Server-Timing', ', '.join(partes))
+        if self.directorio and time.monotonic() - self._ultimo_volcado >= self.intervalo_volcado:
+            self.volcar()
+        return response
+
+    def observar_consulta(self, cursor, consulta, parametros, duracion):
+        """Observador del pool de conexiones: suma cada consulta a la petición en curso."""
+        if has_app_context():
+            acumulado = g.get('_metricas_db')
+            if acumulado is not None:
+                acumulado[0] += 1
+                acumulado[1] += duracion
+
+    # --- PDFs Y EXPORTACIONES ---
+
+    def registrar_pdf(self, duracion, tamano, origen='individual'):
+        self.pdf_segundos.observar(duracion, origen)
+        self.pdf_bytes.observar(tamano, origen)
+        if has_app_context() and g.get('_metricas_pdf') is not None:
+            g._metricas_pdf += duracion
+
+    def registrar_cache_pdf(self, acierto):
+        self.pdf_cache.sumar(1, 'acierto' if acierto else 'fallo')
+
+    def contar_filas(self, bloques, formato):
+        """Deja pasar los bloques de una exportación y registra cuántas filas tenía."""
+        filas = 0
+        for bloque in bloques:
+            filas += len(bloque)
+            yield bloque
+        self.filas_exportadas.sumar(filas, formato)
+        self.filas_por_exportacion.observar(filas, formato)
+
+    # --- VARIOS WORKERS ---
+
+    def volcar(self):
+        """Escribe las series de este proceso en <METRICS_DIR>/<pid>.json (sin METRICS_DIR, nada)."""
+        if not self.directorio:
+            return
+        with self._volcado_lock:
+            self._ultimo_volcado = time.monotonic()
+            estado = {m.nombre: [[list(valores), dato] for valores, dato in m.copia().items()]
+                      for m in self._todas}
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+                with os.fdopen(descriptor, 'w') as f:
+                    json.dump(estado, f)
+                os.replace(temporal, os.path.join(self.directorio, f"{os.getpid()}.json"))
+            except OSError as e:
+                print(f"ADVERTENCIA: No se pudieron volcar las métricas: {e}", file=sys.stderr)
+
+    def _leer(self, ruta):
+        try:
+            with open(ruta) as f:
+                estado = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {nombre: {tuple(valores): dato for valores, dato in series} for nombre, series in estado.items()}
+
+    def _sumar_workers(self):
+        """Suma de las series de todos los procesos; acumula en terminados.json las de los que ya no existen."""
+        import fcntl
+        self.volcar()
+        with open(os.path.join(self.directorio, CERROJO), 'a') as cerrojo:
+            # Dos raspados a la vez no deben acumular dos veces el mismo proceso terminado
+            fcntl.flock(cerrojo, fcntl.LOCK_EX)
+            ruta_terminados = os.path.join(self.directorio, TERMINADOS)
+            terminados = self._leer(ruta_terminados)
+            vivos, muertos = [], []
+            for nombre in os.listdir(self.directorio):
+                pid = nombre[:-len('.json')]
+                if nombre.endswith('.json') and pid.isdigit():
+                    (vivos if _proceso_vivo(int(pid)) else muertos).append(os.path.join(self.directorio, nombre))
+            if muertos:
+                for ruta in muertos:
+                    for metrica, series in self._leer(ruta).items():
+                        _sumar_series(terminados.setdefault(metrica, {}), series)
+                estado = {m: [[list(valores), dato] for valores, dato in series.items()]
+                          for m, series in terminados.items()}
+                descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+                with os.fdopen(descriptor, 'w') as f:
+                    json.dump(estado, f)
+                os.replace(temporal, ruta_terminados)
+                for ruta in muertos:
+                    os.remove(ruta)
+        total = {metrica: dict(series) for metrica, series in terminados.items()}
+        for ruta in vivos:
+            for metrica, series in self._leer(ruta).items():
+                _sumar_series(total.setdefault(metrica, {}), series)
+        return total
+
+    # --- EXPOSICIÓN ---
+
+    def exposicion(self, extra=()):
+        """Texto para /metrics; `extra` son líneas ya formateadas (p. ej. del pool).
+
+        Con METRICS_DIR, las series son la suma de todos los workers del servidor.
+        """
+        total = None
+        if self.directorio:
+            try:
+                total = self._sumar_workers()
+            except OSError as e:
+                print(f"ADVERTENCIA: No se pudieron sumar las métricas de los workers: {e}", file=sys.stderr)
+        lineas = []
+        for metrica in self._todas:
+            lineas.extend(metrica.exposicion(None if total is None else total.get(metrica.nombre, {})))
+        lineas.extend(extra)
+        return '\n'.join(lineas) + '\n'
+
+
+def gauges(prefijo, valores, ayuda, etiquetas=None):
+    """Líneas de tipo gauge para un diccionario de valores numéricos."""
+    sufijo = _etiquetas(list(etiquetas), list(etiquetas.values())) if etiquetas else ''
+    lineas = []
+    for clave, valor in valores.items():
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            nombre = f"{prefijo}_{clave}"
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} gauge", f"{nombre}{sufijo} {_numero(valor)}"]
+    return lineas
@@ -0,0 +1,122 @@
+# pdf_lotes.py
+# Exportación masiva de PDFs: se dibujan en un pool de procesos (para no ocupar
+# los hilos de waitress ni pelear por el GIL) y se van escribiendo en un ZIP que
+# se envía al navegador a medida que cada archivo termina.
+import io
+import multiprocessing
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from cache_pdf import clave_pdf
+from pdf_render import renderizar_proforma
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool(max_workers):
+    """Pool de procesos compartido, creado la primera vez que se necesita.
+
+    Se usa 'spawn' para que los procesos hijos no hereden los hilos ni las
+    conexiones abiertas del servidor.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def _renderizar_medido(proforma, items):
+    """Se ejecuta en el proceso hijo: devuelve el PDF y cuánto tardó en dibujarse."""
+    inicio = time.perf_counter()
+    contenido = renderizar_proforma(proforma, items)
+    return contenido, time.perf_counter() - inicio
+
+
+def renderizar_en_pool(proforma, items, max_workers):
+    """Dibuja un solo PDF en el pool de procesos y espera el resultado."""
+    return obtener_pool(max_workers).submit(renderizar_proforma, proforma, items).result()
+
+
+class _SalidaZip(io.RawIOBase):
+    """Destino no posicionable para ZipFile: acumula lo escrito hasta que se vacía."""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def nombre_archivo(proforma):
+    # Se añade el id porque dos proformas pueden compartir número de cotización
+    nombre = f"proforma_{proforma['cotizacion_nro']}_{proforma['id']}.pdf"
+    return re.sub(r'[^a-zA-Z0-9_.-]', '', nombre)
+
+
+def generar_zip(proformas, items_por_proforma, cache, max_workers, registrar_pdf=None):
+    """Generador que produce el ZIP por partes.
+
+    Los PDFs que ya están en `cache` se escriben directamente; el resto se manda al
+    pool, con como mucho dos trabajos pendientes por proceso para acotar la memoria.
+    `registrar_pdf(duracion, bytes, origen)`, si se indica, recibe cada PDF dibujado.
+    """
+    salida = _SalidaZip()
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as zf:
+        pendientes = {}
+        pool = None
+        for proforma in proformas:
+            items = items_por_proforma[proforma['id']]
+            clave = clave_pdf(proforma, items)
+            contenido = cache.obtener(proforma['id'], clave)
+            if contenido is not None:
+                zf.writestr(nombre_archivo(proforma), contenido)
+                yield salida.vaciar()
+                continue
+
+            if pool is None:
+                pool = obtener_pool(max_workers)
+            futuro = pool.submit(_renderizar_medido, proforma, items)
+            pendientes[futuro] = (proforma, clave)
+
+            while len(pendientes) >= max_workers * 2:
+                yield from _escribir_terminados(zf, salida, pendientes, cache, registrar_pdf)
+
+        while pendientes:
+            yield from _escribir_terminados(zf, salida, pendientes, cache, registrar_pdf)
+    # Al cerrar el ZIP se escribe el directorio central
+    yield salida.vaciar()
+
+
+def _escribir_terminados(zf, salida, pendientes, cache, registrar_pdf):
+    terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+    for futuro in terminados:
+        proforma, clave = pendientes.pop(futuro)
+        try:
+            contenido, duracion = futuro.result()
+        except Exception as e:
+            # La respuesta ya empezó a enviarse: dejamos constancia dentro del ZIP y seguimos
+            print(f"Error al generar PDF para proforma {proforma['id']}: {e}", file=sys.stderr)
+            zf.writestr(f"ERROR_{nombre_archivo(proforma)}.txt", "No se pudo generar este PDF.")
+        else:
+            if registrar_pdf:
+                registrar_pdf(duracion, len(contenido), origen='zip')
+            cache.guardar(proforma['id'], clave, contenido)
+            zf.writestr(nombre_archivo(proforma), contenido)
+        yield salida.vaciar()
@@ -0,0 +1,178 @@
+# pdf_render.py
+# Motor único para dibujar las proformas en PDF.
+#
+# El logo y la franja de fondo se decodifican (y comprimen para el PDF) una sola vez
+# por proceso; cada documento nuevo recibe una copia de esa información ya procesada,
+# así fpdf2 no vuelve a leer ni a convertir los PNG en cada página ni en cada documento.
+import copy
+import os
+import sys
+import threading
+
+from fpdf import FPDF
+
+_DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RUTA_FONDO = os.path.join(_DIRECTORIO, 'static', 'img', 'pdf_background.png')
+RUTA_LOGO = os.path.join(_DIRECTORIO, 'static', 'img', 'logo.png')
+
+_recursos = None
+_recursos_lock = threading.Lock()
+
+
+# --- FUNCIÓN AUXILIAR PARA CODIFICAR TEXTO PARA PDF ---
+def encode_text(text):
+    """Codifica el texto a latin-1 reemplazando caracteres no soportados."""
+    return str(text).encode('latin-1', 'replace').decode('latin-1')
+
+
+def _recursos_decodificados():
+    """Decodifica las imágenes de marca la primera vez y devuelve la caché de imágenes resultante."""
+    global _recursos
+    if _recursos is None:
+        with _recursos_lock:
+            if _recursos is None:
+                plantilla = FPDF()
+                for ruta in (RUTA_FONDO, RUTA_LOGO):
+                    try:
+                        plantilla.preload_image(ruta)
+                    except Exception as e:
+                        print(f"ADVERTENCIA: No se pudo cargar la imagen {ruta}: {e}", file=sys.stderr)
+                _recursos = plantilla.image_cache
+    return _recursos
+
+
+# --- CLASE PDF PROFESIONAL (VERSIÓN CORREGIDA FINAL) ---
+class PDF(FPDF):
+    # Permite desactivar la precarga (por ejemplo, para comparar rendimiento)
+    PRECARGAR_RECURSOS = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Creamos un atributo para pasarle el estado del IGV
+        self.incluye_igv = False
+        if self.PRECARGAR_RECURSOS:
+            recursos = _recursos_decodificados()
+            # Copia superficial de cada imagen: los datos comprimidos se comparten,
+            # pero el contador de usos es propio de este documento.
+            for nombre, info in recursos.images.items():
+                info_documento = copy.copy(info)
+                info_documento['usages'] = 0
+                self.image_cache.images[nombre] = info_documento
+            self.image_cache.icc_profiles.update(recursos.icc_profiles)
+
+    def header(self):
+        # --- ORDEN DE DIBUJO CORREGIDO ---
+        # 1. PRIMERO: Dibujamos la franja de fondo en toda la página.
+        try:
+            self.image(RUTA_FONDO, 0, 0, 40, self.h)
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo cargar la imagen de fondo del PDF: {e}", file=sys.stderr)
+
+        # 2. LUEGO: Dibujamos el logo y el texto ENCIMA del fondo.
+        self.set_y(10)
+        try:
+            # El logo ahora se dibujará sobre la franja.
+            self.image(RUTA_LOGO, 15, 12, 33)
+        except Exception as e:
+            print(f"ADVERTENCIA: No se pudo cargar el logo: {e}", file=sys.stderr)
+
+        # Mover a la derecha del logo para la info de la empresa
+        self.set_y(15)
+        self.set_x(55)
+
+        self.set_font('Helvetica', 'B', 14)
+        self.cell(0, 7, 'Ledesma LED - Cotizacion', 0, 1, 'L')
+        self.set_font('Helvetica', '', 9)
+        self.set_x(55)
+        self.cell(0, 5, 'RUC: 10105573281 (Cesar Antonio Ledesma Sanchez)', 0, 1, 'L')
+        self.set_x(55)
+        self.cell(0, 5, 'Jr. Tacna 121 - Urb. Cercado - Santiago de Surco, Lima, Peru', 0, 1, 'L')
+        self.set_x(55)
+        self.cell(0, 5, 'Celular: 941368586 | Correo: ledesmaled@hotmail.com', 0, 1, 'L')
+
+        # Salto de línea para separar del cuerpo
+        self.ln(15)
+
+    def footer(self):
+        self.set_y(-20) # Subimos un poco el footer para que quepan las dos líneas
+        self.set_font('Helvetica', 'I', 8)
+
+        # Texto del IGV que se obtiene del atributo que le pasamos
+        igv_text = "La proforma SI incluye IGV" if self.incluye_igv else "La proforma NO incluye IGV"
+        self.cell(0, 5, igv_text, 0, 1, 'C')
+
+        # Cuenta bancaria
+        self.set_font('Helvetica', '', 8)
+        bcp_text = "Numero de Cuenta BCP: 194-38403786-0-01 (a nombre de Cesar Antonio Ledesma Sanchez)"
+        self.cell(0, 5, bcp_text, 0, 1, 'C')
+
+        # Número de página
+        self.set_font('Helvetica', 'I', 8)
+        self.cell(0, 5, f'Pagina {self.page_no()}', 0, 0, 'R')
+
+
+def renderizar_proforma(proforma, items):
+    """Dibuja la proforma completa y devuelve los bytes del PDF."""
+    pdf = PDF()
+    pdf.incluye_igv = proforma['incluye_igv']
+
+    # add_page ahora se encarga de todo (fondo y header)
+    pdf.add_page()
+
+    # Establecemos los márgenes para que el texto no quede debajo de la franja
+    pdf.set_left_margin(45)
+    pdf.set_right_margin(15)
+    pdf.set_y(55) # Bajamos el cursor para empezar después del header
+
+    # Datos del cliente
+    pdf.set_font('Helvetica', '', 11)
+    fecha_formateada = proforma['fecha'].strftime('%d/%m/%Y') if proforma.get('fecha') else ''
+    pdf.cell(0, 7, f"Fecha: {fecha_formateada}", 0, 1)
+    pdf.cell(0, 7, f"Cotizacion Nro: {proforma['cotizacion_nro']}", 0, 1)
+    pdf.cell(0, 7, f"Cliente: {proforma['cliente']}", 0, 1)
+    pdf.ln(5)
+
+    # Mensaje de saludo
+    pdf.set_font('Helvetica', 'I', 11)
+    pdf.multi_cell(0, 7, "Estimado Cliente. Aqui le enviamos la proforma del trabajo a tratar.", 0, 'L')
+    pdf.ln(5)
+
+    # Tabla de items (con anchos ajustados)
+    pdf.set_font('Helvetica', 'B', 11)
+    pdf.cell(80, 10, 'Item', 1, 0, 'C')
+    pdf.cell(20, 10, 'Cant.', 1, 0, 'C')
+    pdf.cell(25, 10, 'P. Unit.', 1, 0, 'C')
+    pdf.cell(25, 10, 'Costo', 1, 1, 'C')
+
+    pdf.set_font('Helvetica', '', 10)
+    subtotal = 0.0
+    for item in items:
+        costo = float(item['cantidad']) * float(item['precio_unitario'])
+        subtotal += costo
+        pdf.cell(80, 10, str(item['item_descripcion']), 1, 0)
+        pdf.cell(20, 10, str(item['cantidad']), 1, 0, 'R')
+        pdf.cell(25, 10, f"S/ {float(item['precio_unitario']):.2f}", 1, 0, 'R')
+        pdf.cell(25, 10, f"S/ {costo:.2f}", 1, 1, 'R')
+
+    pdf.ln(10)
+
+    # Totales alineados a la derecha
+    pdf.set_font('Helvetica', 'B', 12)
+    pdf.set_x(100)
+    pdf.cell(40, 10, 'SUBTOTAL:', 0, 0, 'R')
+    pdf.cell(25, 10, f"S/ {subtotal:.2f}", 0, 1, 'R')
+
+    total_final = subtotal
+    if proforma['incluye_igv']:
+        igv = subtotal * 0.18
+        pdf.set_x(100)
+        pdf.cell(40, 10, 'IGV (18%):', 0, 0, 'R')
+        pdf.cell(25, 10, f"S/ {igv:.2f}", 0, 1, 'R')
+        total_final += igv
+
+    pdf.set_font('Helvetica', 'B', 14)
+    pdf.set_x(100)
+    pdf.cell(40, 10, 'TOTAL:', 0, 0, 'R')
+    pdf.cell(25, 10, f"S/ {total_final:.2f}", 0, 1, 'R')
+
+    return bytes(pdf.output())
@@ -0,0 +1,167 @@
+# perfilador.py
+# Perfilador de consultas para desarrollo (se activa con PROFILER_ENABLED=1).
+#
+# Se registra como observador del pool de conexiones, así que ve todas las
+# consultas de cada petición sin tocar las rutas. Por cada petición guarda:
+#   - cada sentencia con su duración y la línea del código que la lanzó
+#   - las "formas" de sentencia repetidas (el mismo SQL con otros valores), que
+#     delatan bucles de consultas N+1
+#   - el EXPLAIN de las consultas que superan el umbral de lentitud
+# y escribe un informe JSON por petición (una línea por informe) en PROFILER_LOG.
+# Los últimos informes también se pueden ver en /debug/perfilador.
+#
+# No está pensado para producción: extraer la pila y lanzar EXPLAIN cuesta tiempo.
+import json
+import os
+import re
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+import MySQLdb
+import MySQLdb.cursors
+from flask import g, has_request_context, request
+
+RAIZ = os.path.dirname(os.path.abspath(__file__))
+# Archivos que forman parte de la maquinaria y no son el "sitio" de una consulta
+_ARCHIVOS_INTERNOS = {os.path.join(RAIZ, 'db_pool.py'), os.path.join(RAIZ, 'perfilador.py')}
+
+_ESPACIOS = re.compile(r'\s+')
+_LISTA_MARCADORES = re.compile(r'\(\s*%s(?:\s*,\s*%s)+\s*\)')
+_FILAS_VALUES = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+_NUMEROS = re.compile(r'\b\d+\b')
+_CADENAS = re.compile(r"'(?:[^'\\]|\\.)*'")
+_EXPLICABLES = ('SELECT', 'UPDATE', 'DELETE')
+
+
+def forma_sentencia(sql):
+    """Normaliza una sentencia para agrupar las que sólo difieren en sus valores."""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    forma = _ESPACIOS.sub(' ', sql).strip()
+    forma = _CADENAS.sub('?', forma)
+    forma = _NUMEROS.sub('?', forma)
+    forma = _LISTA_MARCADORES.sub('(...)', forma)
+    forma = _FILAS_VALUES.sub(r'\1, ...', forma)
+    return forma
+
+
+def sitio_llamada():
+    """Primera línea del código de la aplicación en la pila (archivo:línea función)."""
+    for marco in reversed(traceback.extract_stack()):
+        archivo = os.path.abspath(marco.filename)
+        if archivo.startswith(RAIZ) and archivo not in _ARCHIVOS_INTERNOS:
+            return f"{os.path.relpath(archivo, RAIZ)}:{marco.lineno} {marco.name}"
+    return None
+
+
+class Perfilador:
+    """Extensión de Flask: observa las consultas del pool y arma un informe por petición."""
+
+    def __init__(self, app=None, mysql=None):
+        self.informes = deque(maxlen=50)
+        self._lock_archivo = threading.Lock()
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.umbral_lenta = app.config.get('PROFILER_SLOW_MS', 50) / 1000
+        self.umbral_repeticion = app.config.get('PROFILER_N1_THRESHOLD', 5)
+        self.archivo = app.config.get('PROFILER_LOG') or os.path.join(app.instance_path, 'perfilador.jsonl')
+        os.makedirs(os.path.dirname(self.archivo), exist_ok=True)
+        self.informes = deque(maxlen=app.config.get('PROFILER_KEEP', 50))
+        mysql.agregar_observador(self.observar_consulta)
+        app.before_request(self._iniciar)
+        app.after_request(self._terminar)
+
+    def _iniciar(self):
+        g._perfilador = []
+        g._perfilador_inicio = time.perf_counter()
+
+    def observar_consulta(self, cursor, consulta, parametros, duracion):
+        if not has_request_context() or g.get('_perfilador_explicando'):
+            return
+        sentencias = g.get('_perfilador')
+        if sentencias is None:
+            return
+        ejecutada = getattr(cursor, '_executed', None) or consulta
+        if isinstance(ejecutada, bytes):
+            ejecutada = ejecutada.decode('utf-8', 'replace')
+        sentencia = {
+            'sql': ejecutada if len(ejecutada) <= 2000 else ejecutada[:2000] + '...',
+            'forma': forma_sentencia(consulta),
+            'duracion_ms': round(duracion * 1000, 3),
+            'sitio': sitio_llamada(),
+        }
+        if duracion >= self.umbral_lenta:
+            sentencia['explain'] = self._explicar(cursor, ejecutada)
+        sentencias.append(sentencia)
+
+    def _explicar(self, cursor, sql):
+        if not sql.lstrip().upper().startswith(_EXPLICABLES):
+            return None
+        # Un cursor del lado del servidor aún tiene filas pendientes en la conexión
+        if isinstance(cursor, getattr(MySQLdb.cursors, 'CursorUseResultMixIn', ())):
+            return None
+        g._perfilador_explicando = True
+        try:
+            cur = cursor.connection.cursor(MySQLdb.cursors.DictCursor)
+            cur.execute("EXPLAIN " + sql)
+            plan = [dict(fila) for fila in cur.fetchall()]
+            cur.close()
+            return plan
+        except Exception as e:
+            # El perfilador nunca debe hacer fallar la consulta que está observando
+            return {'error': str(e)}
+        finally:
+            g._perfilador_explicando = False
+
+    def _terminar(self, response):
+        sentencias = g.pop('_perfilador', None)
+        if sentencias is None:
+            return response
+        informe = self.armar_informe(sentencias, response.status_code,
+                                     time.perf_counter() - g._perfilador_inicio)
+        self.informes.append(informe)
+        self._escribir(informe)
+        for repetida in informe['repetidas']:
+            print(f"[perfilador] Posible N+1 en {informe['endpoint']}: {repetida['veces']} x "
+                  f"{repetida['forma'][:120]} ({', '.join(repetida['sitios'])})", file=sys.stderr)
+        return response
+
+    def armar_informe(self, sentencias, status, duracion):
+        grupos = {}
+        for sentencia in sentencias:
+            grupo = grupos.setdefault(sentencia['forma'], {'veces': 0, 'duracion_ms': 0.0, 'sitios': set()})
+            grupo['veces'] += 1
+            grupo['duracion_ms'] += sentencia['duracion_ms']
+            if sentencia['sitio']:
+                grupo['sitios'].add(sentencia['sitio'])
+        repetidas = [
+            {'forma': forma, 'veces': grupo['veces'], 'duracion_ms': round(grupo['duracion_ms'], 3),
+             'sitios': sorted(grupo['sitios'])}
+            for forma, grupo in grupos.items() if grupo['veces'] >= self.umbral_repeticion
+        ]
+        return {
+            'fecha': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'metodo': request.method,
+            'ruta': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': status,
+            'duracion_ms': round(duracion * 1000, 3),
+            'consultas': len(sentencias),
+            'tiempo_db_ms': round(sum(s['duracion_ms'] for s in sentencias), 3),
+            'repetidas': sorted(repetidas, key=lambda r: r['veces'], reverse=True),
+            'lentas': [s for s in sentencias if 'explain' in s],
+            'sentencias': sentencias,
+        }
+
+    def _escribir(self, informe):
+        try:
+            linea = json.dumps(informe, ensure_ascii=False, default=str)
+            with self._lock_archivo, open(self.archivo, 'a', encoding='utf-8') as f:
+                f.write(linea + '\n')
+        except OSError as e:
+            print(f"[perfilador] No se pudo escribir el informe: {e}", file=sys.stderr)
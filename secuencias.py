@@ -0,0 +1,83 @@
+# secuencias.py
+# Numeración de cotizaciones por usuario.
+#
+# Cada usuario tiene una fila en `proforma_secuencias` con el último número
+# entregado. Asignar un número es un único UPDATE con LAST_INSERT_ID(), que
+# bloquea la fila hasta el commit: dos guardados simultáneos nunca reciben el
+# mismo número, y no hace falta recorrer las proformas con MAX(CAST(...)).
+# El punto de partida sale de la columna numérica indexada `cotizacion_num`.
+
+CREATE_TABLE_SECUENCIAS = """
+    CREATE TABLE IF NOT EXISTS proforma_secuencias (
+        user_id INT NOT NULL PRIMARY KEY,
+        ultimo INT UNSIGNED NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB
+"""
+
+# Punto de partida de un usuario: el mayor número que ya usó (una sola vez por usuario)
+_INICIALIZAR = """
+    INSERT INTO proforma_secuencias (user_id, ultimo)
+    SELECT u.id, COALESCE(MAX(p.cotizacion_num), 0)
+    FROM users u
+    LEFT JOIN proformas p ON p.user_id = u.id
+    {filtro}
+    GROUP BY u.id
+    ON DUPLICATE KEY UPDATE ultimo = GREATEST(ultimo, VALUES(ultimo))
+"""
+
+
+def crear_tabla_secuencias(cur):
+    """Crea la tabla y, la primera vez, la completa con los números ya usados por cada usuario."""
+    cur.execute(CREATE_TABLE_SECUENCIAS)
+    cur.execute("SELECT 1 FROM proforma_secuencias LIMIT 1")
+    if cur.fetchone():
+        return
+    cur.execute(_INICIALIZAR.format(filtro=""))
+
+
+def _inicializar_usuario(cur, user_id):
+    cur.execute(_INICIALIZAR.format(filtro="WHERE u.id = %s"), [user_id])
+
+
+def siguiente_sugerido(cur, user_id):
+    """Número que recibiría la próxima proforma (sólo lectura, no lo reserva)."""
+    cur.execute("SELECT ultimo FROM proforma_secuencias WHERE user_id = %s", [user_id])
+    fila = cur.fetchone()
+    if fila is None:
+        _inicializar_usuario(cur, user_id)
+        cur.execute("SELECT ultimo FROM proforma_secuencias WHERE user_id = %s", [user_id])
+        fila = cur.fetchone()
+    return (fila['ultimo'] if fila else 0) + 1
+
+
+def asignar_numero(cur, user_id):
+    """Reserva y devuelve el siguiente número dentro de la transacción actual."""
+    cur.execute(
+        "UPDATE proforma_secuencias SET ultimo = LAST_INSERT_ID(ultimo + 1) WHERE user_id = %s",
+        [user_id]
+    )
+    if cur.rowcount == 0:
+        _inicializar_usuario(cur, user_id)
+        cur.execute(
+            "UPDATE proforma_secuencias SET ultimo = LAST_INSERT_ID(ultimo + 1) WHERE user_id = %s",
+            [user_id]
+        )
+    cur.execute("SELECT LAST_INSERT_ID() AS numero")
+    return cur.fetchone()['numero']
+
+
+def registrar_numero_manual(cur, user_id, cotizacion_nro):
+    """Si el usuario escribió un número a mano, la secuencia continúa a partir de él."""
+    try:
+        numero = int(str(cotizacion_nro).strip())
+    except ValueError:
+        return
+    if numero <= 0:
+        return
+    # Los usuarios existentes ya tienen su fila desde el arranque; los nuevos no tienen
+    # proformas previas, así que el número escrito es un punto de partida correcto
+    cur.execute(
+        """INSERT INTO proforma_secuencias (user_id, ultimo) VALUES (%s, %s)
+           ON DUPLICATE KEY UPDATE ultimo = GREATEST(ultimo, VALUES(ultimo))""",
+        (user_id, numero)
+    )
@@ -27,6 +27,11 @@ function initCrearProforma() {
     
     let items = [];
     let editIndex = -1;
+    // En modo edición: items tal como están guardados y versión, para enviar sólo los cambios
+    let itemsOriginales = [];
+    let versionProforma = null;
+    // Número sugerido por el servidor; si no se modifica, el servidor lo asigna al guardar
+    let numeroSugerido = null;
 
     const pageTitle = document.getElementById('page-title');
     const btnAgregar = document.getElementById('btn-agregar-producto');
@@ -41,6 +46,7 @@ function initCrearProforma() {
     const cotizacionNroInput = document.getElementById('cotizacion_nro');
     const clienteInput = document.getElementById('cliente');
     const suggestionsContainer = document.getElementById('cliente-suggestions');
+    const itemSuggestions = document.getElementById('item-suggestions');
     
     const cargarNumeroSugerido = async () => {
     try {
@@ -48,6 +54,7 @@ function initCrearProforma() {
         if (!response.ok) return;
         const data = await response.json();
         if (data.next_number) {
+            numeroSugerido = String(data.next_number);
             cotizacionNroInput.value = data.next_number;
         }
     } catch (error) {
@@ -72,6 +79,8 @@ function initCrearProforma() {
             
             // Cargar los items en nuestra variable local y renderizar la tabla
             items = proforma.items;
+            itemsOriginales = proforma.items.map(item => ({ ...item }));
+            versionProforma = proforma.version;
             renderizarTabla();
         } catch(error) {
             alert(error.message);
@@ -119,6 +128,8 @@ function initCrearProforma() {
         }
 
         if (editIndex > -1) {
+            // Conservamos el id para que el servidor sepa que es un cambio y no un item nuevo
+            newItem.id = items[editIndex].id;
             items[editIndex] = newItem;
             editIndex = -1; // Salir del modo de edición de item
             btnAgregar.textContent = "Agregar Producto";
@@ -150,6 +161,21 @@ function initCrearProforma() {
         }
     });
     
+    // Diferencias entre los items guardados y los actuales, en el formato del PATCH
+    function calcularCambiosItems() {
+        const idsActuales = new Set(items.filter(i => i.id).map(i => i.id));
+        const originalesPorId = new Map(itemsOriginales.map(i => [i.id, i]));
+        return {
+            add: items.filter(i => !i.id),
+            change: items.filter(i => {
+                const original = originalesPorId.get(i.id);
+                return i.id && original && (original.item !== i.item ||
+                    original.cantidad !== i.cantidad || original.precio_unitario !== i.precio_unitario);
+            }),
+            remove: itemsOriginales.filter(i => !idsActuales.has(i.id)).map(i => i.id)
+        };
+    }
+
     btnGenerar.addEventListener('click', async () => {
         const originalText = btnGenerar.textContent;
         btnGenerar.textContent = 'Guardando...';
@@ -179,12 +205,20 @@ function initCrearProforma() {
 
         try {
             const url = esModoEdicion ? `/api/proformas/${proformaId}` : '/api/proformas';
-            const method = esModoEdicion ? 'PUT' : 'POST';
+            // Al editar sólo se envían los items que cambiaron, junto con la versión cargada
+            const method = esModoEdicion ? 'PATCH' : 'POST';
+            const body = esModoEdicion
+                ? { ...proformaData, items: calcularCambiosItems(), version: versionProforma }
+                : proformaData;
+            if (!esModoEdicion && proformaData.cotizacion_nro === numeroSugerido) {
+                // Evita que dos proformas guardadas a la vez reciban el mismo número
+                delete body.cotizacion_nro;
+            }
 
             const response = await fetch(url, {
                 method: method,
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(proformaData)
+                body: JSON.stringify(body)
             });
 
             const result = await response.json();
@@ -230,10 +264,47 @@ function initCrearProforma() {
         }
     });
 
+    // Autocompletado de items: descripciones ya cotizadas, las más usadas primero.
+    // Al elegir una se propone el último precio con que se cotizó.
+    itemInput.addEventListener('input', async () => {
+        const searchTerm = itemInput.value;
+        if (searchTerm.length < 2) {
+            itemSuggestions.innerHTML = '';
+            itemSuggestions.style.display = 'none';
+            return;
+        }
+        const response = await fetch(`/api/items/search?term=${encodeURIComponent(searchTerm)}`);
+        const suggestions = await response.json();
+        // Si se siguió escribiendo mientras llegaba la respuesta, ésta ya no sirve
+        if (itemInput.value !== searchTerm) return;
+        itemSuggestions.innerHTML = '';
+        if (suggestions.length > 0) {
+            suggestions.forEach(sugerido => {
+                const div = document.createElement('div');
+                div.textContent = `${sugerido.descripcion} — S/ ${sugerido.ultimo_precio.toFixed(2)} ` +
+                    `(prom. S/ ${sugerido.precio_promedio.toFixed(2)}, ${sugerido.usos} usos)`;
+                div.addEventListener('click', () => {
+                    itemInput.value = sugerido.descripcion;
+                    precioInput.value = sugerido.ultimo_precio;
+                    itemSuggestions.innerHTML = '';
+                    itemSuggestions.style.display = 'none';
+                    cantidadInput.focus();
+                });
+                itemSuggestions.appendChild(div);
+            });
+            itemSuggestions.style.display = 'block';
+        } else {
+            itemSuggestions.style.display = 'none';
+        }
+    });
+
     document.addEventListener('click', (e) => {
         if (e.target !== clienteInput) {
             suggestionsContainer.style.display = 'none';
         }
+        if (e.target !== itemInput) {
+            itemSuggestions.style.display = 'none';
+        }
     });
     
     // --- INICIALIZACIÓN DE LA PÁGINA ---
@@ -248,12 +319,63 @@ function initCrearProforma() {
     }
 }
 
+// --- TRABAJOS EN SEGUNDO PLANO ---
+// Encola una exportación pesada, consulta su estado cada segundo y, al terminar,
+// descarga el resultado. Mientras tanto el botón queda deshabilitado. Si no termina
+// en ESPERA_MAXIMA_TRABAJO_MS se deja de consultar y se avisa al usuario.
+const ESPERA_MAXIMA_TRABAJO_MS = 10 * 60 * 1000;
+
+async function ejecutarTrabajo(datos, boton) {
+    // Los enlaces no se pueden deshabilitar: se marca el botón para ignorar clics repetidos
+    if (boton.dataset.ocupado) return;
+    boton.dataset.ocupado = '1';
+    const textoOriginal = boton.textContent;
+    boton.disabled = true;
+    boton.textContent = 'Generando...';
+    try {
+        const response = await fetch('/api/jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(datos)
+        });
+        let trabajo = await response.json();
+        if (!response.ok) {
+            throw new Error(trabajo.error || `Error del servidor: ${response.status}`);
+        }
+        const urlEstado = trabajo.url;
+        const limite = Date.now() + ESPERA_MAXIMA_TRABAJO_MS;
+        while (trabajo.estado === 'pendiente' || trabajo.estado === 'en_proceso') {
+            if (Date.now() > limite) {
+                throw new Error('el servidor está tardando demasiado. Inténtelo de nuevo más tarde.');
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const estado = await fetch(urlEstado);
+            trabajo = await estado.json();
+            if (!estado.ok) {
+                throw new Error(trabajo.error || `Error del servidor: ${estado.status}`);
+            }
+        }
+        if (trabajo.estado === 'error') {
+            throw new Error(trabajo.error);
+        }
+        window.location = trabajo.descarga;
+    } catch (error) {
+        alert(`No se pudo generar el archivo: ${error.message}`);
+    } finally {
+        delete boton.dataset.ocupado;
+        boton.disabled = false;
+        boton.textContent = textoOriginal;
+    }
+}
+
 // REEMPLAZA LA FUNCIÓN initListaProformas() EXISTENTE CON ESTA VERSIÓN COMPLETA
 function initListaProformas() {
     const tablaProformasBody = document.getElementById('tabla-proformas');
     const searchInput = document.getElementById('search-input');
     const searchButton = document.getElementById('search-button');
     const paginationControls = document.getElementById('pagination-controls');
+    const btnDescargarZip = document.getElementById('btn-descargar-zip');
+    const exportForm = document.querySelector('.export-form');
     
     // Variables del Modal de Eliminación
     const modal = document.getElementById('deleteModal');
@@ -346,6 +468,8 @@ function initListaProformas() {
     searchButton.addEventListener('click', () => {
         currentPage = 1;
         currentSearch = searchInput.value;
+        // El ZIP descarga las mismas proformas que muestra la búsqueda actual
+        btnDescargarZip.href = `/api/proformas/pdf_zip?search=${encodeURIComponent(currentSearch)}`;
         cargarProformas(currentPage, currentSearch);
     });
 
@@ -355,6 +479,19 @@ function initListaProformas() {
         }
     });
 
+    // El ZIP y la exportación se generan en segundo plano (los enlaces quedan como alternativa sin JS)
+    btnDescargarZip.addEventListener('click', (e) => {
+        e.preventDefault();
+        ejecutarTrabajo({ tipo: 'zip', search: currentSearch }, btnDescargarZip);
+    });
+
+    exportForm.addEventListener('submit', (e) => {
+        e.preventDefault();
+        const datos = Object.fromEntries(new FormData(exportForm));
+        datos.tipo = 'exportacion';
+        ejecutarTrabajo(datos, exportForm.querySelector('button[type="submit"]'));
+    });
+
     // --- LÓGICA COMPLETA DEL MODAL DE ELIMINACIÓN ---
     function openModal(id) {
         proformaIdToDelete = id;
@@ -454,36 +591,94 @@ function initClientes() {
     const emailInput = document.getElementById('email');
     const tablaClientes = document.getElementById('tabla-clientes');
     const btnCancel = document.getElementById('btn-cancel-edit');
+    const btnMasClientes = document.getElementById('btn-mas-clientes');
+
+    // Clientes ya descargados (por id), cursor de la siguiente página (null si ya están
+    // todos) y token para pedir sólo lo que cambió desde la última respuesta
+    const clientesCargados = new Map();
+    let siguientePagina = null;
+    let tokenSync = null;
+
+    // Mismo orden que el servidor: por nombre sin distinguir mayúsculas ni tildes, luego por id
+    const compararClientes = (a, b) =>
+        a.nombre.localeCompare(b.nombre, 'es', { sensitivity: 'base' }) || a.id - b.id;
+
+    // Función para mostrar en la tabla los clientes descargados
+    const renderizarClientes = () => {
+        const clientes = Array.from(clientesCargados.values()).sort(compararClientes);
+        tablaClientes.innerHTML = '';
+        clientes.forEach(c => {
+            const row = document.createElement('tr');
+            row.innerHTML = `
+                <td>${c.nombre}</td>
+                <td>${c.ruc_dni || ''}</td>
+                <td>${c.email || ''}<br>${c.telefono || ''}</td>
+                <td>
+                    <button class="btn btn-primary btn-edit" data-id='${c.id}' style="padding: 5px 10px; font-size: 0.9em;">Editar</button>
+                    <button class="btn btn-danger btn-delete" data-id='${c.id}' style="padding: 5px 10px; font-size: 0.9em;">Eliminar</button>
+                </td>
+            `;
+            // Añadir datos del cliente al botón de editar para fácil acceso
+            row.querySelector('.btn-edit').dataset.cliente = JSON.stringify(c);
+            tablaClientes.appendChild(row);
+        });
+        btnMasClientes.style.display = siguientePagina ? 'inline-block' : 'none';
+    };
 
-    // Función para cargar y mostrar los clientes en la tabla
-    const cargarClientes = async () => {
+    // Carga una página de clientes (la primera si `desdeCero`)
+    const cargarClientes = async (desdeCero = true) => {
         try {
-            const response = await fetch('/api/clientes');
+            const params = new URLSearchParams();
+            if (!desdeCero && siguientePagina) {
+                params.set('after_nombre', siguientePagina.after_nombre);
+                params.set('after_id', siguientePagina.after_id);
+            }
+            const response = await fetch(`/api/clientes?${params}`);
             if (!response.ok) throw new Error('No se pudo cargar la lista de clientes.');
 
-            const clientes = await response.json();
-            tablaClientes.innerHTML = '';
-            clientes.forEach(c => {
-                const row = document.createElement('tr');
-                row.innerHTML = `
-                    <td>${c.nombre}</td>
-                    <td>${c.ruc_dni || ''}</td>
-                    <td>${c.email || ''}<br>${c.telefono || ''}</td>
-                    <td>
-                        <button class="btn btn-primary btn-edit" data-id='${c.id}' style="padding: 5px 10px; font-size: 0.9em;">Editar</button>
-                        <button class="btn btn-danger btn-delete" data-id='${c.id}' style="padding: 5px 10px; font-size: 0.9em;">Eliminar</button>
-                    </td>
-                `;
-                // Añadir datos del cliente al botón de editar para fácil acceso
-                row.querySelector('.btn-edit').dataset.cliente = JSON.stringify(c);
-                tablaClientes.appendChild(row);
-            });
+            const data = await response.json();
+            if (desdeCero) {
+                clientesCargados.clear();
+                tokenSync = data.sync;
+            }
+            data.clientes.forEach(c => clientesCargados.set(c.id, c));
+            siguientePagina = data.pagination.has_more
+                ? { after_nombre: data.pagination.next_after_nombre, after_id: data.pagination.next_after_id }
+                : null;
+            renderizarClientes();
         } catch(error) {
             console.error(error);
             tablaClientes.innerHTML = `<tr><td colspan="4" class="error-message">Error al cargar clientes.</td></tr>`;
         }
     };
 
+    // Tras crear, editar o eliminar: descarga sólo los clientes que cambiaron
+    const sincronizarClientes = async () => {
+        if (!tokenSync) return cargarClientes();
+        try {
+            const response = await fetch(`/api/clientes?since=${encodeURIComponent(tokenSync)}`);
+            if (!response.ok) throw new Error('No se pudo actualizar la lista de clientes.');
+
+            const data = await response.json();
+            if (data.reset) return cargarClientes();
+            tokenSync = data.sync;
+            data.deleted.forEach(id => clientesCargados.delete(id));
+            // Si faltan páginas, los que quedan después del último cargado llegarán con ellas
+            const ultimo = siguientePagina ? { nombre: siguientePagina.after_nombre, id: siguientePagina.after_id } : null;
+            data.clientes.forEach(c => {
+                if (ultimo && compararClientes(c, ultimo) > 0) {
+                    clientesCargados.delete(c.id);
+                } else {
+                    clientesCargados.set(c.id, c);
+                }
+            });
+            renderizarClientes();
+        } catch(error) {
+            console.error(error);
+            cargarClientes();
+        }
+    };
+
     // Resetear el formulario a su estado inicial
     const resetForm = () => {
         formTitle.textContent = 'Añadir Nuevo Cliente';
@@ -515,7 +710,7 @@ function initClientes() {
 
         if (response.ok) {
             resetForm();
-            cargarClientes();
+            sincronizarClientes();
         } else {
             alert('Error al guardar el cliente.');
         }
@@ -546,7 +741,7 @@ function initClientes() {
 
             if (response.ok) {
                 resetForm();
-                cargarClientes();
+                sincronizarClientes();
             } else {
                 alert('Error al eliminar el cliente.');
             }
@@ -556,6 +751,9 @@ function initClientes() {
     // Botón de Cancelar Edición
     btnCancel.addEventListener('click', resetForm);
 
+    // Botón para traer la siguiente página de clientes
+    btnMasClientes.addEventListener('click', () => cargarClientes(false));
+
     // Carga inicial de clientes
     cargarClientes();
 }
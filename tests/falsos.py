@@ -0,0 +1,103 @@
+# tests/falsos.py
+# Base de datos falsa para las pruebas: cursores que registran cada consulta y
+# responden con filas preparadas por la prueba, sin MySQL.
+#
+# `responder(sql, params)` recibe el SQL con los espacios normalizados y devuelve
+# las filas del resultado (o None). Para simular un error, que lance la excepción.
+import contextlib
+
+
+def normalizar(sql):
+    return ' '.join(sql.split())
+
+
+class CursorFalso:
+    def __init__(self, responder=None, consultas=None):
+        self.responder = responder or (lambda sql, params: None)
+        # Lista compartida con la conexión, para contar las consultas de toda la petición
+        self.consultas = consultas if consultas is not None else []
+        self.rowcount = 0
+        self.lastrowid = None
+        self._filas = []
+
+    def execute(self, sql, params=None):
+        sql = normalizar(sql)
+        params = list(params) if params is not None else []
+        self.consultas.append((sql, params))
+        filas = self.responder(sql, params)
+        if isinstance(filas, int):
+            # Sentencias de escritura: el responder devuelve las filas afectadas
+            self._filas, self.rowcount = [], filas
+        else:
+            self._filas = list(filas or [])
+            self.rowcount = len(self._filas)
+        return self.rowcount
+
+    def executemany(self, sql, filas):
+        sql = normalizar(sql)
+        filas = [list(fila) for fila in filas]
+        self.consultas.append((sql, filas))
+        self._filas = []
+        self.rowcount = len(filas)
+        return self.rowcount
+
+    def fetchall(self):
+        filas, self._filas = self._filas, []
+        return filas
+
+    def fetchone(self):
+        return self._filas.pop(0) if self._filas else None
+
+    def close(self):
+        pass
+
+
+class ConexionFalsa:
+    def __init__(self, responder=None):
+        self.responder = responder
+        self.consultas = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, cursorclass=None):
+        return CursorFalso(self.responder, self.consultas)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def consultas_con(self, fragmento):
+        return [(sql, params) for sql, params in self.consultas if fragmento in sql]
+
+
+class MySQLFalso:
+    """Sustituye a `app.mysql`: todas las peticiones comparten la misma conexión falsa."""
+
+    def __init__(self, conexion):
+        self.connection = conexion
+
+    def descartar_conexion(self):
+        pass
+
+
+@contextlib.contextmanager
+def base_falsa(aplicacion, responder=None):
+    """Sirve la aplicación (el módulo app) con una conexión falsa y la base ya preparada."""
+    conexion = ConexionFalsa(responder)
+    anterior = aplicacion.mysql, aplicacion._base_preparada
+    aplicacion.mysql = MySQLFalso(conexion)
+    aplicacion._base_preparada = True
+    try:
+        yield conexion
+    finally:
+        aplicacion.mysql, aplicacion._base_preparada = anterior
+
+
+def cliente_con_sesion(aplicacion, user_id=1, role='user'):
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion.update(loggedin=True, id=user_id, username=f"usuario{user_id}",
+                      fullname=f"Usuario {user_id}", role=role)
+    return cliente
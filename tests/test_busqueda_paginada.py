@@ -0,0 +1,71 @@
+# tests/test_busqueda_paginada.py
+# Una búsqueda ordenada por relevancia se recorre entera siguiendo la paginación
+# que devuelve la API, sin saltar ni repetir proformas.
+import unittest
+from datetime import date
+
+import app as aplicacion
+from tests.falsos import base_falsa, cliente_con_sesion
+
+# id -> relevancia: las más relevantes no son las de id más alto
+RELEVANCIA = {pid: (pid * 7) % 5 for pid in range(1, 26)}
+
+
+def fila(pid):
+    return {'id': pid, 'user_id': 1, 'cotizacion_nro': str(pid), 'fecha': date(2025, 1, 1),
+            'cliente': f"Constructora Andina {pid}", 'incluye_igv': True, 'monto_total': 100,
+            'status': 'Enviada', 'author': 'Usuario 1'}
+
+
+def responder(sql, params):
+    if sql.startswith('SELECT COUNT'):
+        return [{'total': len(RELEVANCIA)}]
+    if 'ORDER BY relevancia DESC, p.id DESC LIMIT %s OFFSET %s' in sql:
+        limite, desplazamiento = params[-2:]
+        orden = sorted(RELEVANCIA, key=lambda pid: (RELEVANCIA[pid], pid), reverse=True)
+        return [dict(fila(pid), relevancia=RELEVANCIA[pid]) for pid in orden[desplazamiento:desplazamiento + limite]]
+    if 'ORDER BY p.id DESC LIMIT %s OFFSET %s' in sql:
+        limite, desplazamiento = params[-2:]
+        return [fila(pid) for pid in sorted(RELEVANCIA, reverse=True)[desplazamiento:desplazamiento + limite]]
+    if 'AND p.id < %s ORDER BY p.id DESC LIMIT %s' in sql:
+        despues_de, limite = params[-2:]
+        return [fila(pid) for pid in sorted(RELEVANCIA, reverse=True) if pid < despues_de][:limite]
+    return None
+
+
+class BusquedaPaginadaTest(unittest.TestCase):
+
+    def recorrer(self, consulta):
+        """Pide páginas como lo haría un cliente: cursor si lo hay, si no la página siguiente."""
+        vistos, paginas = [], []
+        parametros = 'page=1'
+        with base_falsa(aplicacion, responder):
+            cliente = cliente_con_sesion(aplicacion)
+            for _ in range(10):
+                datos = cliente.get(f"/api/proformas?search={consulta}&{parametros}").get_json()
+                vistos.extend(p['id'] for p in datos['proformas'])
+                paginas.append(datos['pagination'])
+                paginacion = datos['pagination']
+                if not paginacion['has_more']:
+                    break
+                if paginacion['next_after_id'] is not None:
+                    parametros = f"after_id={paginacion['next_after_id']}"
+                else:
+                    parametros = f"page={paginacion['page'] + 1}"
+        return vistos, paginas
+
+    def test_busqueda_por_relevancia_se_pagina_por_numero_de_pagina(self):
+        vistos, paginas = self.recorrer('andina')
+        esperados = sorted(RELEVANCIA, key=lambda pid: (RELEVANCIA[pid], pid), reverse=True)
+        self.assertEqual(vistos, esperados)
+        self.assertTrue(all(p['next_after_id'] is None for p in paginas))
+
+    def test_busqueda_corta_sin_relevancia_usa_el_cursor(self):
+        # Con una sola letra se recurre a LIKE, ordenado por id: el cursor sigue valiendo
+        vistos, paginas = self.recorrer('a')
+        self.assertEqual(vistos, sorted(RELEVANCIA, reverse=True))
+        self.assertIsNotNone(paginas[0]['next_after_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# tests/test_cache_pdf.py
+# El directorio de la caché de PDFs no crece sin límite: al pasar el tope se borran
+# los archivos usados hace más tiempo.
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import cache_pdf
+from cache_pdf import CachePDF
+
+PDF = b'%PDF-1.4 ' + b'x' * 991  # 1000 bytes
+
+
+class CacheEnDiscoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def archivos(self):
+        return sorted(n for n in os.listdir(self.directorio) if n.endswith('.pdf'))
+
+    def envejecer(self, nombre, segundos):
+        ruta = os.path.join(self.directorio, nombre)
+        instante = time.time() - segundos
+        os.utime(ruta, (instante, instante))
+
+    def test_poda_los_menos_usados_al_pasar_el_tope(self):
+        cache = CachePDF(max_bytes=0, directorio=self.directorio, max_bytes_disco=5000)
+        for pid in range(1, 6):
+            cache.guardar(pid, 'a', PDF)
+            self.envejecer(f"{pid}-a.pdf", 100 - pid)
+        # Leer la 1 la marca como recién usada aunque sea la más antigua
+        self.assertEqual(cache.obtener(1, 'a'), PDF)
+
+        cache.guardar(6, 'a', PDF)
+        self.assertEqual(cache.podar_disco(), 2)
+        self.assertEqual(self.archivos(), ['1-a.pdf', '4-a.pdf', '5-a.pdf', '6-a.pdf'])
+        self.assertIsNone(cache.obtener(2, 'a'))
+
+    def test_poda_cada_tantas_escrituras(self):
+        cache = CachePDF(max_bytes=0, directorio=self.directorio, max_bytes_disco=3000)
+        for pid in range(1, cache_pdf.ESCRITURAS_POR_PODA + 2):
+            cache.guardar(pid, 'a', PDF)
+        # La escritura 1 y la 51 miden el directorio: tras la segunda queda bajo el 90%
+        self.assertLessEqual(len(self.archivos()), 2)
+
+    def test_sin_pasar_el_tope_no_borra(self):
+        cache = CachePDF(max_bytes=0, directorio=self.directorio, max_bytes_disco=10000)
+        for pid in range(1, 4):
+            cache.guardar(pid, 'a', PDF)
+        self.assertEqual(cache.podar_disco(), 0)
+        self.assertEqual(len(self.archivos()), 3)
+
+    def test_temporales_abandonados_se_borran(self):
+        cache = CachePDF(directorio=self.directorio)
+        for nombre in ('viejo.tmp', 'reciente.tmp'):
+            with open(os.path.join(self.directorio, nombre), 'wb') as f:
+                f.write(PDF)
+        self.envejecer('viejo.tmp', cache_pdf.EDAD_MAXIMA_TEMPORAL + 60)
+        cache.podar_disco()
+        self.assertEqual(sorted(os.listdir(self.directorio)), ['reciente.tmp'])
+
+
+if __name__ == '__main__':
+    unittest.main()
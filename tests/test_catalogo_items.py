@@ -0,0 +1,93 @@
+# tests/test_catalogo_items.py
+# Una carga del catálogo que coincide con un guardado no se conserva: su consulta
+# pudo leer ya las líneas que registrar() sumaría otra vez.
+import unittest
+
+from catalogo_items import CatalogoItems
+
+
+def fila(descripcion, usos, total, ultimo_id, ultimo_precio):
+    return {'descripcion': descripcion, 'usos': usos, 'total': total, 'ultimo_id': ultimo_id,
+            'ultimo_precio': ultimo_precio}
+
+
+ANTES = [fila('Panel LED 18W', 2, 100.0, 10, 50.0)]
+# Lo que lee una carga después del commit de un guardado con otra línea de 60
+DESPUES = [fila('Panel LED 18W', 3, 160.0, 11, 60.0)]
+
+
+class CargaDuranteUnGuardadoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.catalogo = CatalogoItems()
+        self.cargas = 0
+
+    def cargar(self, filas, antes_de_leer=None):
+        def cargar(user_id):
+            self.cargas += 1
+            if antes_de_leer:
+                antes_de_leer()
+            return filas
+        return cargar
+
+    def usos(self):
+        return self.catalogo.buscar(1, 'panel', self.cargar(DESPUES))[0]['usos']
+
+    def test_carga_entre_el_commit_y_registrar_no_se_conserva(self):
+        self.catalogo.iniciar_cambio(1)
+        # La carga empieza con el guardado ya avisado y su consulta ve el commit
+        self.assertEqual(self.catalogo.buscar(1, 'panel', self.cargar(DESPUES))[0]['usos'], 3)
+        self.assertFalse(self.catalogo.cargado(1))
+        self.catalogo.registrar(1, agregados=[('Panel LED 18W', 60.0)])
+
+        self.assertEqual(self.usos(), 3)
+        self.assertEqual(self.cargas, 2)
+
+    def test_guardado_que_empieza_durante_la_carga(self):
+        # La carga lee la generación, el guardado se avisa y confirma, y la consulta lo ve
+        self.catalogo.buscar(1, 'panel', self.cargar(DESPUES, lambda: self.catalogo.iniciar_cambio(1)))
+        self.assertFalse(self.catalogo.cargado(1))
+        self.catalogo.registrar(1, agregados=[('Panel LED 18W', 60.0)])
+        self.assertEqual(self.usos(), 3)
+
+    def test_carga_anterior_al_guardado_recibe_sus_lineas(self):
+        self.catalogo.buscar(1, 'panel', self.cargar(ANTES))
+        self.catalogo.iniciar_cambio(1)
+        self.catalogo.registrar(1, agregados=[('Panel LED 18W', 60.0)])
+
+        resultado = self.catalogo.buscar(1, 'panel', None)[0]
+        self.assertEqual(resultado['usos'], 3)
+        self.assertEqual(resultado['precio_promedio'], 53.33)
+        self.assertEqual(self.cargas, 1)
+
+    def test_commit_fallido_no_bloquea_las_cargas(self):
+        self.catalogo.iniciar_cambio(1)
+        self.catalogo.cancelar_cambio(1)
+        self.catalogo.buscar(1, 'panel', self.cargar(ANTES))
+        self.assertTrue(self.catalogo.cargado(1))
+
+    def test_guardados_simultaneos(self):
+        self.catalogo.iniciar_cambio(1)
+        self.catalogo.iniciar_cambio(1)
+        self.catalogo.registrar(1, agregados=[('Panel LED 18W', 60.0)])
+        # Queda un guardado entre su commit y su registrar()
+        self.catalogo.buscar(1, 'panel', self.cargar(DESPUES))
+        self.assertFalse(self.catalogo.cargado(1))
+        self.catalogo.registrar(1, agregados=[('Driver', 20.0)])
+        self.catalogo.buscar(1, 'panel', self.cargar(DESPUES))
+        self.assertTrue(self.catalogo.cargado(1))
+
+    def test_no_guarda_estado_de_usuarios_sin_carga_en_curso(self):
+        catalogo = CatalogoItems(max_entradas=5)
+        for user_id in range(1, 1001):
+            catalogo.iniciar_cambio(user_id)
+            catalogo.registrar(user_id, agregados=[('Driver', 20.0)])
+            catalogo.buscar(user_id, 'panel', self.cargar(ANTES))
+            catalogo.invalidar(user_id + 1)
+        self.assertEqual(catalogo._cargas, {})
+        self.assertEqual(catalogo._en_curso, {})
+        self.assertLessEqual(len(catalogo._catalogos), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# tests/test_db_pool.py
+# Al devolver una conexión al pool sólo se hace rollback si quedó una transacción
+# abierta.
+import unittest
+
+import MySQLdb
+
+from db_pool import ConnectionPool
+
+
+class ConexionContada:
+    def __init__(self):
+        self.transaccion_abierta = False
+        self.rollbacks = 0
+        self.cerrada = False
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.transaccion_abierta = False
+
+    def close(self):
+        self.cerrada = True
+
+
+class DevolverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = ConnectionPool(ConexionContada, tamano=1)
+
+    def test_sin_transaccion_abierta_no_hace_rollback(self):
+        entrada = self.pool.obtener()
+        self.pool.devolver(entrada)
+        self.assertEqual(entrada.conn.rollbacks, 0)
+        self.assertIs(self.pool.obtener(), entrada)
+
+    def test_con_transaccion_abierta_hace_rollback(self):
+        entrada = self.pool.obtener()
+        entrada.conn.transaccion_abierta = True
+        self.pool.devolver(entrada)
+        self.assertEqual(entrada.conn.rollbacks, 1)
+        self.assertFalse(entrada.conn.transaccion_abierta)
+
+    def test_si_el_rollback_falla_se_descarta(self):
+        entrada = self.pool.obtener()
+        entrada.conn.transaccion_abierta = True
+
+        def falla():
+            raise MySQLdb.OperationalError("conexión perdida")
+        entrada.conn.rollback = falla
+        self.pool.devolver(entrada)
+        self.assertTrue(entrada.conn.cerrada)
+        self.assertEqual(self.pool.metricas()['abiertas'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+# tests/test_indice_clientes.py
+# El índice de clientes no guarda estado de los usuarios que ya no tienen índice ni
+# carga en curso, y descarta una carga que coincidió con una invalidación.
+import unittest
+
+from indice_clientes import IndiceClientes
+
+
+def clientes(user_id):
+    return [{'id': user_id * 10 + k, 'nombre': f"Constructora Andina {user_id}-{k}", 'ruc_dni': str(k)}
+            for k in range(3)]
+
+
+class IndiceClientesTest(unittest.TestCase):
+
+    def test_muchos_usuarios_no_acumulan_estado(self):
+        indice = IndiceClientes(max_entradas=50)
+        for user_id in range(1, 1001):
+            indice.buscar(user_id, 'constr', clientes)
+            indice.invalidar(user_id + 1)
+        self.assertEqual(indice._cargas, {})
+        self.assertLessEqual(len(indice._indices), 50)
+
+    def test_invalidacion_durante_la_carga(self):
+        indice = IndiceClientes()
+
+        def cargar(user_id):
+            indice.invalidar(user_id)
+            return clientes(user_id)
+
+        self.assertEqual(len(indice.buscar(1, 'constr', cargar)), 3)
+        self.assertNotIn(1, indice._indices)
+        indice.buscar(1, 'constr', clientes)
+        self.assertIn(1, indice._indices)
+        self.assertEqual(indice._cargas, {})
+
+    def test_carga_fallida_no_deja_estado(self):
+        indice = IndiceClientes()
+
+        def falla(user_id):
+            raise RuntimeError("sin base de datos")
+
+        with self.assertRaises(RuntimeError):
+            indice.buscar(1, 'constr', falla)
+        self.assertEqual(indice._cargas, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
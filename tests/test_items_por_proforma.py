@@ -0,0 +1,94 @@
+# tests/test_items_por_proforma.py
+# Los items de varias proformas se cargan con una sola consulta IN (...), no con
+# una consulta por proforma (N+1).
+import unittest
+from datetime import date
+
+import app as aplicacion
+from tests.falsos import CursorFalso, base_falsa, cliente_con_sesion
+
+
+def items_de(proforma_ids, por_proforma=3):
+    return [{'id': pid * 10 + k, 'proforma_id': pid, 'item_descripcion': f"Panel LED {k}W",
+             'cantidad': 1 + k, 'precio_unitario': 10.0}
+            for pid in proforma_ids for k in range(por_proforma)]
+
+
+class ObtenerItemsPorProformaTest(unittest.TestCase):
+
+    def test_una_sola_consulta_para_n_proformas(self):
+        ids = list(range(1, 26))
+        cur = CursorFalso(lambda sql, params: items_de(params) if 'proforma_items' in sql else None)
+
+        items = aplicacion.obtener_items_por_proforma(cur, ids)
+
+        self.assertEqual(len(cur.consultas), 1)
+        sql, params = cur.consultas[0]
+        self.assertIn('WHERE proforma_id IN (' + ', '.join(['%s'] * len(ids)) + ')', sql)
+        self.assertEqual(params, ids)
+        self.assertEqual(list(items), ids)
+        self.assertTrue(all(len(items[pid]) == 3 for pid in ids))
+        self.assertEqual([item['id'] for item in items[7]], [70, 71, 72])
+
+    def test_proformas_sin_items_reciben_lista_vacia(self):
+        cur = CursorFalso(lambda sql, params: items_de([2]))
+        items = aplicacion.obtener_items_por_proforma(cur, [1, 2, 3])
+        self.assertEqual(items[1], [])
+        self.assertEqual(len(items[2]), 3)
+        self.assertEqual(items[3], [])
+
+    def test_sin_ids_no_consulta(self):
+        cur = CursorFalso()
+        self.assertEqual(aplicacion.obtener_items_por_proforma(cur, []), {})
+        self.assertEqual(cur.consultas, [])
+
+
+class ListaProformasTest(unittest.TestCase):
+
+    def pedir_pagina(self, por_pagina):
+        proformas = [{'id': pid, 'user_id': 1, 'cotizacion_nro': str(pid), 'fecha': date(2025, 1, 1),
+                      'cliente': f"Cliente {pid}", 'incluye_igv': True, 'monto_total': 100,
+                      'status': 'Enviada', 'author': 'Usuario 1'}
+                     for pid in range(500, 500 - por_pagina - 1, -1)]
+
+        def responder(sql, params):
+            if sql.startswith('SELECT COUNT'):
+                return [{'total': 500}]
+            if sql.startswith('SELECT p.*'):
+                return [dict(p) for p in proformas]
+            if 'FROM proforma_items' in sql:
+                return items_de(params)
+            return None
+
+        # Sin el conteo cacheado por una petición anterior, todas hacen las mismas consultas
+        aplicacion.invalidar_conteos(1)
+        anterior = aplicacion.app.config['PROFORMAS_POR_PAGINA']
+        aplicacion.app.config['PROFORMAS_POR_PAGINA'] = por_pagina
+        try:
+            with base_falsa(aplicacion, responder) as conexion:
+                respuesta = cliente_con_sesion(aplicacion).get('/api/proformas?page=1&search=')
+        finally:
+            aplicacion.app.config['PROFORMAS_POR_PAGINA'] = anterior
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.get_json(), conexion
+
+    def test_pagina_de_la_lista_sin_n_mas_1(self):
+        datos, conexion = self.pedir_pagina(10)
+        self.assertEqual(len(datos['proformas']), 10)
+        self.assertTrue(all(len(p['items']) == 3 for p in datos['proformas']))
+        consultas_items = conexion.consultas_con('FROM proforma_items')
+        self.assertEqual(len(consultas_items), 1)
+        self.assertEqual(consultas_items[0][1], list(range(500, 490, -1)))
+
+    def test_las_consultas_no_crecen_con_el_tamano_de_pagina(self):
+        cantidades = {}
+        for por_pagina in (5, 10, 50):
+            datos, conexion = self.pedir_pagina(por_pagina)
+            self.assertEqual(len(datos['proformas']), por_pagina)
+            self.assertEqual(len(conexion.consultas_con('FROM proforma_items')), 1)
+            cantidades[por_pagina] = len(conexion.consultas)
+        self.assertEqual(len(set(cantidades.values())), 1, cantidades)
+
+
+if __name__ == '__main__':
+    unittest.main()
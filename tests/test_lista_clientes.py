@@ -0,0 +1,84 @@
+# tests/test_lista_clientes.py
+# Las páginas de /api/clientes responden 304 a If-None-Match mientras los clientes del
+# usuario no cambien, aunque el token de sincronización sea otro en cada respuesta.
+import unittest
+from datetime import datetime, timedelta
+
+import app as aplicacion
+from tests.falsos import base_falsa, cliente_con_sesion
+
+
+class EstadoClientes:
+
+    def __init__(self):
+        self.actualizado = datetime(2025, 3, 1, 12, 0, 0, 123456)
+        self.total = 3
+        self.ahora = datetime(2025, 3, 2, 9, 0, 0)
+
+    def responder(self, sql, params):
+        if sql.startswith('SELECT MAX(updated_at)'):
+            return [{'actualizado': self.actualizado, 'total': self.total}]
+        if sql.startswith('SELECT NOW(6)'):
+            # Cada petición recibe un token distinto
+            self.ahora += timedelta(seconds=1)
+            return [{'ahora': self.ahora}]
+        if 'FROM clientes WHERE user_id = %s' in sql and 'ORDER BY nombre, id' in sql:
+            return [{'id': k, 'nombre': f"Cliente {k}", 'ruc_dni': str(k), 'direccion': '', 'telefono': '',
+                     'email': ''} for k in range(1, self.total + 1)]
+        return []
+
+
+class ListaClientesCondicionalTest(unittest.TestCase):
+
+    def setUp(self):
+        self.estado = EstadoClientes()
+
+    def pedir(self, ruta, etag=None):
+        cabeceras = {'If-None-Match': f'"{etag}"'} if etag else {}
+        with base_falsa(aplicacion, self.estado.responder) as conexion:
+            respuesta = cliente_con_sesion(aplicacion).get(ruta, headers=cabeceras)
+        return respuesta, conexion
+
+    def test_pagina_sin_cambios_responde_304_sin_leerla(self):
+        primera, _ = self.pedir('/api/clientes')
+        etag = primera.get_etag()[0]
+        self.assertEqual(primera.status_code, 200)
+
+        segunda, conexion = self.pedir('/api/clientes', etag)
+        self.assertEqual(segunda.status_code, 304)
+        self.assertEqual(segunda.get_etag()[0], etag)
+        self.assertEqual(conexion.consultas_con('ORDER BY nombre'), [])
+        self.assertEqual(conexion.consultas_con('NOW(6)'), [])
+
+    def test_el_token_no_cambia_el_etag(self):
+        primera, _ = self.pedir('/api/clientes')
+        segunda, _ = self.pedir('/api/clientes')
+        self.assertNotEqual(primera.get_json()['sync'], segunda.get_json()['sync'])
+        self.assertEqual(primera.get_etag(), segunda.get_etag())
+
+    def test_altas_ediciones_y_bajas_cambian_el_etag(self):
+        etag = self.pedir('/api/clientes')[0].get_etag()[0]
+        self.estado.actualizado += timedelta(microseconds=1)
+        respuesta, _ = self.pedir('/api/clientes', etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+        etag = respuesta.get_etag()[0]
+        self.estado.total -= 1
+        respuesta, _ = self.pedir('/api/clientes', etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.get_json()['clientes']), 2)
+
+    def test_cada_pagina_tiene_su_etag(self):
+        etag = self.pedir('/api/clientes')[0].get_etag()[0]
+        respuesta, _ = self.pedir('/api/clientes?after_nombre=Cliente%201&after_id=1', etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta.get_etag()[0], etag)
+
+    def test_cambios_desde_un_token_no_llevan_etag(self):
+        respuesta, _ = self.pedir('/api/clientes?since=2025-03-02T08:59:00')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.get_etag(), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
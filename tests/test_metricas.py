@@ -0,0 +1,79 @@
+# tests/test_metricas.py
+# Con METRICS_DIR, /metrics devuelve la suma de todos los workers y los contadores
+# no retroceden cuando un worker termina.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+from metricas import Metricas, TERMINADOS
+
+# Un pid mayor que cualquier pid_max de Linux: el proceso no existe
+PID_TERMINADO = 999_999_999
+
+
+def linea(texto, prefijo):
+    return next(l for l in texto.splitlines() if l.startswith(prefijo))
+
+
+class MetricasDeVariosWorkersTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def metricas(self, directorio=None):
+        app = Flask(__name__)
+        app.config['METRICS_DIR'] = directorio
+        return Metricas(app)
+
+    def volcar_como(self, metricas, pid):
+        """Escribe las series de `metricas` como si fueran las del proceso `pid`."""
+        estado = {m.nombre: [[list(valores), dato] for valores, dato in m.copia().items()]
+                  for m in metricas._todas}
+        with open(os.path.join(self.directorio, f"{pid}.json"), 'w') as f:
+            json.dump(estado, f)
+
+    def test_suma_los_workers_vivos_y_los_terminados(self):
+        propio = self.metricas(self.directorio)
+        propio.registrar_cache_pdf(True)
+        propio.registrar_pdf(0.02, 30_000)
+
+        otro = self.metricas()
+        for _ in range(2):
+            otro.registrar_cache_pdf(True)
+        otro.registrar_pdf(0.3, 30_000)
+        self.volcar_como(otro, os.getppid())
+
+        terminado = self.metricas()
+        for _ in range(4):
+            terminado.registrar_cache_pdf(True)
+        self.volcar_como(terminado, PID_TERMINADO)
+
+        texto = propio.exposicion()
+        self.assertEqual(linea(texto, 'pdf_cache_total{resultado="acierto"}'), 'pdf_cache_total{resultado="acierto"} 7')
+        self.assertEqual(linea(texto, 'pdf_render_seconds_count{origen="individual"}'),
+                         'pdf_render_seconds_count{origen="individual"} 2')
+        self.assertEqual(linea(texto, 'pdf_render_seconds_bucket{origen="individual",le="0.025"}'),
+                         'pdf_render_seconds_bucket{origen="individual",le="0.025"} 1')
+
+        # El terminado pasa a terminados.json una sola vez: el total se mantiene
+        self.assertFalse(os.path.exists(os.path.join(self.directorio, f"{PID_TERMINADO}.json")))
+        self.assertTrue(os.path.exists(os.path.join(self.directorio, TERMINADOS)))
+        propio.registrar_cache_pdf(True)
+        texto = propio.exposicion()
+        self.assertEqual(linea(texto, 'pdf_cache_total{resultado="acierto"}'), 'pdf_cache_total{resultado="acierto"} 8')
+
+    def test_sin_directorio_expone_solo_el_proceso(self):
+        metricas = self.metricas()
+        metricas.registrar_cache_pdf(False)
+        texto = metricas.exposicion()
+        self.assertEqual(linea(texto, 'pdf_cache_total{'), 'pdf_cache_total{resultado="fallo"} 1')
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+# tests/test_modificar_proforma.py
+# PATCH /api/proformas/<id>: un item repetido en remove/change se rechaza antes de
+# tocar la base de datos, y el total se ajusta una sola vez por item.
+import unittest
+from datetime import date
+
+import app as aplicacion
+from tests.falsos import base_falsa, cliente_con_sesion
+
+PROFORMA = {'id': 7, 'user_id': 1, 'cotizacion_nro': '15', 'fecha': date(2025, 3, 1), 'cliente': 'Cliente 7',
+            'incluye_igv': True, 'monto_total': 160.0, 'status': 'Enviada', 'version': 3}
+ITEMS = {
+    5: {'id': 5, 'item_descripcion': 'Panel LED 18W', 'cantidad': 2, 'precio_unitario': 50.0},
+    6: {'id': 6, 'item_descripcion': 'Driver', 'cantidad': 3, 'precio_unitario': 20.0},
+}
+
+
+def responder(sql, params):
+    if sql.startswith('SELECT * FROM proformas WHERE id = %s FOR UPDATE'):
+        return [dict(PROFORMA)]
+    if sql.startswith('SELECT id, item_descripcion, cantidad, precio_unitario FROM proforma_items'):
+        return [dict(ITEMS[item_id]) for item_id in params[1:] if item_id in ITEMS]
+    if sql.startswith(('UPDATE', 'DELETE')):
+        return 1
+    return None
+
+
+class ModificarProformaTest(unittest.TestCase):
+
+    def modificar(self, items):
+        with base_falsa(aplicacion, responder) as conexion:
+            respuesta = cliente_con_sesion(aplicacion).patch(
+                '/api/proformas/7', json={'version': 3, 'items': items})
+        return respuesta, conexion
+
+    def test_rechaza_id_repetido_en_remove(self):
+        respuesta, conexion = self.modificar({'remove': [5, 5]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(respuesta.get_json()['success'])
+        self.assertEqual(conexion.consultas, [])
+
+    def test_rechaza_id_repetido_en_change(self):
+        respuesta, conexion = self.modificar({'change': [{'id': 6, 'cantidad': 1}, {'id': 6, 'cantidad': 2}]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(conexion.consultas, [])
+
+    def test_rechaza_id_en_remove_y_change(self):
+        respuesta, conexion = self.modificar({'remove': [5], 'change': [{'id': 5, 'cantidad': 4}]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(conexion.consultas, [])
+
+    def test_quita_y_modifica_items_distintos(self):
+        respuesta, conexion = self.modificar({'remove': [5], 'change': [{'id': 6, 'cantidad': 1}]})
+        self.assertEqual(respuesta.status_code, 200)
+        datos = respuesta.get_json()
+        # 160 - 2*50 (quitado) - 2*20 (6 pasa de 3 a 1 unidad)
+        self.assertEqual(datos['monto_total'], 20.0)
+        self.assertEqual(datos['version'], 4)
+        self.assertEqual(len(conexion.consultas_con('DELETE FROM proforma_items')), 1)
+        self.assertEqual(conexion.consultas_con('DELETE FROM proforma_items')[0][1], [7, 5])
+        actualizacion = conexion.consultas_con('monto_total = monto_total + %s')
+        self.assertEqual(actualizacion[0][1], [-140.0, 7])
+        self.assertEqual(conexion.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# tests/test_secuencias.py
+# Numeración de cotizaciones: guardados simultáneos del mismo usuario reciben
+# números distintos y consecutivos, sin huecos.
+#
+# La prueba concurrente necesita MySQL/MariaDB (el bloqueo de fila y LAST_INSERT_ID
+# son del servidor) y se salta si no se configura una base desechable:
+#   TEST_MYSQL_HOST=localhost TEST_MYSQL_USER=root TEST_MYSQL_PASSWORD= \
+#   TEST_MYSQL_DB=ledesma_test python -m pytest tests/test_secuencias.py
+# La base de datos indicada se BORRA y se vuelve a crear.
+import os
+import threading
+import unittest
+from datetime import date
+
+import MySQLdb
+import MySQLdb.cursors
+from werkzeug.security import generate_password_hash
+
+import app as aplicacion
+import esquema
+import secuencias
+from tests.falsos import CursorFalso
+
+MYSQL_HOST = os.environ.get('TEST_MYSQL_HOST')
+MYSQL_USER = os.environ.get('TEST_MYSQL_USER', 'root')
+MYSQL_PASSWORD = os.environ.get('TEST_MYSQL_PASSWORD', '')
+MYSQL_DB = os.environ.get('TEST_MYSQL_DB', 'ledesma_test')
+
+HILOS = 8
+GUARDADOS_POR_HILO = 10
+
+
+class AsignarNumeroTest(unittest.TestCase):
+
+    def test_un_update_atomico_y_lectura_de_last_insert_id(self):
+        cur = CursorFalso(lambda sql, params: 1 if sql.startswith('UPDATE') else [{'numero': 42}])
+        self.assertEqual(secuencias.asignar_numero(cur, 3), 42)
+        self.assertEqual(len(cur.consultas), 2)
+        self.assertIn('LAST_INSERT_ID(ultimo + 1)', cur.consultas[0][0])
+        self.assertEqual(cur.consultas[0][1], [3])
+
+    def test_usuario_sin_fila_se_inicializa(self):
+        actualizaciones = []
+
+        def responder(sql, params):
+            if sql.startswith('UPDATE'):
+                actualizaciones.append(sql)
+                return 0 if len(actualizaciones) == 1 else 1
+            if sql.startswith('SELECT LAST_INSERT_ID'):
+                return [{'numero': 1}]
+            return None
+
+        cur = CursorFalso(responder)
+        self.assertEqual(secuencias.asignar_numero(cur, 3), 1)
+        self.assertTrue(any(sql.startswith('INSERT INTO proforma_secuencias') for sql, _ in cur.consultas))
+        self.assertEqual(len(actualizaciones), 2)
+
+
+@unittest.skipUnless(MYSQL_HOST, "sin TEST_MYSQL_HOST no hay base de datos para la prueba concurrente")
+class GuardadosConcurrentesTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if MYSQL_DB == 'ledesma_led_db':
+            raise unittest.SkipTest("TEST_MYSQL_DB debe ser una base desechable")
+        conn = MySQLdb.connect(host=MYSQL_HOST, user=MYSQL_USER, passwd=MYSQL_PASSWORD, charset='utf8mb4',
+                               cursorclass=MySQLdb.cursors.DictCursor)
+        cur = conn.cursor()
+        cur.execute(f"DROP DATABASE IF EXISTS `{MYSQL_DB}`")
+        cur.execute(f"CREATE DATABASE `{MYSQL_DB}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        cur.execute(f"USE `{MYSQL_DB}`")
+        esquema.migrar(cur)
+        cur.execute("INSERT INTO users (fullname, username, password) VALUES (%s, %s, %s)",
+                    ('Usuario Prueba', 'prueba', generate_password_hash('prueba')))
+        cls.user_id = cur.lastrowid
+        conn.commit()
+        cls.conn = conn
+
+        cls.config_anterior = {clave: aplicacion.app.config[clave] for clave in
+                               ('MYSQL_HOST', 'MYSQL_USER', 'MYSQL_PASSWORD', 'MYSQL_DB')}
+        aplicacion.app.config.update(MYSQL_HOST=MYSQL_HOST, MYSQL_USER=MYSQL_USER,
+                                     MYSQL_PASSWORD=MYSQL_PASSWORD, MYSQL_DB=MYSQL_DB)
+        # Una conexión del pool por hilo, para que los guardados compitan de verdad
+        aplicacion.mysql.pool.tamano = max(aplicacion.mysql.pool.tamano, HILOS + 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        aplicacion.app.config.update(cls.config_anterior)
+        cls.conn.close()
+
+    def test_numeros_unicos_y_sin_huecos(self):
+        cuerpo = {'fecha': date.today().isoformat(), 'cliente': 'Cliente Concurrente', 'incluye_igv': True,
+                  'items': [{'item': 'Panel LED 18W', 'cantidad': 1, 'precio_unitario': 10}]}
+        barrera = threading.Barrier(HILOS)
+        numeros, errores = [], []
+        lock = threading.Lock()
+
+        def guardar():
+            cliente = aplicacion.app.test_client()
+            with cliente.session_transaction() as sesion:
+                sesion.update(loggedin=True, id=self.user_id, username='prueba', fullname='Usuario Prueba',
+                              role='user')
+            barrera.wait()
+            for _ in range(GUARDADOS_POR_HILO):
+                respuesta = cliente.post('/api/proformas', json=cuerpo)
+                with lock:
+                    if respuesta.status_code == 200:
+                        numeros.append(int(respuesta.get_json()['cotizacion_nro']))
+                    else:
+                        errores.append(respuesta.status_code)
+
+        hilos = [threading.Thread(target=guardar) for _ in range(HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        total = HILOS * GUARDADOS_POR_HILO
+        self.assertEqual(errores, [])
+        self.assertEqual(sorted(numeros), list(range(1, total + 1)))
+
+        self.conn.commit()  # nueva instantánea: ver lo que confirmaron los hilos
+        cur = self.conn.cursor()
+        cur.execute("SELECT cotizacion_num FROM proformas WHERE user_id = %s ORDER BY cotizacion_num",
+                    [self.user_id])
+        self.assertEqual([fila['cotizacion_num'] for fila in cur.fetchall()], list(range(1, total + 1)))
+        cur.execute("SELECT ultimo FROM proforma_secuencias WHERE user_id = %s", [self.user_id])
+        self.assertEqual(cur.fetchone()['ultimo'], total)
+        cur.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
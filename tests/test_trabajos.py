@@ -0,0 +1,118 @@
+# tests/test_trabajos.py
+# Un trabajo en curso renueva su latido; al cerrar el proceso vuelve a la cola, y uno
+# cuyo proceso murió sin avisar se da por fallido al consultarlo, sin esperar al TTL.
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+from flask import Flask
+
+import app as aplicacion
+import trabajos
+from tests.falsos import ConexionFalsa, MySQLFalso, base_falsa, cliente_con_sesion
+
+
+class ColaConTrabajoBloqueadoTest(unittest.TestCase):
+    """Una cola con un tipo de trabajo que no termina hasta que la prueba lo suelta."""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        app = Flask(__name__)
+        app.config.update(JOBS_DIR=directorio, JOBS_HEARTBEAT_SECONDS=0.02, JOBS_SHUTDOWN_WAIT_SECONDS=0.05)
+        self.conexion = ConexionFalsa(self.responder)
+        self.cola = trabajos.ColaTrabajos(app, MySQLFalso(self.conexion))
+        self.empezado = threading.Event()
+        self.soltar = threading.Event()
+        self.addCleanup(self.soltar.set)
+
+        def ejecutar(user_id, parametros, ruta):
+            self.empezado.set()
+            self.soltar.wait(5)
+            with open(ruta, 'wb') as archivo:
+                archivo.write(b'ok')
+            return 'resultado.bin', 'application/octet-stream'
+
+        self.cola.registrar('lento', lambda user_id, datos: {}, ejecutar)
+
+    def responder(self, sql, params):
+        if sql.startswith('SELECT user_id, tipo, parametros'):
+            return [{'user_id': 1, 'tipo': 'lento', 'parametros': '{}'}]
+        if sql.startswith('UPDATE trabajos'):
+            return 1
+        return None
+
+    def consultas(self, fragmento):
+        return self.conexion.consultas_con(fragmento)
+
+    def test_el_trabajo_en_curso_renueva_su_latido(self):
+        self.cola.encolar('t1')
+        self.assertTrue(self.empezado.wait(2))
+        reclamo = self.consultas("SET estado = 'en_proceso'")[0]
+        self.assertEqual(reclamo[1], [trabajos.identificador_proceso(), 't1'])
+        for _ in range(100):
+            if self.consultas('SET latido = NOW() WHERE'):
+                break
+            self.soltar.wait(0.02)
+        sql, params = self.consultas('SET latido = NOW() WHERE')[0]
+        self.assertEqual(params, ['t1', trabajos.identificador_proceso()])
+
+    def test_al_cerrar_los_trabajos_sin_terminar_vuelven_a_la_cola(self):
+        self.cola.encolar('t1')
+        self.assertTrue(self.empezado.wait(2))
+
+        self.assertEqual(self.cola.cerrar(), 1)
+        sql, params = self.consultas("SET estado = 'pendiente'")[0]
+        self.assertIn("AND estado = 'en_proceso' AND proceso = %s", sql)
+        self.assertEqual(params, ['t1', trabajos.identificador_proceso()])
+
+        # Cerrada la cola no se aceptan más trabajos y el resultado tardío no pisa la fila
+        self.cola.encolar('t2')
+        self.soltar.set()
+        self.cola._pool.shutdown(wait=True)
+        self.assertEqual(len(self.consultas("SET estado = 'en_proceso'")), 1)
+        final = self.consultas('SET estado = %s')[0]
+        self.assertIn("AND estado = 'en_proceso' AND proceso = %s", final[0])
+        self.assertEqual(self.cola.cerrar(), 0)
+
+    def test_cerrar_sin_trabajos_no_consulta(self):
+        self.cola.encolar('t1')
+        self.assertTrue(self.empezado.wait(2))
+        self.soltar.set()
+        self.assertEqual(self.cola.cerrar(), 0)
+        self.assertEqual(self.consultas("SET estado = 'pendiente'"), [])
+
+
+class ConsultarTrabajoAbandonadoTest(unittest.TestCase):
+
+    def test_trabajo_sin_latido_se_da_por_fallido(self):
+        estado = {'abandonado': 1}
+
+        def responder(sql, params):
+            if sql.startswith('SELECT id, tipo, estado'):
+                abandonado = estado['abandonado']
+                return [{'id': 't1', 'tipo': 'zip', 'estado': 'en_proceso' if abandonado else 'error',
+                         'error': None if abandonado else trabajos.INTERRUMPIDO, 'nombre_descarga': None,
+                         'mimetype': None, 'bytes': None, 'creado': datetime(2025, 3, 1), 'iniciado': None,
+                         'terminado': None, 'expira': None, 'caducado': None, 'abandonado': abandonado,
+                         'sin_reclamar': 0}]
+            if sql.startswith('UPDATE trabajos'):
+                estado['abandonado'] = 0
+                return 1
+            return None
+
+        with base_falsa(aplicacion, responder) as conexion:
+            respuesta = cliente_con_sesion(aplicacion).get('/api/jobs/t1')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.get_json()['estado'], 'error')
+        self.assertEqual(respuesta.get_json()['error'], trabajos.INTERRUMPIDO)
+        recuperaciones = [sql for sql, _ in conexion.consultas_con('latido < NOW() - INTERVAL')
+                          if sql.startswith('UPDATE')]
+        self.assertEqual(len(recuperaciones), 1)
+        self.assertEqual(conexion.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,344 @@
+# trabajos.py
+# Cola de trabajos en segundo plano para las exportaciones pesadas (PDF, ZIP, Excel/CSV).
+#
+# Cada trabajo queda registrado en la tabla `trabajos` y lo ejecuta un pool de
+# hilos pequeño y acotado, fuera de los hilos de waitress: una exportación grande
+# ya no deja sin hilos libres al login ni al autocompletado. El archivo generado
+# se guarda en disco y se puede descargar hasta que caduca (TTL); después se borra.
+#
+# Los trabajos se reclaman con un UPDATE condicionado al estado 'pendiente', así
+# que aunque varios procesos compartan la tabla cada trabajo se ejecuta una sola vez.
+#
+# El proceso que reclama un trabajo queda anotado en la fila y, mientras lo ejecuta,
+# renueva su latido cada JOBS_HEARTBEAT_SECONDS. Al salir (hook worker_exit de
+# gunicorn, o atexit) espera un poco a los que tiene en curso y devuelve a la cola los
+# que no acabaron; si el proceso muere sin avisar, el latido deja de renovarse y el
+# trabajo se da por fallido al minuto, en vez de esperar al TTL.
+import atexit
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+CREATE_TABLE_TRABAJOS = """
+    CREATE TABLE IF NOT EXISTS trabajos (
+        id CHAR(32) NOT NULL PRIMARY KEY,
+        user_id INT NOT NULL,
+        tipo VARCHAR(20) NOT NULL,
+        parametros TEXT NOT NULL,
+        estado ENUM('pendiente', 'en_proceso', 'terminado', 'error') NOT NULL DEFAULT 'pendiente',
+        error VARCHAR(255) NULL,
+        nombre_descarga VARCHAR(255) NULL,
+        mimetype VARCHAR(100) NULL,
+        bytes INT UNSIGNED NULL,
+        creado DATETIME NOT NULL,
+        iniciado DATETIME NULL,
+        terminado DATETIME NULL,
+        expira DATETIME NULL,
+        KEY idx_trabajos_usuario (user_id, estado),
+        KEY idx_trabajos_expira (expira)
+    ) ENGINE=InnoDB
+"""
+
+# Sin latido durante tantos intervalos, el proceso que tenía el trabajo ya no existe
+INTERVALOS_SIN_LATIDO = 4
+INTERRUMPIDO = 'Interrumpido por un reinicio del servidor'
+
+
+def identificador_proceso():
+    """Host y pid del proceso actual (cada worker tiene el suyo tras el fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class TrabajoFallido(Exception):
+    """Error esperado de un trabajo; su mensaje se muestra tal cual al usuario."""
+
+
+class ColaLlena(Exception):
+    """El usuario ya tiene demasiados trabajos esperando."""
+
+
+class ColaTrabajos:
+    """Extensión de Flask: registra tipos de trabajo y los ejecuta en segundo plano.
+
+    Cada tipo se registra con dos funciones:
+      validar(user_id, datos) -> parametros   (en la petición; ValueError -> 400)
+      ejecutar(user_id, parametros, ruta) -> (nombre_descarga, mimetype)
+    `ejecutar` corre dentro de un contexto de la aplicación, así que puede usar
+    `mysql.connection` igual que una ruta, y debe escribir el resultado en `ruta`.
+    """
+
+    def __init__(self, app=None, mysql=None):
+        self.app = None
+        self.mysql = None
+        self._tipos = {}
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # Trabajos de este proceso: en la cola del pool y ya reclamados
+        self._lock = threading.Lock()
+        self._terminado = threading.Condition(self._lock)
+        self._en_cola = set()
+        self._en_curso = set()
+        self._cerrando = False
+        self._detener_latido = threading.Event()
+        if app is not None:
+            self.init_app(app, mysql)
+
+    def init_app(self, app, mysql):
+        self.app = app
+        self.mysql = mysql
+        self.max_workers = app.config.get('JOBS_WORKERS', 2)
+        self.directorio = app.config.get('JOBS_DIR') or os.path.join(app.instance_path, 'trabajos')
+        self.ttl = app.config.get('JOBS_TTL_SECONDS', 3600)
+        self.max_pendientes = app.config.get('JOBS_MAX_PENDING', 5)
+        self.intervalo_latido = app.config.get('JOBS_HEARTBEAT_SECONDS', 15)
+        self.espera_cierre = app.config.get('JOBS_SHUTDOWN_WAIT_SECONDS', 10)
+
+    @property
+    def limite_latido(self):
+        return self.intervalo_latido * INTERVALOS_SIN_LATIDO
+
+    def registrar(self, tipo, validar, ejecutar):
+        self._tipos[tipo] = (validar, ejecutar)
+
+    def ruta_archivo(self, trabajo_id):
+        return os.path.join(self.directorio, f"{trabajo_id}.bin")
+
+    # --- LADO DE LA PETICIÓN ---
+
+    def crear(self, cur, user_id, tipo, datos):
+        """Valida y registra un trabajo nuevo; hay que encolarlo tras el commit."""
+        if tipo not in self._tipos:
+            raise ValueError("Tipo de trabajo no válido")
+        validar, _ = self._tipos[tipo]
+        parametros = validar(user_id, datos)
+
+        cur.execute(
+            "SELECT COUNT(*) AS n FROM trabajos WHERE user_id = %s AND estado IN ('pendiente', 'en_proceso')",
+            [user_id]
+        )
+        if cur.fetchone()['n'] >= self.max_pendientes:
+            raise ColaLlena(f"Ya tiene {self.max_pendientes} trabajos en curso; espere a que terminen")
+
+        trabajo_id = uuid.uuid4().hex
+        cur.execute(
+            "INSERT INTO trabajos (id, user_id, tipo, parametros, creado) VALUES (%s, %s, %s, %s, NOW())",
+            (trabajo_id, user_id, tipo, json.dumps(parametros))
+        )
+        return trabajo_id
+
+    def encolar(self, trabajo_id):
+        with self._lock:
+            if self._cerrando or trabajo_id in self._en_cola:
+                return
+            self._en_cola.add(trabajo_id)
+        self._obtener_pool().submit(self._ejecutar, trabajo_id)
+
+    def obtener(self, cur, trabajo_id, user_id):
+        """El trabajo del usuario, con `abandonado` si su proceso dejó de latir y
+        `sin_reclamar` si lleva más de un límite de latido esperando en la cola."""
+        cur.execute(
+            """SELECT id, tipo, estado, error, nombre_descarga, mimetype, bytes,
+                      creado, iniciado, terminado, expira, (expira < NOW()) AS caducado,
+                      (estado = 'en_proceso' AND latido < NOW() - INTERVAL %s SECOND) AS abandonado,
+                      (estado = 'pendiente' AND creado < NOW() - INTERVAL %s SECOND) AS sin_reclamar
+               FROM trabajos WHERE id = %s AND user_id = %s""",
+            (self.limite_latido, self.limite_latido, trabajo_id, user_id)
+        )
+        return cur.fetchone()
+
+    def purgar(self, cur, limite=100):
+        """Borra los trabajos caducados y sus archivos (se llama al crear trabajos nuevos)."""
+        cur.execute("SELECT id FROM trabajos WHERE expira < NOW() LIMIT %s", [limite])
+        ids = [fila['id'] for fila in cur.fetchall()]
+        if not ids:
+            return 0
+        for trabajo_id in ids:
+            self._borrar_archivo(trabajo_id)
+        cur.execute("DELETE FROM trabajos WHERE id IN (" + ", ".join(["%s"] * len(ids)) + ")", ids)
+        return len(ids)
+
+    def reanudar(self, cur):
+        """Al arrancar: vuelve a encolar los pendientes y da por fallidos los que quedaron a medias."""
+        # Un trabajo 'en_proceso' desde hace más que el TTL pertenecía a un proceso que ya no existe
+        cur.execute(
+            """UPDATE trabajos SET estado = 'error', error = %s,
+                      terminado = NOW(), expira = NOW() + INTERVAL %s SECOND
+               WHERE estado = 'en_proceso' AND iniciado < NOW() - INTERVAL %s SECOND""",
+            (INTERRUMPIDO, self.ttl, self.ttl)
+        )
+        self.recuperar_abandonados(cur)
+        cur.execute("SELECT id FROM trabajos WHERE estado = 'pendiente' ORDER BY creado")
+        return [fila['id'] for fila in cur.fetchall()]
+
+    def recuperar_abandonados(self, cur):
+        """Da por fallidos los trabajos en curso cuyo proceso dejó de latir (murió sin avisar)."""
+        cur.execute(
+            """UPDATE trabajos SET estado = 'error', error = %s,
+                      terminado = NOW(), expira = NOW() + INTERVAL %s SECOND
+               WHERE estado = 'en_proceso' AND latido < NOW() - INTERVAL %s SECOND""",
+            (INTERRUMPIDO, self.ttl, self.limite_latido)
+        )
+        return cur.rowcount
+
+    def cerrar(self, espera=None):
+        """Al salir el proceso: espera a los trabajos en curso y devuelve a la cola los que no acaben.
+
+        Lo llaman el hook worker_exit de gunicorn y atexit; sólo actúa la primera vez.
+        Los trabajos encolados que no empezaron siguen 'pendiente' en la tabla y los
+        retoma reanudar() en el siguiente proceso. Devuelve cuántos se devolvieron a la cola.
+        """
+        with self._lock:
+            if self._pool is None or self._cerrando:
+                return 0
+            self._cerrando = True
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        limite = time.monotonic() + (self.espera_cierre if espera is None else espera)
+        with self._terminado:
+            while self._en_curso and time.monotonic() < limite:
+                self._terminado.wait(limite - time.monotonic())
+            ids = list(self._en_curso)
+        self._detener_latido.set()
+        if not ids:
+            return 0
+        try:
+            with self.app.app_context():
+                conn = self.mysql.connection
+                cur = conn.cursor()
+                try:
+                    # Sólo los que siguen siendo de este proceso: otro pudo darlos por abandonados
+                    cur.execute(
+                        "UPDATE trabajos SET estado = 'pendiente', iniciado = NULL, latido = NULL, proceso = NULL "
+                        "WHERE id IN (" + ", ".join(["%s"] * len(ids)) + ") AND estado = 'en_proceso' AND proceso = %s",
+                        ids + [identificador_proceso()]
+                    )
+                    devueltos = cur.rowcount
+                    conn.commit()
+                finally:
+                    cur.close()
+        except Exception as e:
+            print(f"No se pudieron devolver a la cola los trabajos {ids}: {e}", file=sys.stderr)
+            return 0
+        print(f">>> Trabajos devueltos a la cola al cerrar el proceso: {devueltos}", file=sys.stderr)
+        return devueltos
+
+    # --- LADO DEL POOL ---
+
+    def _obtener_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    os.makedirs(self.directorio, exist_ok=True)
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='trabajo')
+                    threading.Thread(target=self._latir, name='trabajo-latido', daemon=True).start()
+                    atexit.register(self.cerrar)
+        return self._pool
+
+    def _latir(self):
+        """Renueva el latido de los trabajos que este proceso tiene en curso."""
+        while not self._detener_latido.wait(self.intervalo_latido):
+            with self._lock:
+                ids = list(self._en_curso)
+            if not ids:
+                continue
+            try:
+                with self.app.app_context():
+                    conn = self.mysql.connection
+                    cur = conn.cursor()
+                    try:
+                        cur.execute(
+                            "UPDATE trabajos SET latido = NOW() WHERE id IN (" + ", ".join(["%s"] * len(ids)) + ") "
+                            "AND estado = 'en_proceso' AND proceso = %s",
+                            ids + [identificador_proceso()]
+                        )
+                        conn.commit()
+                    finally:
+                        cur.close()
+            except Exception as e:
+                print(f"Error al renovar el latido de los trabajos: {e}", file=sys.stderr)
+
+    def _ejecutar(self, trabajo_id):
+        with self._lock:
+            self._en_cola.discard(trabajo_id)
+        try:
+            self._procesar(trabajo_id)
+        except Exception as e:
+            # El pool se traga las excepciones de los futuros que nadie espera
+            print(f"Error al procesar el trabajo {trabajo_id}: {e}", file=sys.stderr)
+        finally:
+            with self._terminado:
+                self._en_curso.discard(trabajo_id)
+                self._terminado.notify_all()
+
+    def _procesar(self, trabajo_id):
+        proceso = identificador_proceso()
+        with self.app.app_context():
+            conn = self.mysql.connection
+            cur = conn.cursor()
+            try:
+                with self._lock:
+                    if self._cerrando:
+                        # Queda 'pendiente' para el siguiente proceso
+                        return
+                    self._en_curso.add(trabajo_id)
+                cur.execute(
+                    "UPDATE trabajos SET estado = 'en_proceso', iniciado = NOW(), latido = NOW(), proceso = %s "
+                    "WHERE id = %s AND estado = 'pendiente'",
+                    [proceso, trabajo_id]
+                )
+                reclamado = cur.rowcount
+                conn.commit()
+                if not reclamado:
+                    # Otro hilo o proceso ya lo tomó
+                    return
+                cur.execute("SELECT user_id, tipo, parametros FROM trabajos WHERE id = %s", [trabajo_id])
+                trabajo = cur.fetchone()
+            finally:
+                cur.close()
+
+            ruta = self.ruta_archivo(trabajo_id)
+            # Un trabajo devuelto a la cola puede estar corriendo a la vez en otro proceso
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            try:
+                _, ejecutar = self._tipos[trabajo['tipo']]
+                nombre, mimetype = ejecutar(trabajo['user_id'], json.loads(trabajo['parametros']), temporal)
+                os.replace(temporal, ruta)
+                resultado = ('terminado', None, nombre, mimetype, os.path.getsize(ruta))
+            except TrabajoFallido as e:
+                resultado = ('error', str(e)[:255], None, None, None)
+            except Exception as e:
+                print(f"Error en el trabajo {trabajo_id} ({trabajo['tipo']}): {e}", file=sys.stderr)
+                resultado = ('error', 'Error interno al procesar el trabajo', None, None, None)
+            finally:
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+
+            # El trabajo pudo dejar una transacción de lectura abierta en la conexión
+            conn.rollback()
+            cur = conn.cursor()
+            try:
+                # Si ya no es de este proceso (se devolvió a la cola o se dio por abandonado), manda el otro
+                cur.execute(
+                    """UPDATE trabajos SET estado = %s, error = %s, nombre_descarga = %s, mimetype = %s, bytes = %s,
+                              terminado = NOW(), expira = NOW() + INTERVAL %s SECOND
+                       WHERE id = %s AND estado = 'en_proceso' AND proceso = %s""",
+                    resultado + (self.ttl, trabajo_id, proceso)
+                )
+                conn.commit()
+            except Exception as e:
+                print(f"Error al registrar el resultado del trabajo {trabajo_id}: {e}", file=sys.stderr)
+            finally:
+                cur.close()
+
+    def _borrar_archivo(self, trabajo_id):
+        try:
+            os.remove(self.ruta_archivo(trabajo_id))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"No se pudo borrar el archivo del trabajo {trabajo_id}: {e}", file=sys.stderr)